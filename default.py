@@ -1,13 +1,28 @@
 # -*- coding: utf-8 -*-
+"""
+Kodi runs this in a new Python instance for every single add-on call, e.g.
+hundreds of times a day for widgets. Hence we only import what the
+respective mode needs - please keep it that way
+"""
 import logging
 from sys import argv
+from time import perf_counter
 from urllib.parse import parse_qsl
 
+import xbmcaddon
+# Log how long imports take, see the PKC settings. Needs to happen before
+# importing anything else
+if xbmcaddon.Addon().getSetting('profilingImports') == 'true':
+    from resources.lib import import_profiling
+    import_profiling.start()
+else:
+    import_profiling = None
+
 import xbmc
 import xbmcgui
 import xbmcplugin
 
-from resources.lib import entrypoint, utils, transfer, variables as v, loghandler
+from resources.lib import transfer, variables as v, loghandler
 
 
 loghandler.config()
@@ -74,6 +89,12 @@ def triage(mode, params, path, arguments, itemid):
         transfer.plex_command('fanart-scan')
         return
     # Listings: we list ListItems and need to tell Kodi when we're done
+    from resources.lib import widget_cache
+    if widget_cache.show(params):
+        # Listing has been precomputed by the PKC service
+        xbmcplugin.endOfDirectory(int(argv[1]))
+        return
+    from resources.lib import entrypoint, utils
     try:
         if mode == 'browseplex':
             entrypoint.browse_plex(key=params.get('key'),
@@ -139,6 +160,7 @@ def play():
     """
     Start up playback_starter in main Python thread
     """
+    start = perf_counter()
     request = '%s&handle=%s' % (argv[2], int(argv[1]))
     # Put the request into the 'queue'
     transfer.plex_command('PLAY-%s' % request)
@@ -154,6 +176,7 @@ def play():
     else:
         # Received a xbmcgui.ListItem()
         xbmcplugin.setResolvedUrl(int(argv[1]), True, result)
+    LOG.debug('Resolved playback after %.0f ms', (perf_counter() - start) * 1000)
 
 
 def main():
@@ -178,3 +201,5 @@ if __name__ == '__main__':
     else:
         main()
     LOG.info('%s stopped' % v.ADDON_ID)
+    if import_profiling:
+        import_profiling.log_summary()
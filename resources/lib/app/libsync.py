@@ -60,6 +60,13 @@ class Sync(object):
         self.backgroundsync_saftymargin = None
         # How many threads to download Plex metadata on sync?
         self.sync_thread_number = None
+        # How many Plex items' metadata to download with one single request?
+        self.metadata_batch_size = None
+        # Use the asyncio download engine for the library sync?
+        self.async_downloads = None
+        # How often shall we write resume points of other Plex players to the
+        # Kodi DB? [seconds]
+        self.playstate_flush_interval = None
 
         # Shall Kodi show dialogs for syncing/caching images? (e.g. images left
         # to sync)
@@ -113,7 +120,9 @@ class Sync(object):
         self.indicate_media_versions = utils.settings('indicate_media_versions') == "true"
         self.sync_specific_plex_playlists = utils.settings('syncSpecificPlexPlaylists') == 'true'
         self.sync_specific_kodi_playlists = utils.settings('syncSpecificKodiPlaylists') == 'true'
-        self.sync_thread_number = int(utils.settings('syncThreadNumber'))
+        self.sync_thread_number = utils.SETTINGS.get_int('syncThreadNumber', 10)
+        self.metadata_batch_size = utils.SETTINGS.get_int('syncMetadataBatchSize', 10)
+        self.async_downloads = utils.settings('syncAsyncDownloads') == 'true'
         self.reload()
 
     def reload(self):
@@ -124,6 +133,9 @@ class Sync(object):
         self.sync_dialog = utils.settings('dbSyncIndicator') == 'true'
         self.full_sync_intervall = int(utils.settings('fullSyncInterval')) * 60
         self.backgroundsync_saftymargin = int(utils.settings('backgroundsync_saftyMargin'))
+        self.playstate_flush_interval = utils.SETTINGS.get_int('playstateFlushInterval', 30)
+        # In seconds
+        self.playstate_session_timeout = utils.SETTINGS.get_int('playstateSessionTimeout', 10) * 60
 
         self.image_sync_notifications = utils.settings('imageSyncNotifications') == 'true'
 
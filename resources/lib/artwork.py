@@ -1,6 +1,9 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 from logging import getLogger
+from time import time
+import queue
+import threading
 import requests
 
 from .kodi_db import KodiVideoDB, KodiMusicDB, KodiTextureDB
@@ -15,6 +18,14 @@ requests.packages.urllib3.disable_warnings()
 # download is successful
 TIMEOUT = (35.1, 35.1)
 BATCH_SIZE = 500
+# How many times do we try to reach Kodi's webserver for a single image?
+CONNECTION_ATTEMPTS = 7
+# Min and max seconds to wait if Kodi's webserver is overloaded
+MIN_BACKOFF = 1.0
+MAX_BACKOFF = 32.0
+QUEUE_TIMEOUT = 1  # seconds
+# How often do we update the image caching speed in the PKC settings?
+REPORT_INTERVAL = 30  # seconds
 
 
 def double_urlencode(text):
@@ -25,40 +36,94 @@ def double_urldecode(text):
     return utils.unquote(utils.unquote(text))
 
 
+class Backoff(object):
+    """
+    Adaptive backoff shared by all image caching workers. Every ConnectionError
+    doubles the time we wait before contacting Kodi's webserver again, every
+    successful request halves it
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.delay = 0.0
+
+    def success(self):
+        with self._lock:
+            self.delay = self.delay / 2 if self.delay > MIN_BACKOFF else 0.0
+
+    def failure(self):
+        with self._lock:
+            self.delay = min(max(2 * self.delay, MIN_BACKOFF), MAX_BACKOFF)
+
+    def wait(self):
+        """
+        Blocks for the current backoff delay. Returns True if PKC needs to exit
+        """
+        if not self.delay:
+            return False
+        return app.APP.monitor.waitForAbort(self.delay)
+
+
+class ImageCachingWorker(backgroundthread.KillableThread):
+    """
+    Caches the urls it receives via url_queue until it gets the sentinel None.
+    Uses its own, persistent requests.Session so connections to Kodi's
+    webserver are kept alive
+    """
+    def __init__(self, url_queue, backoff, should_stop):
+        self.url_queue = url_queue
+        self.backoff = backoff
+        self.should_stop = should_stop
+        # Number of urls we processed
+        self.count = 0
+        super(ImageCachingWorker, self).__init__()
+
+    def run(self):
+        with requests.Session() as session:
+            while True:
+                url = self.url_queue.get()
+                if url is None:
+                    break
+                if not self.should_stop():
+                    cache_url(url,
+                              self.should_stop,
+                              session=session,
+                              backoff=self.backoff)
+                    self.count += 1
+
+
 class ImageCachingThread(backgroundthread.KillableThread):
     def __init__(self):
         super(ImageCachingThread, self).__init__()
         self.suspend_points = [(self, '_suspended')]
         if not utils.settings('imageSyncDuringPlayback') == 'true':
             self.suspend_points.append((app.APP, 'is_playing_video'))
+        self.worker_count = utils.SETTINGS.get_int('imageCachingThreads', 4)
+        self.backoff = Backoff()
 
     def should_suspend(self):
         return any(getattr(obj, attrib) for obj, attrib in self.suspend_points)
 
+    def _should_stop(self):
+        return self.should_suspend() or self.should_cancel()
+
     @staticmethod
-    def _url_generator(kind, kodi_type):
+    def _url_generator(kind, kodi_type, cached_urls):
         """
+        Yields all urls of kind kodi_type that are not yet part of cached_urls.
         Main goal is to close DB connection between calls
         """
-        offset = 0
-        i = 0
+        last_art_id = 0
         while True:
-            batch = []
-            with kind(texture_db=True) as kodidb:
-                texture_db = KodiTextureDB(kodiconn=kodidb.kodiconn,
-                                           artconn=kodidb.artconn,
-                                           lock=False)
-                for i, url in enumerate(kodidb.artwork_generator(kodi_type,
-                                                                 BATCH_SIZE,
-                                                                 offset)):
-                    if texture_db.url_not_yet_cached(url):
-                        batch.append(url)
-                        if len(batch) == BATCH_SIZE:
-                            break
-            offset += i
-            for url in batch:
-                yield url
-            if i + 1 < BATCH_SIZE:
+            with kind() as kodidb:
+                batch = kodidb.artwork_generator(kodi_type,
+                                                 BATCH_SIZE,
+                                                 last_art_id).fetchall()
+            for last_art_id, url in batch:
+                if url not in cached_urls:
+                    # Several items might share the same artwork
+                    cached_urls.add(url)
+                    yield url
+            if len(batch) < BATCH_SIZE:
                 break
 
     def run(self):
@@ -72,20 +137,80 @@ class ImageCachingThread(backgroundthread.KillableThread):
             app.APP.deregister_caching_thread(self)
             LOG.info("---===### Stopped ImageCachingThread ###===---")
 
-    def _loop(self):
+    def _put(self, url_queue, url):
+        """
+        Returns False if we need to stop caching images
+        """
+        while not self._should_stop():
+            try:
+                url_queue.put(url, timeout=QUEUE_TIMEOUT)
+            except queue.Full:
+                continue
+            else:
+                return True
+        return False
+
+    @staticmethod
+    def _report_rate(workers, last_count, last_time):
+        """
+        Writes the current caching speed in urls/second to the PKC settings.
+        Returns the tuple (count, time) to use for the next call
+        """
+        count = sum(x.count for x in workers)
+        now = time()
+        rate = (count - last_count) / (now - last_time)
+        utils.settings('plex_status_image_caching_rate',
+                       value='%.1f/s' % rate)
+        LOG.debug('Caching %.1f images per second', rate)
+        return count, now
+
+    def _feed(self, url_queue, workers):
         kinds = [KodiVideoDB]
         if app.SYNC.enable_music:
             kinds.append(KodiMusicDB)
+        with KodiTextureDB() as texturedb:
+            cached_urls = texturedb.cached_urls()
+        LOG.debug('%s urls are already cached', len(cached_urls))
+        last_count, last_time = 0, time()
         for kind in kinds:
             for kodi_type in ('poster', 'fanart'):
-                for url in self._url_generator(kind, kodi_type):
-                    if self.should_suspend() or self.should_cancel():
+                for url in self._url_generator(kind, kodi_type, cached_urls):
+                    if not self._put(url_queue, url):
                         return False
-                    cache_url(url, self.should_suspend)
-        # Toggles Image caching completed to Yes
-        utils.settings('plex_status_image_caching', value=utils.lang(107))
+                    if time() - last_time > REPORT_INTERVAL:
+                        last_count, last_time = self._report_rate(workers,
+                                                                  last_count,
+                                                                  last_time)
         return True
 
+    def _loop(self):
+        url_queue = queue.Queue(maxsize=2 * self.worker_count)
+        workers = [ImageCachingWorker(url_queue,
+                                      self.backoff,
+                                      self._should_stop)
+                   for _ in range(self.worker_count)]
+        for worker in workers:
+            worker.start()
+        completed = False
+        try:
+            completed = self._feed(url_queue, workers)
+        finally:
+            if not completed:
+                # Discard all urls that have not yet been cached
+                try:
+                    while True:
+                        url_queue.get_nowait()
+                except queue.Empty:
+                    pass
+            for _ in workers:
+                url_queue.put(None)
+            for worker in workers:
+                worker.join()
+        if completed:
+            # Toggles Image caching completed to Yes
+            utils.settings('plex_status_image_caching', value=utils.lang(107))
+        return completed
+
     def _run(self):
         while True:
             if self._loop():
@@ -94,15 +219,44 @@ class ImageCachingThread(backgroundthread.KillableThread):
                 break
 
 
-def cache_url(url, should_suspend=None):
+class CacheUrlsTask(backgroundthread.Task):
+    """
+    Caches a list of image urls in the background, e.g. the artwork of items
+    that the PMS told us about via websocket
+    """
+    def setup(self, urls):
+        self.urls = urls
+
+    def run(self):
+        backoff = Backoff()
+        with requests.Session() as session:
+            for url in self.urls:
+                if self.should_cancel():
+                    break
+                cache_url(url,
+                          should_suspend=self.should_cancel,
+                          session=session,
+                          backoff=backoff)
+
+
+def cache_url(url, should_suspend=None, session=None, backoff=None):
+    """
+    Triggers Kodi to cache the image url. Pass in a requests.Session to reuse
+    its connections to Kodi's webserver and a Backoff shared with other
+    threads that are caching images
+    """
     url = double_urlencode(url)
-    sleeptime = 0
-    while True:
+    session = session or requests
+    backoff = backoff or Backoff()
+    for _ in range(CONNECTION_ATTEMPTS):
+        if backoff.wait():
+            # PKC needs to exit
+            return
         try:
             # Make sure that no proxy is used for our calls to Kodi's webserver
             # at localhost See
             # https://github.com/croneter/PlexKodiConnect/issues/1732
-            requests.head(
+            session.head(
                 url=f'http://{app.CONN.webserver_username}:{app.CONN.webserver_password}@{app.CONN.webserver_host}:{app.CONN.webserver_port}/image/image://{url}',
                 auth=(app.CONN.webserver_username,
                       app.CONN.webserver_password),
@@ -111,29 +265,27 @@ def cache_url(url, should_suspend=None):
         except requests.Timeout:
             # We don't need the result, only trigger Kodi to start the
             # download. All is well
-            break
+            return
         except requests.ConnectionError:
             if app.APP.stop_pkc or (should_suspend and should_suspend()):
-                break
+                return
             # Server thinks its a DOS attack, ('error 10053')
             # Wait before trying again
             # OR: Kodi refuses Webserver connection (no password set)
-            if sleeptime > 5:
-                LOG.error('Repeatedly got ConnectionError for url %s',
-                          double_urldecode(url))
-                break
+            backoff.failure()
             LOG.debug('Were trying too hard to download art, server '
                       'over-loaded. Sleep %s seconds before trying '
                       'again to download %s',
-                      2**sleeptime, double_urldecode(url))
-            app.APP.monitor.waitForAbort((2**sleeptime))
-            sleeptime += 1
+                      backoff.delay, double_urldecode(url))
             continue
         except Exception as err:
             LOG.error('Unknown exception for url %s: %s',
                       double_urldecode(url), err)
             import traceback
             LOG.error("Traceback:\n%s", traceback.format_exc())
-            break
+            return
         # We did not even get a timeout
-        break
+        backoff.success()
+        return
+    LOG.error('Repeatedly got ConnectionError for url %s',
+              double_urldecode(url))
@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Alternative, asyncio-based engine to download stuff from the PMS. Uses only
+the Python standard library. One single, dedicated thread runs the asyncio
+event loop, so we can keep lots of requests in flight without spawning an
+OS thread for every one of them.
+
+Use submit() to schedule a coroutine from any other thread or fetch() to
+download an url. Both return a concurrent.futures.Future; use result() to wait
+for it. Coroutines running on the engine's loop should await download()
+"""
+from logging import getLogger
+from collections import namedtuple, defaultdict
+from urllib.parse import urlsplit, urlencode, quote
+from time import perf_counter
+import asyncio
+import concurrent.futures
+import ssl
+import threading
+
+from . import backgroundthread, clientinfo, app, metrics
+from .downloadutils import DownloadUtils as DU
+
+LOG = getLogger('PLEX.async_download')
+
+# Max. number of requests in flight. Limits the memory we might need, too
+MAX_IN_FLIGHT = 64
+# Seconds to wait for the PMS to answer an individual request
+TIMEOUT = 30.0
+# Seconds to wait for a coroutine submitted from another thread, e.g. for all
+# the chunks of an item's children
+RESULT_TIMEOUT = 300.0
+
+# status: int, headers: dict with lower-case keys, content: bytes
+Response = namedtuple('Response', 'status, headers, content')
+
+_DOWNLOADER = None
+_DOWNLOADER_LOCK = threading.Lock()
+
+
+class HTTPError(Exception):
+    """
+    Raised if we could not make sense of the PMS' answer
+    """
+    pass
+
+
+# Exceptions you should expect when downloading something
+ERRORS = (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+          HTTPError)
+
+
+class Connection(object):
+    """
+    One HTTP/1.1 keep-alive connection to a host
+    """
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        # Did we already use this connection for a request?
+        self.reused = False
+
+    def close(self):
+        self.writer.close()
+
+    async def request(self, host, path, headers):
+        """
+        Sends a GET request and returns the tuple (Response, keep_alive)
+        """
+        request = ['GET %s HTTP/1.1' % path, 'Host: %s' % host]
+        request.extend('%s: %s' % (key, value)
+                       for key, value in headers.items())
+        request.append('\r\n')
+        self.writer.write('\r\n'.join(request).encode('utf-8'))
+        await self.writer.drain()
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError('Connection closed by %s' % host)
+        try:
+            version, status = status_line.decode('latin-1').split(None, 2)[:2]
+            status = int(status)
+        except ValueError:
+            raise HTTPError('Invalid status line %r' % status_line)
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+        keep_alive = (version == 'HTTP/1.1' and
+                      headers.get('connection', '').lower() != 'close')
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            content = await self._read_chunked()
+        elif 'content-length' in headers:
+            content = await self.reader.readexactly(
+                int(headers['content-length']))
+        elif status in (204, 304):
+            content = b''
+        else:
+            # Body ends when the PMS closes the connection
+            content = await self.reader.read()
+            keep_alive = False
+        return Response(status, headers, content), keep_alive
+
+    async def _read_chunked(self):
+        content = bytearray()
+        while True:
+            line = await self.reader.readline()
+            try:
+                size = int(line.split(b';', 1)[0].strip(), 16)
+            except ValueError:
+                raise HTTPError('Invalid chunk size %r' % line)
+            if size == 0:
+                break
+            content += await self.reader.readexactly(size + 2)
+            del content[-2:]
+        # Skip trailers
+        while (await self.reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        return bytes(content)
+
+
+class AsyncDownloader(backgroundthread.KillableThread):
+    """
+    Runs the asyncio event loop. Never call its methods directly but use the
+    module functions submit(), fetch() and download()
+    """
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.ready = threading.Event()
+        self._semaphore = None
+        # Idle connections {(scheme, host, port): [Connection]}
+        self._idle = defaultdict(list)
+        super(AsyncDownloader, self).__init__(name='PLEX.AsyncDownloader')
+
+    def run(self):
+        LOG.info('----===## Starting AsyncDownloader ##===----')
+        asyncio.set_event_loop(self.loop)
+        self._semaphore = asyncio.Semaphore(MAX_IN_FLIGHT)
+        self.loop.call_soon(self.ready.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            self._cancel_pending()
+            self._close_idle_connections()
+            self.loop.close()
+            LOG.info('----===## AsyncDownloader stopped ##===----')
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def _cancel_pending(self):
+        """
+        Cancels all coroutines still running, so that nobody waits forever for
+        the results of their futures
+        """
+        tasks = asyncio.all_tasks(self.loop)
+        if not tasks:
+            return
+        LOG.debug('Cancelling %s pending downloads', len(tasks))
+        for task in tasks:
+            task.cancel()
+        self.loop.run_until_complete(
+            asyncio.gather(*tasks, return_exceptions=True))
+
+    def _close_idle_connections(self):
+        for connections in self._idle.values():
+            for connection in connections:
+                connection.close()
+        self._idle.clear()
+
+    @staticmethod
+    def _ssl_context():
+        context = ssl.create_default_context()
+        if not app.CONN.verify_ssl_cert:
+            # Mimick requests' behavior for verify=None or False
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        elif isinstance(app.CONN.verify_ssl_cert, str):
+            context.load_verify_locations(app.CONN.verify_ssl_cert)
+        if app.CONN.ssl_cert_path:
+            context.load_cert_chain(app.CONN.ssl_cert_path)
+        return context
+
+    async def _connection(self, key):
+        try:
+            return self._idle[key].pop()
+        except IndexError:
+            pass
+        scheme, host, port = key
+        reader, writer = await asyncio.open_connection(
+            host,
+            port,
+            ssl=self._ssl_context() if scheme == 'https' else None)
+        return Connection(reader, writer)
+
+    async def fetch(self, url, params=None):
+        """
+        Coroutine that downloads url and returns a Response. Substitutes
+        '{server}' with the current PMS. Raises one of ERRORS if something
+        went wrong
+        """
+        url = urlsplit(url.replace('{server}', app.CONN.server))
+        key = (url.scheme,
+               url.hostname,
+               url.port or (443 if url.scheme == 'https' else 80))
+        path = url.path or '/'
+        query = '&'.join(x for x in (url.query, urlencode(params or {})) if x)
+        if query:
+            path = '%s?%s' % (path, query)
+        # Same as requests' requote_uri
+        path = quote(path, safe="!#$%&'()*+,/:;=?@[]~")
+        headers = clientinfo.getXArgsDeviceInfo()
+        headers['Accept-Encoding'] = 'identity'
+        headers['Connection'] = 'keep-alive'
+        async with self._semaphore:
+            while True:
+                connection = await self._connection(key)
+                start = perf_counter()
+                try:
+                    response, keep_alive = await asyncio.wait_for(
+                        connection.request(url.netloc, path, headers),
+                        TIMEOUT)
+                except asyncio.TimeoutError:
+                    # Also an OSError since Python 3.11. Don't retry, the PMS
+                    # did not answer in time
+                    connection.close()
+                    raise
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    connection.close()
+                    if connection.reused:
+                        # The PMS closed an idle keep-alive connection
+                        continue
+                    raise
+                except BaseException:
+                    connection.close()
+                    raise
+                metrics.observe('http_latency_ms',
+                                (perf_counter() - start) * 1000)
+                if keep_alive:
+                    connection.reused = True
+                    self._idle[key].append(connection)
+                else:
+                    connection.close()
+                self._count_unauthorized(url.geturl(), response)
+                return response
+
+    @staticmethod
+    def _count_unauthorized(url, response):
+        """
+        Same accounting of 401 answers as DownloadUtils.downloadUrl(), so
+        we're logging out if our token was revoked
+        """
+        if response.status == 401:
+            DU().unauthorized(url,
+                              response.content.decode('utf-8', 'replace'))
+        else:
+            DU().count_unauthorized = 0
+
+
+async def download(url, params=None):
+    """
+    Coroutine that downloads url on the engine's loop and returns a Response.
+    Raises one of ERRORS if something went wrong. Only await it in coroutines
+    that were scheduled using submit()
+    """
+    # Coroutines run in the AsyncDownloader's own thread
+    return await threading.current_thread().fetch(url, params)
+
+
+def downloader():
+    """
+    Returns the running AsyncDownloader; will start it if necessary
+    """
+    global _DOWNLOADER
+    with _DOWNLOADER_LOCK:
+        if _DOWNLOADER is None or not _DOWNLOADER.is_alive():
+            _DOWNLOADER = AsyncDownloader()
+            _DOWNLOADER.start()
+            _DOWNLOADER.ready.wait()
+        return _DOWNLOADER
+
+
+def submit(coroutine):
+    """
+    Schedules coroutine on the AsyncDownloader's event loop. Returns a
+    concurrent.futures.Future that is safe to use from any thread
+    """
+    return asyncio.run_coroutine_threadsafe(coroutine, downloader().loop)
+
+
+def fetch(url, params=None):
+    """
+    Downloads url without blocking. Returns a concurrent.futures.Future; its
+    result() will be a Response
+    """
+    return submit(downloader().fetch(url, params))
+
+
+def result(future, timeout=RESULT_TIMEOUT):
+    """
+    Waits at most timeout seconds for the result of future, as returned by
+    submit() or fetch(). Returns None if the download was cancelled, e.g.
+    because PKC is shutting down, or if it took too long
+    """
+    try:
+        return future.result(timeout)
+    except concurrent.futures.CancelledError:
+        LOG.debug('Download was cancelled')
+    except concurrent.futures.TimeoutError:
+        LOG.warn('Download did not finish within %ss', timeout)
+        future.cancel()
+
+
+def shutdown():
+    """
+    Stops the AsyncDownloader, if it is running. Pending downloads will be
+    cancelled
+    """
+    global _DOWNLOADER
+    with _DOWNLOADER_LOCK:
+        downloader, _DOWNLOADER = _DOWNLOADER, None
+    # Don't hold the lock while joining: coroutines on the loop might still
+    # need it
+    if downloader is not None:
+        downloader.stop()
+        downloader.join()
@@ -13,6 +13,39 @@ from . import utils, app, variables as v
 WORKER_COUNT = 3
 LOG = getLogger('PLEX.threads')
 
+# Class names of the KillableThreads we're profiling, read from the PKC
+# settings once - changes need a restart of Kodi anyway
+_PROFILED_THREADS = None
+
+
+def profiled_threads():
+    """
+    Returns the set of KillableThread class names the user wants to profile
+    """
+    global _PROFILED_THREADS
+    if _PROFILED_THREADS is None:
+        if utils.SETTINGS.get_bool('profilingEnabled'):
+            _PROFILED_THREADS = frozenset(
+                x.strip()
+                for x in utils.SETTINGS.get('profilingThreads').split(','))
+        else:
+            _PROFILED_THREADS = frozenset()
+    return _PROFILED_THREADS
+
+
+def maybe_profiled(thread):
+    """
+    Wraps thread.run() in order to profile it if the user wants to profile
+    threads of thread's class. KillableThread.start() does this for you - call
+    it yourself if you're calling thread.run() directly. Returns thread
+    """
+    if type(thread).__name__ in profiled_threads():
+        # Imported here as cProfile and pstats slow down add-on calls,
+        # e.g. for widgets
+        from . import profiling
+        thread.run = profiling.profiled(thread.run, type(thread).__name__)
+    return thread
+
 
 class KillableThread(threading.Thread):
     def __init__(self, group=None, target=None, name=None, args=(), kwargs={}):
@@ -26,6 +59,10 @@ class KillableThread(threading.Thread):
         self.suspension_timeout = None
         super(KillableThread, self).__init__(group, target, name, args, kwargs)
 
+    def start(self):
+        maybe_profiled(self)
+        super(KillableThread, self).start()
+
     def should_cancel(self):
         """
         Returns True if the thread should be stopped immediately
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 import sqlite3
 from functools import wraps
+from pathlib import Path
 
 from . import variables as v, app
 from .exceptions import LockedDatabase
@@ -59,10 +60,13 @@ def _initial_db_connection_setup(conn):
     conn.execute('BEGIN')
 
 
-def connect(media_type=None):
+def connect(media_type=None, readonly=False):
     """
     Open a connection to the Kodi database.
-        media_type: 'video' (standard if not passed), 'plex', 'music', 'texture'
+        media_type: 'video' (standard if not passed), 'plex', 'music', 'texture',
+                    'responses'
+        readonly:   Open the database with mode=ro, e.g. for widgets that only
+                    read from the Kodi DB and must never lock it
     """
     if media_type == "plex":
         db_path = v.DB_PLEX_PATH
@@ -72,11 +76,22 @@ def connect(media_type=None):
         db_path = v.DB_MUSIC_PATH
     elif media_type == "texture":
         db_path = v.DB_TEXTURE_PATH
+    elif media_type == 'responses':
+        db_path = v.DB_RESPONSE_CACHE_PATH
     else:
         db_path = v.DB_VIDEO_PATH
-    conn = sqlite3.connect(db_path,
-                           timeout=DB_CONNECTION_TIMEOUT,
-                           isolation_level=None)
+    if readonly:
+        conn = sqlite3.connect('%s?mode=ro' % Path(db_path).as_uri(),
+                               uri=True,
+                               timeout=DB_CONNECTION_TIMEOUT,
+                               isolation_level=None)
+    else:
+        conn = sqlite3.connect(db_path,
+                               timeout=DB_CONNECTION_TIMEOUT,
+                               isolation_level=None)
+    if readonly:
+        # No transaction and no journal mode changes for read-only access
+        return conn
     attempts = DB_WRITE_ATTEMPTS
     while True:
         try:
@@ -1,10 +1,12 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 from logging import getLogger
+from collections import Counter
+from threading import Lock
 import requests
 import requests.exceptions as exceptions
 
-from . import utils, clientinfo, app
+from . import utils, clientinfo, app, backgroundthread, metrics
 
 ###############################################################################
 
@@ -14,9 +16,61 @@ requests.packages.urllib3.disable_warnings()
 
 LOG = getLogger('PLEX.download')
 
+# Additional connections to the PMS we keep alive on top of the ones used by
+# our sync threads, e.g. for playback reports or the websocket
+POOL_HEADROOM = 4
+# Upper bounds of the buckets of our response time histogram in milliseconds
+LATENCY_BUCKETS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf'))
+
 ###############################################################################
 
 
+class ResponseStatistics(object):
+    """
+    Thread-safe in-memory statistics of all responses we received using our
+    requests session. Use record() as a requests response hook
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+            self.bytes = 0
+            self.total_latency = 0.0
+            self.latency = [0] * len(LATENCY_BUCKETS)
+            self.status = Counter()
+
+    def record(self, response, *args, **kwargs):
+        latency = response.elapsed.total_seconds() * 1000
+        # Streamed responses have not been downloaded yet
+        size = 0 if kwargs.get('stream') else len(response.content)
+        metrics.observe('http_latency_ms', latency)
+        with self._lock:
+            self.count += 1
+            self.bytes += size
+            self.total_latency += latency
+            self.status[response.status_code] += 1
+            for i, upper_bound in enumerate(LATENCY_BUCKETS):
+                if latency <= upper_bound:
+                    self.latency[i] += 1
+                    break
+
+    def log(self):
+        with self._lock:
+            if not self.count:
+                return
+            LOG.info('Received %s responses with %s bytes, average response '
+                     'time %.0fms',
+                     self.count, self.bytes, self.total_latency / self.count)
+            LOG.info('Response times: %s',
+                     ', '.join('<=%sms: %s' % (upper_bound, count)
+                               for upper_bound, count
+                               in zip(LATENCY_BUCKETS, self.latency)))
+            LOG.info('Response status codes: %s', dict(self.status))
+
+
 class DownloadUtils(object):
     """
     Manages any up/downloads with PKC. Careful to initiate correctly
@@ -71,9 +125,19 @@ class DownloadUtils(object):
             self.count_error = 0
             self.count_unauthorized = 0
 
-        # Retry connections to the server
-        self.s.mount("http://", requests.adapters.HTTPAdapter(max_retries=1))
-        self.s.mount("https://", requests.adapters.HTTPAdapter(max_retries=1))
+        # Retry connections to the server. Make sure every thread that might
+        # talk to the PMS at the same time can keep its connection alive
+        pool_size = self.pool_size()
+        LOG.debug('Keeping up to %s connections per host alive', pool_size)
+        self.s.mount("http://",
+                     requests.adapters.HTTPAdapter(pool_maxsize=pool_size,
+                                                   max_retries=1))
+        self.s.mount("https://",
+                     requests.adapters.HTTPAdapter(pool_maxsize=pool_size,
+                                                   max_retries=1))
+        # Gather response statistics
+        self.statistics = ResponseStatistics()
+        self.s.hooks['response'].append(self.statistics.record)
 
         LOG.debug("Requests session started on: %s", app.CONN.server)
 
@@ -88,6 +152,39 @@ class DownloadUtils(object):
             pass
         LOG.info('Request session stopped')
 
+    @staticmethod
+    def pool_size():
+        """
+        Returns the number of connections per host we should keep alive: one
+        for every metadata download thread and background worker
+        """
+        workers = max(backgroundthread.WORKER_COUNT,
+                      len(backgroundthread.BGThreader.workers))
+        return (utils.SETTINGS.get_int('syncThreadNumber', 10) + workers +
+                POOL_HEADROOM)
+
+    def log_statistics(self):
+        """
+        Logs the response statistics and how often we reused a connection for
+        every host we talked to, then resets the statistics
+        """
+        try:
+            s = self.s
+        except AttributeError:
+            return
+        self.statistics.log()
+        self.statistics.reset()
+        for adapter in s.adapters.values():
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                if not pool.num_requests:
+                    continue
+                LOG.info('%s://%s:%s: %s requests using %s connections since '
+                         'session start',
+                         pool.scheme, pool.host, pool.port,
+                         pool.num_requests, pool.num_connections)
+
     @staticmethod
     def getHeader(options=None):
         header = clientinfo.getXArgsDeviceInfo()
@@ -109,6 +206,29 @@ class DownloadUtils(object):
             r = s.put(**kwargs)
         return r
 
+    def unauthorized(self, url, text):
+        """
+        Call if the PMS answered url with HTTP error 401. Pass the answer's
+        body as text [unicode]. Logs the user out if we're truly unauthorized
+        """
+        LOG.warn('HTTP error 401 from PMS %s', url)
+        LOG.info(text)
+        if '401 Unauthorized' in text:
+            # Truly unauthorized
+            self.count_unauthorized += 1
+            if self.count_unauthorized >= self.unauthorized_attempts:
+                LOG.warn('We seem to be truly unauthorized for PMS'
+                         ' %s ', url)
+                # Unauthorized access, user no longer has access
+                app.ACCOUNT.log_out()
+                utils.dialog('notification',
+                             utils.lang(29999),
+                             utils.lang(30017),
+                             icon='{error}')
+        else:
+            # there might be other 401 where e.g. PMS under strain
+            LOG.info('PMS might only be under strain')
+
     def downloadUrl(self, url, action_type="GET", postBody=None,
                     parameters=None, authenticate=True, headerOptions=None,
                     verifySSL=True, timeout=None, return_response=False,
@@ -239,23 +359,7 @@ class DownloadUtils(object):
                     # Called when checking a connect - no need for rash action
                     return 401
                 r.encoding = 'utf-8'
-                LOG.warn('HTTP error 401 from PMS %s', url)
-                LOG.info(r.text)
-                if '401 Unauthorized' in r.text:
-                    # Truly unauthorized
-                    self.count_unauthorized += 1
-                    if self.count_unauthorized >= self.unauthorized_attempts:
-                        LOG.warn('We seem to be truly unauthorized for PMS'
-                                 ' %s ', url)
-                        # Unauthorized access, user no longer has access
-                        app.ACCOUNT.log_out()
-                        utils.dialog('notification',
-                                     utils.lang(29999),
-                                     utils.lang(30017),
-                                     icon='{error}')
-                else:
-                    # there might be other 401 where e.g. PMS under strain
-                    LOG.info('PMS might only be under strain')
+                self.unauthorized(url, r.text)
                 return 401
 
             elif r.status_code in (200, 201):
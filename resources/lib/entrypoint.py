@@ -18,6 +18,7 @@ from . import path_ops
 from .downloadutils import DownloadUtils as DU
 from .plex_api import API, mass_api
 from . import plex_functions as PF
+from . import json_rpc as js
 from . import variables as v
 # Be careful - your using app in another Python instance!
 from . import app, widgets
@@ -36,38 +37,6 @@ class ListingException(Exception):
     pass
 
 
-def guess_video_or_audio():
-    """
-    Returns either 'video', 'audio' or 'image', based how the user navigated to
-    the current view.
-    Returns None if this failed, e.g. when the user picks widgets
-    """
-    content_type = None
-    if xbmc.getCondVisibility('Window.IsActive(Videos)'):
-        content_type = 'video'
-    elif xbmc.getCondVisibility('Window.IsActive(Music)'):
-        content_type = 'audio'
-    elif xbmc.getCondVisibility('Window.IsActive(Pictures)'):
-        content_type = 'image'
-    elif xbmc.getCondVisibility('Container.Content(movies)'):
-        content_type = 'video'
-    elif xbmc.getCondVisibility('Container.Content(episodes)'):
-        content_type = 'video'
-    elif xbmc.getCondVisibility('Container.Content(seasons)'):
-        content_type = 'video'
-    elif xbmc.getCondVisibility('Container.Content(tvshows)'):
-        content_type = 'video'
-    elif xbmc.getCondVisibility('Container.Content(albums)'):
-        content_type = 'audio'
-    elif xbmc.getCondVisibility('Container.Content(artists)'):
-        content_type = 'audio'
-    elif xbmc.getCondVisibility('Container.Content(songs)'):
-        content_type = 'audio'
-    elif xbmc.getCondVisibility('Container.Content(pictures)'):
-        content_type = 'image'
-    return content_type
-
-
 def _wait_for_auth():
     """
     Call to be sure that PKC is authenticated, e.g. for widgets on Kodi startup
@@ -107,7 +76,7 @@ def show_main_menu(content_type=None):
     """
     Shows the main PKC menu listing with all libraries, Channel, settings, etc.
     """
-    content_type = content_type or guess_video_or_audio()
+    content_type = content_type or widgets.guess_video_or_audio()
     LOG.debug('Do main listing for content_type %s', content_type)
     xbmcplugin.setContent(int(sys.argv[1]), v.CONTENT_TYPE_FILE)
     # Get nodes from the window props
@@ -197,6 +166,23 @@ def show_listing(xml, plex_type=None, section_id=None, synched=True, key=None):
 
     Kodi content type will be set using the very first item returned by the PMS
     """
+    listing = prepare_listing(xml, plex_type, section_id, synched, key)
+    if listing:
+        widgets.add_listing(*listing)
+
+
+def prepare_listing(xml, plex_type=None, section_id=None, synched=True,
+                    key=None, playlist_type=None, gui=True):
+    """
+    Returns the tuple (content_type, items, key) for the PMS xml with items
+    [list of dicts] generated by widgets.generate_item(), or None if the xml
+    is empty. Does not need a plugin handle, hence the PKC service uses this
+    to precompute widgets, see widget_precompute
+
+    Playlists are only shown for playlist_type, e.g. 'video'. If None, we ask
+    Kodi how the user navigated here - unless gui=False, e.g. for the PKC
+    service that has no add-on window to ask about
+    """
     try:
         xml[0]
     except IndexError:
@@ -224,32 +210,31 @@ def show_listing(xml, plex_type=None, section_id=None, synched=True, key=None):
     LOG.debug('show_listing: section_id %s, synched %s, key %s, plex_type %s, '
               'content type %s',
               section_id, synched, key, plex_type, content_type)
-    xbmcplugin.setContent(int(sys.argv[1]), content_type)
-    # Initialization
-    widgets.PLEX_TYPE = plex_type
-    widgets.SYNCHED = synched
+    listing = widgets.Listing(plex_type=plex_type)
     if plex_type == v.PLEX_TYPE_EPISODE and key and 'onDeck' in key:
-        widgets.APPEND_SHOW_TITLE = utils.settings('OnDeckTvAppendShow') == 'true'
-        widgets.APPEND_SXXEXX = utils.settings('OnDeckTvAppendSeason') == 'true'
+        listing.append_show_title = utils.SETTINGS.get_bool('OnDeckTvAppendShow')
+        listing.append_sxxexx = utils.SETTINGS.get_bool('OnDeckTvAppendSeason')
     if plex_type == v.PLEX_TYPE_EPISODE and key and 'recentlyAdded' in key:
-        widgets.APPEND_SHOW_TITLE = utils.settings('RecentTvAppendShow') == 'true'
-        widgets.APPEND_SXXEXX = utils.settings('RecentTvAppendSeason') == 'true'
+        listing.append_show_title = utils.SETTINGS.get_bool('RecentTvAppendShow')
+        listing.append_sxxexx = utils.SETTINGS.get_bool('RecentTvAppendSeason')
     if api.tag == 'Playlist':
         # Only show video playlists if navigation started for videos
         # and vice-versa for audio playlists
-        content = guess_video_or_audio()
+        content = playlist_type
+        if content is None and gui:
+            content = widgets.guess_video_or_audio()
         if content:
             for entry in reversed(xml):
                 tmp_api = API(entry)
                 if tmp_api.playlist_type() != content:
                     xml.remove(entry)
     if xml.get('librarySectionID'):
-        widgets.SECTION_ID = utils.cast(int, xml.get('librarySectionID'))
+        listing.section_id = utils.cast(int, xml.get('librarySectionID'))
     elif section_id:
-        widgets.SECTION_ID = utils.cast(int, section_id)
+        listing.section_id = utils.cast(int, section_id)
     if xml.get('viewGroup') == 'secondary':
         # Need to chain keys for navigation
-        widgets.KEY = key
+        listing.key = key
     # Process all items to show
     all_items = mass_api(xml, check_by_guid=key == "watchlist")
 
@@ -262,13 +247,13 @@ def show_listing(xml, plex_type=None, section_id=None, synched=True, key=None):
             all_items = [item for item in all_items
                          if item.section_id == utils.cast(int, section_id)]
 
-    all_items = [widgets.generate_item(api) for api in all_items]
-    all_items = [widgets.prepare_listitem(item, key) for item in all_items]
-    # fill that listing...
-    all_items = [widgets.create_listitem(item) for item in all_items]
-    xbmcplugin.addDirectoryItems(int(sys.argv[1]), all_items, len(all_items))
-    # end directory listing
-    xbmcplugin.addSortMethod(int(sys.argv[1]), xbmcplugin.SORT_METHOD_UNSORTED)
+    # Get the Kodi details of all synched items in one go
+    listing.kodi_details = widgets.fetch_kodi_details(
+        list(set((api.kodi_id, api.kodi_type) for api in all_items
+                 if api.kodi_id and api.kodi_type in js.JSON_FROM_KODITYPE)))
+    return (content_type,
+            [widgets.generate_item(api, listing) for api in all_items],
+            key)
 
 
 def get_video_files(plex_id, params):
@@ -410,10 +395,18 @@ def hub(content_type):
     content_type:
         audio, video, image
     """
-    content_type = content_type or guess_video_or_audio()
+    content_type = content_type or widgets.guess_video_or_audio()
     LOG.debug('Showing Plex Hub entries for %s', content_type)
     _wait_for_auth()
     app.init(entrypoint=True)
+    show_listing(hub_xml(content_type))
+
+
+def hub_xml(content_type):
+    """
+    Returns the PMS hub xml with only the entries for content_type: audio,
+    video, image or None for all entries
+    """
     xml = PF.get_plex_hub()
     try:
         xml[0].attrib
@@ -454,7 +447,7 @@ def hub(content_type):
                 xml.insert(i + 1, pkc_cont_watching)
                 break
     # END HACK ##################
-    show_listing(xml)
+    return xml
 
 
 def watchlater():
@@ -526,12 +519,24 @@ def browse_plex(key=None, plex_type=None, section_id=None, synched=True,
             raise ListingException
         prompt = prompt.strip()
         args['query'] = prompt
-    xml = DU().downloadUrl(utils.extend_url('{server}%s' % key, args))
+    xml = browse_xml(key, args)
+    if xml is None:
+        LOG.error('Could not browse to key %s, section %s', key, section_id)
+        raise ListingException
+    show_listing(xml, plex_type, section_id, synched, key)
+
+
+def browse_xml(key, args=None):
+    """
+    Returns the PMS xml for the Plex key [str] with the url arguments args
+    [dict] or None if we could not download it
+    """
+    xml = PF.download_conditionally(utils.extend_url('{server}%s' % key,
+                                                     args or {}))
     try:
         xml.attrib
     except AttributeError:
-        LOG.error('Could not browse to key %s, section %s', key, section_id)
-        raise ListingException
+        return
     if len(xml) > 0 and xml[0].tag == 'Hub':
         # E.g. when hitting the endpoint '/hubs/search'
         answ = etree.Element(xml.tag, attrib=xml.attrib)
@@ -548,7 +553,7 @@ def browse_plex(key=None, plex_type=None, section_id=None, synched=True,
                                                       api.tag_label())
                 answ.append(entry)
         xml = answ
-    show_listing(xml, plex_type, section_id, synched, key)
+    return xml
 
 
 def extras(plex_id):
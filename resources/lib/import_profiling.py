@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Measures how long every module import takes, like "python -X importtime",
+which we cannot pass to Kodi's Python interpreter. Used for default.py, which
+Kodi runs in a new Python instance for every widget or add-on call.
+
+Only imports the standard library - call start() before importing anything
+else you'd like to measure and log_summary() at the end
+"""
+from logging import getLogger
+from time import perf_counter
+import sys
+
+LOG = getLogger('PLEX.import_profiling')
+
+# Total time spent by the imports nested in the import currently running
+_STACK = []
+# (depth, module name, self [us], cumulative [us]) in order of completion
+_RESULTS = []
+
+
+class _TimedLoader(object):
+    """
+    Wraps a module's loader to measure the time spent executing the module,
+    including all the imports the module triggers
+    """
+    def __init__(self, loader):
+        self._loader = loader
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        start = perf_counter()
+        _STACK.append(0.0)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            children = _STACK.pop()
+            cumulative = perf_counter() - start
+            if _STACK:
+                _STACK[-1] += cumulative
+            _RESULTS.append((len(_STACK),
+                             module.__name__,
+                             int((cumulative - children) * 1000000),
+                             int(cumulative * 1000000)))
+            # Don't leave our wrapper behind
+            module.__loader__ = self._loader
+            if getattr(module, '__spec__', None) is not None:
+                module.__spec__.loader = self._loader
+
+
+class _TimingFinder(object):
+    """
+    Meta path finder that asks all the other finders and wraps the loader
+    they found
+    """
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return
+        if hasattr(spec.loader, 'exec_module'):
+            spec.loader = _TimedLoader(spec.loader)
+        return spec
+
+
+def start():
+    """
+    Starts measuring all imports of modules that were not yet imported
+    """
+    if not any(isinstance(x, _TimingFinder) for x in sys.meta_path):
+        sys.meta_path.insert(0, _TimingFinder())
+
+
+def stop():
+    sys.meta_path[:] = [x for x in sys.meta_path
+                        if not isinstance(x, _TimingFinder)]
+
+
+def log_summary():
+    """
+    Stops measuring and logs all imports in the format of python -X importtime
+    """
+    stop()
+    LOG.info('import time: self [us] | cumulative | imported package')
+    for depth, name, own, cumulative in _RESULTS:
+        LOG.info('import time: %9d | %10d | %s%s',
+                 own, cumulative, '  ' * depth, name)
+    total = sum(x[3] for x in _RESULTS if x[0] == 0)
+    LOG.info('Imported %s modules in %s ms', len(_RESULTS), total // 1000)
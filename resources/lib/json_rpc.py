@@ -9,6 +9,9 @@ from xbmc import executeJSONRPC
 
 from . import kodi_constants, timing, variables as v
 
+# Max. number of calls in one single batched JSON RPC request
+ITEMS_DETAILS_BATCH_SIZE = 100
+
 JSON_FROM_KODITYPE = {
     v.KODI_TYPE_MOVIE: ('VideoLibrary.GetMovieDetails',
                         kodi_constants.FIELDS_MOVIES),
@@ -624,6 +627,44 @@ def item_details(kodi_id, kodi_type):
     json, fields = JSON_FROM_KODITYPE[kodi_type]
     ret = JsonRPC(json).execute({'%sid' % kodi_type: kodi_id,
                                 'properties': fields})
+    return _item_details(ret, kodi_type)
+
+
+def items_details(items):
+    '''
+    Pass in a list of tuples (kodi_id, kodi_type). Returns a dict
+    {(kodi_id, kodi_type): item dict} exactly like item_details() but uses
+    one single, batched JSON RPC request for up to ITEMS_DETAILS_BATCH_SIZE
+    items. Items that Kodi did not return are missing from the dict
+    '''
+    answ = {}
+    for i in range(0, len(items), ITEMS_DETAILS_BATCH_SIZE):
+        batch = items[i:i + ITEMS_DETAILS_BATCH_SIZE]
+        query = []
+        for id_, (kodi_id, kodi_type) in enumerate(batch):
+            json, fields = JSON_FROM_KODITYPE[kodi_type]
+            query.append({
+                'jsonrpc': JsonRPC.version,
+                'id': id_,
+                'method': json,
+                'params': {'%sid' % kodi_type: kodi_id, 'properties': fields}
+            })
+        ret = loads(executeJSONRPC(dumps(query)))
+        if not isinstance(ret, list):
+            # Batch requests not supported or something else went wrong
+            continue
+        for entry in ret:
+            try:
+                item = batch[entry['id']]
+            except (KeyError, IndexError, TypeError):
+                continue
+            details = _item_details(entry, item[1])
+            if details:
+                answ[item] = details
+    return answ
+
+
+def _item_details(ret, kodi_type):
     try:
         ret = ret['result']['%sdetails' % kodi_type]
     except (KeyError, TypeError):
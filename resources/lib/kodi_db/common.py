@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 from threading import Lock
+from collections import OrderedDict
 
 from .. import db, path_ops
 
@@ -9,30 +10,64 @@ KODIDB_LOCK = Lock()
 UNTOUCHED_TABLES = ('version', 'versiontagscan', 'videoversiontype')
 
 
+class LRUCache(object):
+    """
+    Simple least recently used cache, holding at most maxsize entries. NOT
+    thread-safe
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+
+    def get(self, key):
+        """
+        Returns the value for key or None if key is not cached
+        """
+        try:
+            self._cache.move_to_end(key)
+        except KeyError:
+            return
+        return self._cache[key]
+
+    def set(self, key, value):
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def clear(self):
+        self._cache.clear()
+
+
 class KodiDBBase(object):
     """
     Kodi database methods used for all types of items
     """
     def __init__(self, texture_db=False, kodiconn=None, artconn=None,
-                 lock=True):
+                 lock=True, readonly=False):
         """
-        Allows direct use with a cursor instead of context mgr
+        Allows direct use with a cursor instead of context mgr. Pass
+        readonly=True to open the Kodi DB read-only, e.g. for widgets
         """
         self._texture_db = texture_db
         self.lock = lock
+        self.readonly = readonly
         self.kodiconn = kodiconn
         self.cursor = self.kodiconn.cursor() if self.kodiconn else None
         self.artconn = artconn
         self.artcursor = self.artconn.cursor() if self.artconn else None
         self._has_video_version_table = None
+        # LRUCaches {name: id} per table, e.g. for genres or actors. Only
+        # live as long as this object (e.g. for a library sync)
+        self._name_caches = {}
 
     def __enter__(self):
         if self.lock:
             KODIDB_LOCK.acquire()
-        self.kodiconn = db.connect(self.db_kind)
+        self.kodiconn = db.connect(self.db_kind, readonly=self.readonly)
         self.cursor = self.kodiconn.cursor()
-        self.artconn = db.connect('texture') if self._texture_db \
-            else None
+        self.artconn = db.connect('texture', readonly=self.readonly) \
+            if self._texture_db else None
         self.artcursor = self.artconn.cursor() if self._texture_db else None
         return self
 
@@ -56,17 +91,32 @@ class KodiDBBase(object):
                 self.cursor.execute('SELECT url FROM art WHERE media_id = ? AND media_type = ?',
                                     (kodi_id, kodi_type)))
 
-    def artwork_generator(self, kodi_type, limit, offset):
-        query = 'SELECT url FROM art WHERE type == ? LIMIT ? OFFSET ?'
-        return (x[0] for x in
-                self.cursor.execute(query, (kodi_type, limit, offset)))
+    def artwork_generator(self, kodi_type, limit, last_art_id=0):
+        """
+        Yields at most limit tuples (art_id, url) for artwork of kind
+        kodi_type, ordered by art_id. Pass in the last art_id you received
+        to get the next batch
+        """
+        query = '''
+            SELECT art_id, url FROM art
+            WHERE type = ? AND art_id > ?
+            ORDER BY art_id
+            LIMIT ?
+        '''
+        return self.cursor.execute(query, (kodi_type, last_art_id, limit))
 
+    @db.catch_operationalerrors
     def add_artwork(self, artworks, kodi_id, kodi_type):
         """
         Pass in an artworks dict (see PlexAPI) to set an items artwork.
         """
-        for kodi_art, url in artworks.items():
-            self.add_art(url, kodi_id, kodi_type, kodi_art)
+        if not artworks:
+            return
+        self.cursor.executemany('''
+            INSERT INTO art(media_id, media_type, type, url)
+            VALUES (?, ?, ?, ?)
+        ''', ((kodi_id, kodi_type, kodi_art, url)
+              for kodi_art, url in artworks.items()))
 
     @db.catch_operationalerrors
     def add_art(self, url, kodi_id, kodi_type, kodi_art):
@@ -6,10 +6,9 @@ from . import common
 class KodiTextureDB(common.KodiDBBase):
     db_kind = 'texture'
 
-    def url_not_yet_cached(self, url):
+    def cached_urls(self):
         """
-        Returns True if url has not yet been cached to the Kodi texture cache
+        Returns the set of all urls that have already been cached to the Kodi
+        texture cache
         """
-        self.artcursor.execute('SELECT url FROM texture WHERE url = ? LIMIT 1',
-                               (url, ))
-        return self.artcursor.fetchone() is None
+        return set(x[0] for x in self.cursor.execute('SELECT url FROM texture'))
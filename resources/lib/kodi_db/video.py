@@ -1,14 +1,47 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 from logging import getLogger
+from collections import defaultdict
+import string
 
 from . import common
-from .. import db, path_ops, timing, variables as v
+from .. import db, path_ops, timing, utils, variables as v
 
 LOG = getLogger('PLEX.kodi_db.video')
 
 MOVIE_PATH = 'plugin://%s.movies/' % v.ADDON_ID
 SHOW_PATH = 'plugin://%s.tvshows/' % v.ADDON_ID
+# Max. number of variables we use in a single SQL query (SQLite < 3.32 only
+# allows for 999)
+MAX_SQL_VARIABLES = 500
+# Max. number of names (e.g. of genres or actors) cached per table
+NAME_CACHE_SIZE = 5000
+# SQLite's COLLATE NOCASE only folds ASCII characters
+ASCII_LOWERCASE = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def _fold(name, nocase):
+    """
+    Returns name the way SQLite compares it, with or without COLLATE NOCASE
+    """
+    return name.translate(ASCII_LOWERCASE) if nocase else name
+
+
+def _split(value):
+    """
+    Kodi stores lists like genres or directors as ' / '-separated strings
+    """
+    return value.split(' / ') if value else []
+
+
+def _file(path, filename):
+    """
+    Returns the full path of a file the way Kodi's JSON RPC would. Stacked
+    files and plugin paths already contain the path
+    """
+    if not filename or '://' in filename:
+        return filename or ''
+    return (path or '') + filename
 
 
 class KodiVideoDB(common.KodiDBBase):
@@ -218,59 +251,112 @@ class KodiVideoDB(common.KodiDBBase):
                 '''
                 self.cursor.execute(query, (path_id, MOVIE_PATH, SHOW_PATH))
 
+    def _name_cache(self, table):
+        try:
+            return self._name_caches[table]
+        except KeyError:
+            self._name_caches[table] = common.LRUCache(NAME_CACHE_SIZE)
+            return self._name_caches[table]
+
+    def _forget_names(self):
+        """
+        Call after deleting a movie, show, season or episode. Kodi's triggers
+        delete the item's links and might delete now orphaned tags, genres or
+        people, so cached ids might point to deleted rows
+        """
+        for cache in self._name_caches.values():
+            cache.clear()
+
+    def _select_ids_by_name(self, table, key, names, nocase):
+        """
+        Returns a dict {folded name: id} for all names [list of unicode] that
+        already exist in table
+        """
+        answer = {}
+        for i in range(0, len(names), MAX_SQL_VARIABLES):
+            chunk = names[i:i + MAX_SQL_VARIABLES]
+            query = 'SELECT %s, name FROM %s WHERE name %s IN (%s)' % (
+                key, table, 'COLLATE NOCASE' if nocase else '',
+                ','.join('?' * len(chunk)))
+            for entry_id, name in self.cursor.execute(query, chunk):
+                answer[_fold(name, nocase)] = entry_id
+        return answer
+
+    def _ids_by_name(self, table, key, names, nocase=True):
+        """
+        Returns the tuple ({name: id}, new_names) for all names [list of
+        unicode] in table, e.g. 'genre'. Names that were not yet recorded in
+        table will be inserted and are returned in the set new_names.
+        Looks up all names not yet cached with one single query
+        """
+        cache = self._name_cache(table)
+        ids = {}
+        missing = {}
+        for name in names:
+            entry_id = cache.get(_fold(name, nocase))
+            if entry_id is None:
+                missing[_fold(name, nocase)] = name
+            else:
+                ids[name] = entry_id
+        new_names = []
+        if missing:
+            found = self._select_ids_by_name(table, key,
+                                             list(missing.values()), nocase)
+            new_names = [name for folded, name in missing.items()
+                         if folded not in found]
+            if new_names:
+                self.cursor.executemany(
+                    'INSERT INTO %s(name) VALUES (?)' % table,
+                    ((x, ) for x in new_names))
+                found.update(self._select_ids_by_name(table, key, new_names,
+                                                      nocase))
+            for folded, entry_id in found.items():
+                cache.set(folded, entry_id)
+        for name in names:
+            if name not in ids:
+                ids[name] = cache.get(_fold(name, nocase))
+        return ids, set(new_names)
+
     @db.catch_operationalerrors
     def _modify_link_and_table(self, kodi_id, kodi_type, entries, link_table,
-                               table, key, first_id=None):
-        first_id = first_id if first_id is not None else 1
-        entry_ids = []
-        for entry in entries:
-            self.cursor.execute('''
-                SELECT %s FROM %s WHERE name = ? COLLATE NOCASE LIMIT 1
-            ''' % (key, table), (entry, ))
-            try:
-                entry_id = self.cursor.fetchone()[0]
-            except TypeError:
-                self.cursor.execute('INSERT INTO %s(name) VALUES(?)' % table,
-                                    (entry, ))
-                entry_id = self.cursor.lastrowid
-            finally:
-                entry_ids.append(entry_id)
-        # Now process the ids obtained from the names
+                               table, key):
+        entry_ids, _ = self._ids_by_name(table, key, entries)
+        entry_ids = set(entry_ids.values())
         # Get the existing, old entries
-        outdated_entries = []
-        for entry_id in self.cursor.execute('SELECT %s FROM %s WHERE media_id = ? AND media_type = ?'
-                                            % (key, link_table), (kodi_id, kodi_type)):
-            try:
-                entry_ids.remove(entry_id[0])
-            except ValueError:
-                outdated_entries.append(entry_id[0])
-        # Add all new entries that haven't already been added
-        for entry_id in entry_ids:
-            try:
-                self.cursor.execute('INSERT INTO %s VALUES (?, ?, ?)' % link_table,
-                                    (entry_id, kodi_id, kodi_type))
-            except Exception as exc:
-                # Bug with e.g. Nvidia Shield, Android 11 and Experience 9
-                # Directly catching sqlite3.IntegrityError here does NOT
-                # work and can even lead to Kodi crashing
-                # https://github.com/croneter/PlexKodiConnect/issues/1796
-                # https://github.com/croneter/PlexKodiConnect/issues/1777
-                if exc.args and 'UNIQUE constraint failed:' not in exc.args[0]:
-                    raise
-                LOG.info('IntegrityError 2: skipping entry %s for table %s',
-                         entry_id, link_table)
+        old_entry_ids = set(x[0] for x in self.cursor.execute(
+            'SELECT %s FROM %s WHERE media_id = ? AND media_type = ?'
+            % (key, link_table), (kodi_id, kodi_type)))
+        outdated_entries = old_entry_ids - entry_ids
+        # Add all new entries that haven't already been added. Ignore
+        # duplicates instead of catching sqlite3.IntegrityError - that does
+        # NOT work with e.g. Nvidia Shield, Android 11 and Experience 9
+        # https://github.com/croneter/PlexKodiConnect/issues/1796
+        # https://github.com/croneter/PlexKodiConnect/issues/1777
+        self.cursor.executemany(
+            'INSERT OR IGNORE INTO %s VALUES (?, ?, ?)' % link_table,
+            ((x, kodi_id, kodi_type) for x in entry_ids - old_entry_ids))
+        if not outdated_entries:
+            return
         # Delete all outdated references in the link table. Also check whether
         # we need to delete orphaned entries in the master table
-        for entry_id in outdated_entries:
-            self.cursor.execute('''
-                DELETE FROM %s WHERE %s = ? AND media_id = ? AND media_type = ?
-            ''' % (link_table, key), (entry_id, kodi_id, kodi_type))
-            self.cursor.execute('SELECT %s FROM %s WHERE %s = ?' % (key, link_table, key),
-                                (entry_id, ))
-            if self.cursor.fetchone() is None:
-                # Delete in the original table because entry is now orphaned
-                self.cursor.execute('DELETE FROM %s WHERE %s = ?' % (table, key),
-                                    (entry_id, ))
+        self.cursor.executemany('''
+            DELETE FROM %s WHERE %s = ? AND media_id = ? AND media_type = ?
+        ''' % (link_table, key),
+            ((x, kodi_id, kodi_type) for x in outdated_entries))
+        outdated_entries = list(outdated_entries)
+        orphaned = set(outdated_entries)
+        for i in range(0, len(outdated_entries), MAX_SQL_VARIABLES):
+            chunk = outdated_entries[i:i + MAX_SQL_VARIABLES]
+            orphaned.difference_update(x[0] for x in self.cursor.execute(
+                'SELECT %s FROM %s WHERE %s IN (%s)'
+                % (key, link_table, key, ','.join('?' * len(chunk))),
+                chunk))
+        if orphaned:
+            # Delete in the original table because entries are now orphaned
+            self.cursor.executemany(
+                'DELETE FROM %s WHERE %s = ?' % (table, key),
+                ((x, ) for x in orphaned))
+            self._name_cache(table).clear()
 
     def modify_countries(self, kodi_id, kodi_type, countries=None):
         """
@@ -331,48 +417,44 @@ class KodiVideoDB(common.KodiDBBase):
 
     @db.catch_operationalerrors
     def _add_people_kind(self, kodi_id, kodi_type, kind, people_list):
+        # Make sure the person entries in table actor exist
+        actor_ids, new_names = self._ids_by_name('actor',
+                                                 'actor_id',
+                                                 [x[0] for x in people_list],
+                                                 nocase=False)
         # Save new people to Kodi DB by iterating over the remaining entries
+        # Ignore duplicates instead of catching sqlite3.IntegrityError - that
+        # does NOT work with e.g. Nvidia Shield, Android 11 and Experience 9
+        # https://github.com/croneter/PlexKodiConnect/issues/1796
+        # https://github.com/croneter/PlexKodiConnect/issues/1777
         if kind == 'actor':
+            # Person might have shown up as a director or writer first
+            # WITHOUT an art url from the Plex side!
+            # Check here if we need to set the actor's art url
+            with_art = self._actors_with_art(
+                [actor_ids[x[0]] for x in people_list
+                 if x[1] and x[0] not in new_names])
+            thumbs = []
             for person in people_list:
-                # Make sure the person entry in table actor exists
-                actor_id, new = self._get_actor_id(person[0],
-                                                   art_url=person[1])
-                if not new and person[1]:
-                    # Person might have shown up as a director or writer first
-                    # WITHOUT an art url from the Plex side!
-                    # Check here if we need to set the actor's art url
-                    self._check_actor_art(actor_id, person[1])
-                # Link the person with the media element
-                try:
-                    self.cursor.execute('INSERT INTO actor_link VALUES (?, ?, ?, ?, ?)',
-                                        (actor_id, kodi_id, kodi_type,
-                                         person[2], person[3]))
-                except Exception as exc:
-                    # With Kodi, an actor may have only one role, unlike Plex
-                    # Bug with e.g. Nvidia Shield, Android 11 and Experience 9
-                    # Directly catching sqlite3.IntegrityError here does NOT
-                    # work and can even lead to Kodi crashing
-                    # https://github.com/croneter/PlexKodiConnect/issues/1796
-                    # https://github.com/croneter/PlexKodiConnect/issues/1777
-                    if exc.args and 'UNIQUE constraint failed:' not in exc.args[0]:
-                        raise
+                actor_id = actor_ids[person[0]]
+                if person[1] and actor_id not in with_art:
+                    thumbs.append((actor_id, 'actor', 'thumb', person[1]))
+                    with_art.add(actor_id)
+            if thumbs:
+                self.cursor.executemany('''
+                    INSERT INTO art(media_id, media_type, type, url)
+                    VALUES (?, ?, ?, ?)
+                ''', thumbs)
+            # With Kodi, an actor may have only one role, unlike Plex
+            self.cursor.executemany(
+                'INSERT OR IGNORE INTO actor_link VALUES (?, ?, ?, ?, ?)',
+                ((actor_ids[x[0]], kodi_id, kodi_type, x[2], x[3])
+                 for x in people_list))
         else:
-            for person in people_list:
-                # Make sure the person entry in table actor exists:
-                actor_id, _ = self._get_actor_id(person[0])
-                # Link the person with the media element
-                try:
-                    self.cursor.execute('INSERT INTO %s_link VALUES (?, ?, ?)' % kind,
-                                        (actor_id, kodi_id, kodi_type))
-                except Exception as exc:
-                    # Again, Kodi may have only one person assigned to a role
-                    # Bug with e.g. Nvidia Shield, Android 11 and Experience 9
-                    # Directly catching sqlite3.IntegrityError here does NOT
-                    # work and can even lead to Kodi crashing
-                    # https://github.com/croneter/PlexKodiConnect/issues/1796
-                    # https://github.com/croneter/PlexKodiConnect/issues/1777
-                    if exc.args and 'UNIQUE constraint failed:' not in exc.args[0]:
-                        raise
+            # Again, Kodi may have only one person assigned to a role
+            self.cursor.executemany(
+                'INSERT OR IGNORE INTO %s_link VALUES (?, ?, ?)' % kind,
+                ((actor_ids[x[0]], kodi_id, kodi_type) for x in people_list))
 
     def modify_people(self, kodi_id, kodi_type, people=None):
         """
@@ -435,50 +517,26 @@ class KodiVideoDB(common.KodiDBBase):
                 # person entry in actor table is now orphaned
                 # Delete the person from actor table
                 self.cursor.execute(query_actor_delete, (person[0],))
+                self._name_cache('actor').clear()
                 if kind == 'actor':
                     # Delete any associated artwork
                     self.delete_artwork(person[0], 'actor')
         # Save new people to Kodi DB by iterating over the remaining entries
         self._add_people_kind(kodi_id, kodi_type, kind, people_list)
 
-    @db.catch_operationalerrors
-    def _new_actor_id(self, name, art_url):
-        # Not yet in actor DB, add person
-        self.cursor.execute('INSERT INTO actor(name) VALUES (?)', (name, ))
-        actor_id = self.cursor.lastrowid
-        if art_url:
-            self.add_art(art_url, actor_id, 'actor', 'thumb')
-        return actor_id
-
-    def _get_actor_id(self, name, art_url=None):
-        """
-        Returns the tuple
-            (actor_id [int], new_entry [bool])
-        for name [unicode] in table actor (without ensuring that the name
-        matches)."new_entry" will be True if a new DB entry has just been
-        created.
-        If not, will create a new record with actor_id, name, art_url
-
-        Uses Plex ids and thus assumes that Plex person id is unique!
-        """
-        self.cursor.execute('SELECT actor_id FROM actor WHERE name=? LIMIT 1',
-                            (name,))
-        try:
-            return (self.cursor.fetchone()[0], False)
-        except TypeError:
-            return (self._new_actor_id(name, art_url), True)
-
-    def _check_actor_art(self, actor_id, url):
+    def _actors_with_art(self, actor_ids):
         """
-        Sets the actor's art url [unicode] for actor_id [int]
+        Returns the set of all actor_ids [list of int] that already got an
+        art url
         """
-        self.cursor.execute('''
-            SELECT EXISTS(SELECT 1 FROM art
-                          WHERE media_id = ? AND media_type = 'actor'
-                          LIMIT 1)''', (actor_id, ))
-        if not self.cursor.fetchone()[0]:
-            # We got a new artwork url for this actor!
-            self.add_art(url, actor_id, 'actor', 'thumb')
+        answer = set()
+        for i in range(0, len(actor_ids), MAX_SQL_VARIABLES):
+            chunk = actor_ids[i:i + MAX_SQL_VARIABLES]
+            answer.update(x[0] for x in self.cursor.execute('''
+                SELECT media_id FROM art
+                WHERE media_type = 'actor' AND media_id IN (%s)
+            ''' % ','.join('?' * len(chunk)), chunk))
+        return answer
 
     def get_art(self, kodi_id, kodi_type):
         """
@@ -499,6 +557,37 @@ class KodiVideoDB(common.KodiDBBase):
                             (kodi_id, kodi_type))
         return dict(self.cursor.fetchall())
 
+    def get_art_of_items(self, kodi_ids, kodi_type):
+        """
+        Same as get_art, but for several kodi_ids [list of int] at once.
+        Returns a dict {kodi_id: <get_art dict>} that contains an entry for
+        every kodi_id
+        """
+        answ = {x: {} for x in kodi_ids}
+        for i in range(0, len(kodi_ids), MAX_SQL_VARIABLES):
+            chunk = kodi_ids[i:i + MAX_SQL_VARIABLES]
+            query = '''
+                SELECT media_id, type, url FROM art
+                WHERE media_type = ? AND media_id IN (%s)
+            ''' % ','.join('?' * len(chunk))
+            for kodi_id, kodi_art, url in self.cursor.execute(
+                    query, [kodi_type] + chunk):
+                answ[kodi_id][kodi_art] = url
+        return answ
+
+    def get_trailers(self, kodi_ids):
+        """
+        Returns a dict {kodi_id: trailer url or None} for the movies kodi_ids
+        [list of int]
+        """
+        answ = {}
+        for i in range(0, len(kodi_ids), MAX_SQL_VARIABLES):
+            chunk = kodi_ids[i:i + MAX_SQL_VARIABLES]
+            query = 'SELECT idMovie, c19 FROM movie WHERE idMovie IN (%s)' \
+                % ','.join('?' * len(chunk))
+            answ.update(self.cursor.execute(query, chunk))
+        return answ
+
     def get_trailer(self, kodi_id, kodi_type):
         """
         Returns the trailer's URL for kodi_type from the Kodi database or None
@@ -535,45 +624,40 @@ class KodiVideoDB(common.KodiDBBase):
                             (fileid,))
         if not streamdetails:
             return
-        for videotrack in streamdetails['video']:
-            if v.KODIVERSION < 20:
-                self.cursor.execute('''
-                    INSERT OR REPLACE INTO streamdetails(
-                        idFile, iStreamType, strVideoCodec, fVideoAspect,
-                        iVideoWidth, iVideoHeight, iVideoDuration,
-                        strStereoMode)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (fileid, 0, videotrack['codec'],
-                          videotrack['aspect'], videotrack['width'],
-                          videotrack['height'], runtime,
-                          videotrack['video3DFormat']))
-            else:
-                self.cursor.execute('''
-                    INSERT OR REPLACE INTO streamdetails(
-                        idFile, iStreamType, strVideoCodec, fVideoAspect,
-                        iVideoWidth, iVideoHeight, iVideoDuration,
-                        strStereoMode, strHdrType)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (fileid, 0, videotrack['codec'],
-                          videotrack['aspect'], videotrack['width'],
-                          videotrack['height'], runtime,
-                          videotrack['video3DFormat'],
-                          videotrack['hdr']))
-        for audiotrack in streamdetails['audio']:
-            self.cursor.execute('''
+        # All kinds of streams in one go; the columns of the other kinds of
+        # streams are NULL
+        rows = [(fileid, 0, videotrack['codec'], videotrack['aspect'],
+                 videotrack['width'], videotrack['height'], runtime,
+                 videotrack['video3DFormat'], videotrack['hdr'],
+                 None, None, None, None)
+                for videotrack in streamdetails['video']]
+        rows.extend((fileid, 1, None, None, None, None, None, None, None,
+                     audiotrack['codec'], audiotrack['channels'],
+                     audiotrack['language'], None)
+                    for audiotrack in streamdetails['audio'])
+        rows.extend((fileid, 2, None, None, None, None, None, None, None,
+                     None, None, None, subtitletrack)
+                    for subtitletrack in streamdetails['subtitle'])
+        if not rows:
+            return
+        if v.KODIVERSION < 20:
+            self.cursor.executemany('''
                 INSERT OR REPLACE INTO streamdetails(
-                    idFile, iStreamType, strAudioCodec, iAudioChannels,
-                    strAudioLanguage)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (fileid, 1, audiotrack['codec'],
-                  audiotrack['channels'],
-                  audiotrack['language']))
-        for subtitletrack in streamdetails['subtitle']:
-            self.cursor.execute('''
-                INSERT OR REPLACE INTO streamdetails(idFile, iStreamType,
-                    strSubtitleLanguage)
-                VALUES (?, ?, ?)
-            ''', (fileid, 2, subtitletrack))
+                    idFile, iStreamType, strVideoCodec, fVideoAspect,
+                    iVideoWidth, iVideoHeight, iVideoDuration,
+                    strStereoMode, strAudioCodec, iAudioChannels,
+                    strAudioLanguage, strSubtitleLanguage)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (row[:8] + row[9:] for row in rows))
+        else:
+            self.cursor.executemany('''
+                INSERT OR REPLACE INTO streamdetails(
+                    idFile, iStreamType, strVideoCodec, fVideoAspect,
+                    iVideoWidth, iVideoHeight, iVideoDuration,
+                    strStereoMode, strHdrType, strAudioCodec,
+                    iAudioChannels, strAudioLanguage, strSubtitleLanguage)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
 
     def video_id_from_filename(self, filename, path):
         """
@@ -1011,16 +1095,19 @@ class KodiVideoDB(common.KodiDBBase):
     @db.catch_operationalerrors
     def remove_show(self, kodi_id):
         self.cursor.execute('DELETE FROM tvshow WHERE idShow = ?', (kodi_id,))
+        self._forget_names()
 
     @db.catch_operationalerrors
     def remove_season(self, kodi_id):
         self.cursor.execute('DELETE FROM seasons WHERE idSeason = ?',
                             (kodi_id,))
+        self._forget_names()
 
     @db.catch_operationalerrors
     def remove_episode(self, kodi_id):
         self.cursor.execute('DELETE FROM episode WHERE idEpisode = ?',
                             (kodi_id,))
+        self._forget_names()
 
     def new_movie_id(self):
         self.cursor.execute('SELECT COALESCE(MAX(idMovie), 0) FROM movie')
@@ -1076,6 +1163,7 @@ class KodiVideoDB(common.KodiDBBase):
     @db.catch_operationalerrors
     def remove_movie(self, kodi_id):
         self.cursor.execute('DELETE FROM movie WHERE idMovie = ?', (kodi_id,))
+        self._forget_names()
 
         if self.has_video_version_table:
             self.cursor.execute('DELETE FROM videoversion WHERE idMedia = ?', (kodi_id,))
@@ -1124,3 +1212,208 @@ class KodiVideoDB(common.KodiDBBase):
             (4, 'idType', 'INTEGER', 0, None, 0)
         ]
         self._has_video_version_table = columns == needed_columns
+
+    def _rows_by_id(self, query, ids, *args):
+        """
+        Executes query, containing a placeholder %s for an SQL IN clause, for
+        all ids [list of int], at most MAX_SQL_VARIABLES at a time. Pass the
+        query's other SQL variables as args. Returns the dict {id: [rows]}
+        with id being each row's first column
+        """
+        answer = defaultdict(list)
+        for i in range(0, len(ids), MAX_SQL_VARIABLES):
+            chunk = ids[i:i + MAX_SQL_VARIABLES]
+            for row in self.cursor.execute(
+                    query % ','.join('?' * len(chunk)), args + tuple(chunk)):
+                answer[row[0]].append(row[1:])
+        return answer
+
+    def _art_by_id(self, kodi_ids, kodi_type, prefix=''):
+        answer = defaultdict(dict)
+        rows = self._rows_by_id(
+            'SELECT media_id, type, url FROM art WHERE media_type = ? AND media_id IN (%s)',
+            kodi_ids, kodi_type)
+        for kodi_id, entries in rows.items():
+            for art_type, url in entries:
+                answer[kodi_id][prefix + art_type] = url
+        return answer
+
+    def items_details(self, kodi_ids, kodi_type):
+        """
+        Reads the Kodi details of the movies or episodes with kodi_ids [list
+        of int] directly from the Kodi DB, e.g. for widgets. Returns the dict
+        {kodi_id: item dict} with the same item dicts that
+        json_rpc.item_details() returns. Items that do not exist in the Kodi
+        DB are missing from the dict
+        """
+        kodi_ids = list(kodi_ids)
+        if kodi_type == v.KODI_TYPE_MOVIE:
+            rows = self._rows_by_id('''
+                SELECT idMovie, idFile, c00, c01, c02, c03, c06, c10, c11, c12,
+                    c13, c14, c15, c16, c18, c19, c21, premiered, idSet, strSet,
+                    strPath, strFileName, playCount, lastPlayed, dateAdded,
+                    resumeTimeInSeconds, totalTimeInSeconds, rating, votes,
+                    uniqueid_value
+                FROM movie_view
+                WHERE idMovie IN (%s)
+            ''', kodi_ids)
+        elif kodi_type == v.KODI_TYPE_EPISODE:
+            rows = self._rows_by_id('''
+                SELECT idEpisode, idFile, c00, c01, c04, c05, c09, c10, c12,
+                    c13, c14, idShow, idSeason, strTitle, strPath, strFileName,
+                    playCount, lastPlayed, dateAdded, resumeTimeInSeconds,
+                    totalTimeInSeconds, rating, votes
+                FROM episode_view
+                WHERE idEpisode IN (%s)
+            ''', kodi_ids)
+        else:
+            raise NotImplementedError('Unsupported kodi_type %s' % kodi_type)
+        answer = {}
+        for kodi_id, entries in rows.items():
+            row = entries[0]
+            if kodi_type == v.KODI_TYPE_MOVIE:
+                item = {
+                    'title': row[1],
+                    'plot': row[2],
+                    'plotoutline': row[3],
+                    'tagline': row[4],
+                    'writer': _split(row[5]),
+                    'sorttitle': row[6],
+                    'runtime': utils.cast(int, row[7]) or 0,
+                    'mpaa': row[8],
+                    'top250': utils.cast(int, row[9]) or 0,
+                    'genre': _split(row[10]),
+                    'director': _split(row[11]),
+                    'originaltitle': row[12],
+                    'studio': _split(row[13]),
+                    'trailer': row[14] or '',
+                    'country': _split(row[15]),
+                    'year': utils.cast(int, (row[16] or '')[:4]) or 0,
+                    'setid': row[17] or 0,
+                    'set': row[18] or '',
+                    'imdbnumber': row[28] or '',
+                    'showlink': []
+                }
+                path, filename = row[19], row[20]
+                row = row[21:28]
+            else:
+                item = {
+                    'title': row[1],
+                    'plot': row[2],
+                    'writer': _split(row[3]),
+                    'firstaired': row[4],
+                    'runtime': utils.cast(int, row[5]) or 0,
+                    'director': _split(row[6]),
+                    'season': utils.cast(int, row[7]) or 0,
+                    'episode': utils.cast(int, row[8]) or 0,
+                    'originaltitle': row[9],
+                    'tvshowid': row[10],
+                    'seasonid': row[11],
+                    'showtitle': row[12],
+                    'productioncode': ''
+                }
+                path, filename = row[13], row[14]
+                row = row[15:22]
+            item.update({
+                '%sid' % kodi_type: kodi_id,
+                'label': item['title'],
+                'file': _file(path, filename),
+                'fileid': entries[0][0],
+                'playcount': row[0] or 0,
+                'lastplayed': row[1] or '',
+                'dateadded': row[2] or '',
+                'resume': {'position': row[3] or 0.0, 'total': row[4] or 0.0},
+                'rating': row[5] or 0.0,
+                'votes': str(row[6] or 0),
+                'art': {},
+                'cast': [],
+                'uniqueid': {},
+                'streamdetails': {'video': [], 'audio': [], 'subtitle': []}
+            })
+            if kodi_type == v.KODI_TYPE_MOVIE:
+                item['tag'] = []
+            answer[kodi_id] = item
+        if not answer:
+            return answer
+        kodi_ids = list(answer)
+        # Artwork, for episodes including the artwork of the show and season
+        for kodi_id, art in self._art_by_id(kodi_ids, kodi_type).items():
+            answer[kodi_id]['art'].update(art)
+        if kodi_type == v.KODI_TYPE_EPISODE:
+            for key, kodi_type_parent, prefix in (
+                    ('tvshowid', v.KODI_TYPE_SHOW, 'tvshow.'),
+                    ('seasonid', v.KODI_TYPE_SEASON, 'season.')):
+                art = self._art_by_id(list(set(x[key] for x in answer.values())),
+                                      kodi_type_parent,
+                                      prefix)
+                for item in answer.values():
+                    item['art'].update(art.get(item[key], {}))
+        for item in answer.values():
+            item['fanart'] = item['art'].get('fanart', '')
+            item['thumbnail'] = item['art'].get('thumb', '')
+        # Cast
+        rows = self._rows_by_id('''
+            SELECT actor_link.media_id, actor.name, actor_link.role,
+                actor_link.cast_order, art.url
+            FROM actor_link
+            JOIN actor ON actor.actor_id = actor_link.actor_id
+            LEFT JOIN art ON art.media_id = actor.actor_id
+                AND art.media_type = 'actor' AND art.type = 'thumb'
+            WHERE actor_link.media_type = ? AND actor_link.media_id IN (%s)
+            ORDER BY actor_link.cast_order
+        ''', kodi_ids, kodi_type)
+        for kodi_id, entries in rows.items():
+            answer[kodi_id]['cast'] = [{
+                'name': name,
+                'role': role or '',
+                'order': order,
+                'thumbnail': thumb or ''
+            } for name, role, order, thumb in entries]
+        # Unique ids like imdb or tmdb
+        rows = self._rows_by_id('''
+            SELECT media_id, type, value FROM uniqueid
+            WHERE media_type = ? AND media_id IN (%s)
+        ''', kodi_ids, kodi_type)
+        for kodi_id, entries in rows.items():
+            answer[kodi_id]['uniqueid'] = dict(entries)
+        # Stream details are linked to the file, not the item
+        items_by_file_id = {x['fileid']: x for x in answer.values()}
+        rows = self._rows_by_id('''
+            SELECT idFile, iStreamType, strVideoCodec, fVideoAspect,
+                iVideoWidth, iVideoHeight, iVideoDuration, strAudioCodec,
+                iAudioChannels, strAudioLanguage, strSubtitleLanguage
+            FROM streamdetails
+            WHERE idFile IN (%s)
+        ''', list(items_by_file_id))
+        for file_id, entries in rows.items():
+            streams = items_by_file_id[file_id]['streamdetails']
+            for entry in entries:
+                if entry[0] == 0:
+                    streams['video'].append({
+                        'codec': entry[1] or '',
+                        'aspect': entry[2] or 0.0,
+                        'width': entry[3] or 0,
+                        'height': entry[4] or 0,
+                        'duration': entry[5] or 0
+                    })
+                elif entry[0] == 1:
+                    streams['audio'].append({
+                        'codec': entry[6] or '',
+                        'channels': entry[7] or 0,
+                        'language': entry[8] or ''
+                    })
+                elif entry[0] == 2:
+                    streams['subtitle'].append({'language': entry[9] or ''})
+        if kodi_type == v.KODI_TYPE_MOVIE:
+            rows = self._rows_by_id('''
+                SELECT tag_link.media_id, tag.name
+                FROM tag_link
+                JOIN tag ON tag.tag_id = tag_link.tag_id
+                WHERE tag_link.media_type = ? AND tag_link.media_id IN (%s)
+            ''', kodi_ids, kodi_type)
+            for kodi_id, entries in rows.items():
+                answer[kodi_id]['tag'] = [x[0] for x in entries]
+        for item in answer.values():
+            del item['fileid']
+            item.pop('seasonid', None)
+        return answer
@@ -16,7 +16,7 @@ from . import kodi_db
 from .downloadutils import DownloadUtils as DU
 from . import utils, timing, plex_functions as PF
 from . import json_rpc as js, playlist_func as PL
-from . import backgroundthread, app, variables as v
+from . import backgroundthread, app, widget_cache, variables as v
 from . import exceptions
 
 LOG = getLogger('PLEX.kodimonitor')
@@ -54,6 +54,9 @@ class KodiMonitor(xbmc.Monitor):
         Monitor the PKC settings for changes made by the user
         """
         LOG.debug('PKC settings change detected')
+        utils.SETTINGS.forget()
+        # Settings might change how widgets look like
+        widget_cache.invalidate()
 
     def onNotification(self, sender, method, data):
         """
@@ -99,7 +102,7 @@ class KodiMonitor(xbmc.Monitor):
             self.waitForAbort(10)
             app.CONN.online = False
         elif method == "GUI.OnScreensaverDeactivated":
-            if utils.settings('dbSyncScreensaver') == "true":
+            if utils.SETTINGS.get_bool('dbSyncScreensaver'):
                 self.waitForAbort(5)
                 app.SYNC.run_lib_scan = 'full'
         elif method == "System.OnQuit":
@@ -332,12 +335,12 @@ class KodiMonitor(xbmc.Monitor):
             else:
                 container_key = '/library/metadata/%s' % plex_id
         # Mechanik for Plex skip intro/credits/commercials feature
-        if utils.settings('enableSkipIntro') == 'true' \
-                or utils.settings('enableSkipCredits') == 'true' \
-                or utils.settings('enableSkipCommercials') == 'true':
+        if utils.SETTINGS.get_bool('enableSkipIntro') \
+                or utils.SETTINGS.get_bool('enableSkipCredits') \
+                or utils.SETTINGS.get_bool('enableSkipCommercials'):
             status['markers'] = item.api.markers()
             status['markers_hidden'] = {}
-            if utils.settings('enableSkipCredits') == 'true':
+            if utils.SETTINGS.get_bool('enableSkipCredits'):
                 status['first_credits_marker'] = item.api.first_credits_marker()
                 status['final_credits_marker'] = item.api.final_credits_marker()
         if item.playmethod is None and path and not path.startswith('plugin://'):
@@ -409,6 +412,8 @@ def _playback_cleanup(ended=False):
     app.PLAYSTATE.active_players = set()
     app.PLAYSTATE.item = None
     utils.delete_temporary_subtitles()
+    # Kodi updated resume points and playcounts, e.g. for On Deck
+    widget_cache.invalidate()
     LOG.debug('Finished PKC playback cleanup')
 
 
@@ -623,6 +628,8 @@ def _videolibrary_onupdate(data):
     except (KeyError, TypeError):
         LOG.debug("Item is invalid for a Plex playstate update")
         return
+    # The item's resume point or playcount changed
+    widget_cache.invalidate()
     playcount = data.get('playcount')
     if playcount is None:
         # "Reset resume position"
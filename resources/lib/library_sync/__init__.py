@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 from .full_sync import start
 from .websocket import store_websocket_message, process_websocket_messages, \
-    WEBSOCKET_MESSAGES, PLAYSTATE_SESSIONS
+    flush_playstates, WEBSOCKET_MESSAGES, PLAYSTATE_SESSIONS
 from .common import update_kodi_library, PLAYLIST_SYNC_ENABLED
 from .additional_metadata import MetadataThread, ProcessMetadataTask
 from .sections import force_full_sync, delete_files, clear_window_vars
@@ -3,7 +3,7 @@ from logging import getLogger
 
 from . import additional_metadata_tmdb
 from ..plex_db import PlexDB
-from .. import backgroundthread, utils
+from .. import backgroundthread, utils, lookup_cache
 from .. import variables as v, app
 from ..exceptions import ProcessingNotDone
 
@@ -40,8 +40,11 @@ class MetadataThread(backgroundthread.KillableThread):
     def should_suspend(self):
         return self._suspended or app.APP.is_playing_video
 
+    def _should_stop(self):
+        return self.should_suspend() or self.should_cancel()
+
     def _process_in_batches(self, item_getter, processor, plex_type):
-        offset = 0
+        last_plex_id = 0
         while True:
             with PlexDB(lock=False) as plexdb:
                 # Keep DB connection open only for a short period of time!
@@ -50,15 +53,16 @@ class MetadataThread(backgroundthread.KillableThread):
                     func = plexdb.every_plex_id
                 else:
                     func = getattr(plexdb, item_getter)
-                batch = list(func(plex_type, offset, BATCH_SIZE))
-            for plex_id in batch:
-                # Do the actual, time-consuming processing
-                if self.should_suspend() or self.should_cancel():
-                    raise ProcessingNotDone()
-                processor(plex_id, plex_type, self.refresh)
+                batch = list(func(plex_type, BATCH_SIZE, last_plex_id))
+            if self.should_suspend() or self.should_cancel():
+                raise ProcessingNotDone()
+            # Do the actual, time-consuming processing
+            processor(batch, plex_type, self.refresh, self._should_stop)
+            if self.should_suspend() or self.should_cancel():
+                raise ProcessingNotDone()
             if len(batch) < BATCH_SIZE:
                 break
-            offset += BATCH_SIZE
+            last_plex_id = batch[-1]
 
     def _loop(self):
         for plex_type in SUPPORTED_METADATA:
@@ -79,6 +83,8 @@ class MetadataThread(backgroundthread.KillableThread):
             if self.wait_while_suspended():
                 break
         logger.info('MetadataThread finished completely: %s', finished)
+        lookup_cache.evict()
+        lookup_cache.log_statistics()
         self.callback(finished)
 
     def run(self):
@@ -109,4 +115,7 @@ class ProcessMetadataTask(backgroundthread.Task):
                 return
             if not processing_is_activated(item_getter):
                 continue
-            processor(self.plex_id, self.plex_type, self.refresh)
+            processor([self.plex_id],
+                      self.plex_type,
+                      self.refresh,
+                      self.should_cancel)
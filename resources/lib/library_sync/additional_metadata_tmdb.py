@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 import logging
+import json
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import xbmcvfs
 import xbmcaddon
@@ -10,7 +12,8 @@ import xbmcaddon
 from ..plex_api import API
 from ..kodi_db import KodiVideoDB
 from ..plex_db import PlexDB
-from .. import itemtypes, plex_functions as PF, utils, variables as v
+from .. import itemtypes, plex_functions as PF, utils, variables as v, app
+from .. import lookup_cache
 
 # Import the existing Kodi add-on metadata.themoviedb.org.python
 __ADDON__ = xbmcaddon.Addon(id='metadata.themoviedb.org.python')
@@ -22,6 +25,8 @@ import tmdbscraper.tmdb as tmdb
 logger = logging.getLogger('PLEX.metadata_movies')
 PREFER_KODI_COLLECTION_ART = utils.settings('PreferKodiCollectionArt') == 'false'
 TMDB_SUPPORTED_IDS = ('tmdb', 'imdb')
+# Number of threads looking up metadata on the PMS and on external sites
+WORKER_COUNT = 4
 
 
 def get_tmdb_scraper(settings):
@@ -45,115 +50,209 @@ def get_tmdb_details(unique_ids):
     return details
 
 
-def process_trailers(plex_id, plex_type, refresh=False):
-    done = True
-    try:
-        with PlexDB(lock=False) as plexdb:
-            db_item = plexdb.item_by_id(plex_id, plex_type)
-        if not db_item:
+@lookup_cache.cached('themoviedb_trailer',
+                     lambda unique_ids: json.dumps(unique_ids, sort_keys=True))
+def get_tmdb_trailer(unique_ids):
+    """
+    Returns the trailer's url for the item with unique_ids [dict] or None
+    """
+    details = get_tmdb_details(unique_ids)
+    if 'error' in details:
+        return lookup_cache.MISS
+    return details.get('info', {}).get('trailer')
+
+
+def _download_metadata(executor, plex_ids):
+    """
+    Downloads the Plex metadata for all plex_ids concurrently, using several
+    items per PMS request. Returns a dict {plex_id: xml} for all items whose
+    metadata we could get
+    """
+    size = app.SYNC.metadata_batch_size
+    xmls = {}
+    for answ in executor.map(PF.get_plex_metadata_batch,
+                             [plex_ids[i:i + size]
+                              for i in range(0, len(plex_ids), size)]):
+        if answ not in (None, 401):
+            xmls.update(answ)
+    missing = [x for x in plex_ids if x not in xmls]
+    # Fall back to one request per item
+    xmls.update(zip(missing, executor.map(PF.GetPlexMetadata, missing)))
+    for plex_id in plex_ids:
+        try:
+            xmls[plex_id][0].attrib
+        except (TypeError, IndexError, AttributeError):
+            logger.warn('Could not get metadata for %s. Skipping that item '
+                        'for now', plex_id)
+            del xmls[plex_id]
+    return xmls
+
+
+def _trailer(plex_type, xml, should_stop):
+    """
+    Looks up the trailer for the item. Returns the trailer's url, None if
+    there is no trailer or False if we need to stop
+    """
+    if should_stop():
+        return False
+    api = API(xml[0])
+    if (not api.guids or
+            not [x for x in api.guids if x in TMDB_SUPPORTED_IDS]):
+        logger.debug('No unique ids found for %s %s, cannot get a trailer',
+                     plex_type, api.title())
+        return
+    trailer = get_tmdb_trailer(api.guids)
+    if trailer:
+        logger.debug('Found a new trailer for %s %s: %s',
+                     plex_type, api.title(), trailer)
+    else:
+        logger.debug('No trailer found for %s %s', plex_type, api.title())
+    return trailer
+
+
+def process_trailers(plex_ids, plex_type, refresh=False, should_stop=None):
+    """
+    Looks for trailers for all plex_ids [list of int, at most 999] of
+    plex_type. Pass in should_stop, a function returning True if we need to
+    stop processing. Will set the trailer_synced flag in the Plex DB for all
+    items we processed
+    """
+    should_stop = should_stop or (lambda: False)
+    with PlexDB(lock=False) as plexdb:
+        kodi_ids = plexdb.kodi_ids(plex_ids, plex_type)
+    for plex_id in plex_ids:
+        if plex_id not in kodi_ids:
             logger.error('Could not get Kodi id for %s %s', plex_type, plex_id)
-            done = False
-            return
-        with KodiVideoDB(lock=False) as kodidb:
-            trailer = kodidb.get_trailer(db_item['kodi_id'],
-                                         db_item['kodi_type'])
+    with KodiVideoDB(lock=False) as kodidb:
+        trailers = kodidb.get_trailers(list(kodi_ids.values()))
+    done, todo = [], []
+    for plex_id, kodi_id in kodi_ids.items():
+        trailer = trailers.get(kodi_id)
         if trailer and (trailer.startswith(f'plugin://{v.ADDON_ID}') or
                         not refresh):
             # No need to get a trailer
-            return
-        logger.debug('Processing trailer for %s %s', plex_type, plex_id)
-        xml = PF.GetPlexMetadata(plex_id)
-        try:
-            xml[0].attrib
-        except (TypeError, IndexError, AttributeError):
-            logger.warn('Could not get metadata for %s. Skipping that %s '
-                     'for now', plex_id, plex_type)
-            done = False
-            return
-        api = API(xml[0])
-        if (not api.guids or
-                not [x for x in api.guids if x in TMDB_SUPPORTED_IDS]):
-            logger.debug('No unique ids found for %s %s, cannot get a trailer',
-                         plex_type, api.title())
-            return
-        trailer = get_tmdb_details(api.guids)
-        trailer = trailer.get('info', {}).get('trailer')
-        if trailer:
-            with KodiVideoDB() as kodidb:
-                kodidb.set_trailer(db_item['kodi_id'],
-                                   db_item['kodi_type'],
-                                   trailer)
-            logger.debug('Found a new trailer for %s %s: %s',
-                         plex_type, api.title(), trailer)
+            done.append(plex_id)
         else:
-            logger.debug('No trailer found for %s %s', plex_type, api.title())
-    finally:
-        if done is True:
-            with PlexDB() as plexdb:
-                plexdb.set_trailer_synced(plex_id, plex_type)
+            todo.append(plex_id)
+    trailers = {}
+    if todo and not should_stop():
+        logger.debug('Processing trailers for %s %ss', len(todo), plex_type)
+        with ThreadPoolExecutor(max_workers=WORKER_COUNT) as executor:
+            xmls = _download_metadata(executor, todo)
+            futures = {executor.submit(_trailer, plex_type, xml, should_stop):
+                       plex_id for plex_id, xml in xmls.items()}
+            for future in as_completed(futures):
+                trailer = future.result()
+                if trailer is False:
+                    continue
+                done.append(futures[future])
+                if trailer:
+                    trailers[futures[future]] = trailer
+    if trailers:
+        # Write everything in one single transaction
+        with KodiVideoDB() as kodidb:
+            for plex_id, trailer in trailers.items():
+                kodidb.set_trailer(kodi_ids[plex_id],
+                                   v.KODITYPE_FROM_PLEXTYPE[plex_type],
+                                   trailer)
+    with PlexDB() as plexdb:
+        plexdb.set_trailer_synced(done, plex_type)
+
+
+def _fanart(plex_type, xml, artworks, should_stop):
+    """
+    Looks up additional fanart for the item on fanart sites. Returns the dict
+    {'artworks': artworks, 'sets': [(setname, artworks)]} or None if we need
+    to stop
+    """
+    if should_stop():
+        return
+    api = API(xml[0])
+    if artworks is None:
+        artworks = api.artwork()
+    # Get additional missing artwork from fanart artwork sites
+    answ = {'artworks': api.fanart_artwork(artworks), 'sets': []}
+    # Additional fanart for sets/collections
+    if plex_type == v.PLEX_TYPE_MOVIE:
+        collections = api.collections()
+        if collections:
+            external_set_artwork = api.set_artwork()
+            for _, setname in collections:
+                answ['sets'].append((setname, dict(external_set_artwork)))
+    return answ
 
 
-def process_fanart(plex_id, plex_type, refresh=False):
+def process_fanart(plex_ids, plex_type, refresh=False, should_stop=None):
     """
-    Will look for additional fanart for the plex_type item with plex_id.
-    Will check if we already got all artwork and only look if some are indeed
-    missing.
-    Will set the fanart_synced flag in the Plex DB if successful.
+    Will look for additional fanart for all plex_ids [list of int, at most
+    999] of plex_type. Will check if we already got all artwork and only look
+    if some are indeed missing. Pass in should_stop, a function returning True
+    if we need to stop processing.
+    Will set the fanart_synced flag in the Plex DB for all items we processed
     """
-    done = True
-    try:
-        artworks = None
-        with PlexDB(lock=False) as plexdb:
-            db_item = plexdb.item_by_id(plex_id, plex_type)
-        if not db_item:
+    should_stop = should_stop or (lambda: False)
+    kodi_type = v.KODITYPE_FROM_PLEXTYPE[plex_type]
+    with PlexDB(lock=False) as plexdb:
+        kodi_ids = plexdb.kodi_ids(plex_ids, plex_type)
+    for plex_id in plex_ids:
+        if plex_id not in kodi_ids:
             logger.error('Could not get Kodi id for %s %s', plex_type, plex_id)
-            done = False
-            return
-        if not refresh:
-            with KodiVideoDB(lock=False) as kodidb:
-                artworks = kodidb.get_art(db_item['kodi_id'],
-                                          db_item['kodi_type'])
+    done, todo = [], {}
+    if refresh:
+        todo = dict.fromkeys(kodi_ids)
+    else:
+        with KodiVideoDB(lock=False) as kodidb:
+            artworks = kodidb.get_art_of_items(list(kodi_ids.values()),
+                                               kodi_type)
+        for plex_id, kodi_id in kodi_ids.items():
             # Check if we even need to get additional art
             for key in v.ALL_KODI_ARTWORK:
-                if key not in artworks:
+                if key not in artworks[kodi_id]:
+                    todo[plex_id] = artworks[kodi_id]
                     break
             else:
-                return
-        xml = PF.GetPlexMetadata(plex_id)
-        try:
-            xml[0].attrib
-        except (TypeError, IndexError, AttributeError):
-            logger.debug('Could not get metadata for %s %s. Skipping that '
-                         'item for now', plex_type, plex_id)
-            done = False
-            return
-        api = API(xml[0])
-        if artworks is None:
-            artworks = api.artwork()
-        # Get additional missing artwork from fanart artwork sites
-        artworks = api.fanart_artwork(artworks)
-        with itemtypes.ITEMTYPE_FROM_PLEXTYPE[plex_type](None) as context:
-            context.set_fanart(artworks,
-                               db_item['kodi_id'],
-                               db_item['kodi_type'])
-        # Additional fanart for sets/collections
-        if plex_type == v.PLEX_TYPE_MOVIE:
-            for _, setname in api.collections():
+                done.append(plex_id)
+    results = {}
+    if todo and not should_stop():
+        logger.debug('Processing fanart for %s %ss', len(todo), plex_type)
+        with ThreadPoolExecutor(max_workers=WORKER_COUNT) as executor:
+            xmls = _download_metadata(executor, list(todo))
+            futures = {executor.submit(_fanart,
+                                       plex_type,
+                                       xml,
+                                       todo[plex_id],
+                                       should_stop): plex_id
+                       for plex_id, xml in xmls.items()}
+            for future in as_completed(futures):
+                result = future.result()
+                if result is not None:
+                    results[futures[future]] = result
+    if results:
+        _write_fanart(plex_type, kodi_ids, results)
+    done.extend(results)
+    with PlexDB() as plexdb:
+        plexdb.set_fanart_synced(done, plex_type)
+
+
+def _write_fanart(plex_type, kodi_ids, results):
+    """
+    Writes the fanart we found for all items in one single transaction
+    """
+    kodi_type = v.KODITYPE_FROM_PLEXTYPE[plex_type]
+    with itemtypes.ITEMTYPE_FROM_PLEXTYPE[plex_type](None) as context:
+        for plex_id, result in results.items():
+            context.set_fanart(result['artworks'],
+                               kodi_ids[plex_id],
+                               kodi_type)
+            for setname, external_set_artwork in result['sets']:
                 logger.debug('Getting artwork for movie set %s', setname)
-                with KodiVideoDB() as kodidb:
-                    setid = kodidb.create_collection(setname)
-                external_set_artwork = api.set_artwork()
+                setid = context.kodidb.create_collection(setname)
                 if external_set_artwork and PREFER_KODI_COLLECTION_ART:
-                    kodi_artwork = api.artwork(kodi_id=setid,
-                                               kodi_type=v.KODI_TYPE_SET)
+                    kodi_artwork = context.kodidb.get_art(setid,
+                                                          v.KODI_TYPE_SET)
                     for art in kodi_artwork:
                         if art in external_set_artwork:
                             del external_set_artwork[art]
-                with itemtypes.Movie(None) as movie:
-                    movie.kodidb.modify_artwork(external_set_artwork,
-                                                setid,
-                                                v.KODI_TYPE_SET)
-    finally:
-        if done is True:
-            with PlexDB() as plexdb:
-                plexdb.set_fanart_synced(plex_id, plex_type)
+                context.kodidb.modify_artwork(external_set_artwork,
+                                              setid,
+                                              v.KODI_TYPE_SET)
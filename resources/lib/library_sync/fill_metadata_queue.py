@@ -4,7 +4,7 @@ from queue import Full
 
 from . import common, sections
 from ..plex_db import PlexDB
-from .. import backgroundthread
+from .. import backgroundthread, utils, metrics
 
 LOG = getLogger('PLEX.sync.fill_metadata_queue')
 
@@ -37,7 +37,9 @@ class FillMetadataQueue(common.LibrarySyncMixin,
             for xml in section.iterator:
                 if self.should_cancel():
                     break
+                metrics.count('scanned_items')
                 plex_id = int(xml.get('ratingKey'))
+                updated_at = utils.cast(int, xml.get('updatedAt'))
                 checksum = int('{}{}'.format(
                     plex_id,
                     abs(int(xml.get('updatedAt',
@@ -50,7 +52,10 @@ class FillMetadataQueue(common.LibrarySyncMixin,
                     self.processing_queue.add_section(section)
                     LOG.debug('Put section in processing queue: %s', section)
                 try:
-                    self.get_metadata_queue.put((count, plex_id, section),
+                    self.get_metadata_queue.put((count,
+                                                 plex_id,
+                                                 section,
+                                                 updated_at),
                                                 timeout=QUEUE_TIMEOUT)
                 except Full:
                     LOG.error('Putting %s in get_metadata_queue timed out - '
@@ -59,6 +64,8 @@ class FillMetadataQueue(common.LibrarySyncMixin,
                     break
                 else:
                     count += 1
+                    metrics.gauge('get_metadata_queue',
+                                  self.get_metadata_queue.qsize())
         # We might have received LESS items from the PMS than anticipated.
         # Ensures that our queues finish
         self.processing_queue.change_section_number_of_items(section,
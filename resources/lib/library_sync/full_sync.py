@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 from logging import getLogger
+from collections import defaultdict
 import queue
 
 import xbmcgui
@@ -9,8 +10,10 @@ from .get_metadata import GetMetadataThread
 from .fill_metadata_queue import FillMetadataQueue
 from .process_metadata import ProcessMetadataThread
 from . import common, sections
+from ..plex_db import PlexDB
+from ..downloadutils import DownloadUtils as DU
 from .. import utils, timing, backgroundthread as bg, variables as v, app
-from .. import plex_functions as PF, itemtypes, path_ops
+from .. import plex_functions as PF, itemtypes, path_ops, metrics
 
 if common.PLAYLIST_SYNC_ENABLED:
     from .. import playlists
@@ -39,7 +42,7 @@ class FullSync(common.LibrarySyncMixin, bg.KillableThread):
         self.callback = callback
         # For progress dialog
         self.show_dialog = show_dialog
-        self.show_dialog_userdata = utils.settings('playstate_sync_indicator') == 'true'
+        self.show_dialog_userdata = utils.SETTINGS.get_bool('playstate_sync_indicator')
         if self.show_dialog:
             self.dialog = xbmcgui.DialogProgressBG()
             self.dialog.create(utils.lang(39714))
@@ -47,7 +50,10 @@ class FullSync(common.LibrarySyncMixin, bg.KillableThread):
             self.dialog = None
         self.current_time = timing.plex_now()
         self.last_section = sections.Section()
-        self.install_sync_done = utils.settings('SyncInstallRunDone') == 'true'
+        self.install_sync_done = utils.SETTINGS.get_bool('SyncInstallRunDone')
+        # Every plex_id the PMS told us about, per plex_type. Items in the Plex
+        # DB that are missing here will be deleted
+        self.plex_ids_on_pms = defaultdict(set)
         super(FullSync, self).__init__()
 
     def update_progressbar(self, section, title, current):
@@ -87,7 +93,7 @@ class FullSync(common.LibrarySyncMixin, bg.KillableThread):
         scanner_thread.start()
         metadata_threads = [
             GetMetadataThread(get_metadata_queue, processing_queue)
-            for _ in range(int(utils.settings('syncThreadNumber')))
+            for _ in range(app.SYNC.sync_thread_number)
         ]
         for t in metadata_threads:
             t.start()
@@ -117,6 +123,7 @@ class FullSync(common.LibrarySyncMixin, bg.KillableThread):
     def playstate_per_section(self, section):
         LOG.debug('Processing %s playstates for library section %s',
                   section.number_of_items, section)
+        plex_ids = self.plex_ids_on_pms[section.plex_type]
         try:
             with section.context(self.current_time) as context:
                 for xml in section.iterator:
@@ -126,9 +133,7 @@ class FullSync(common.LibrarySyncMixin, bg.KillableThread):
                         context.add_update(xml,
                                            section_name=section.name,
                                            section_id=section.section_id)
-                    context.plexdb.update_last_sync(int(xml.attrib['ratingKey']),
-                                                    section.plex_type,
-                                                    self.current_time)
+                    plex_ids.add(int(xml.attrib['ratingKey']))
                     self.update_progressbar(section, '', section.count - 1)
                     if section.count % PLAYSTATE_BATCH_SIZE == 0:
                         context.commit()
@@ -284,22 +289,21 @@ class FullSync(common.LibrarySyncMixin, bg.KillableThread):
             ])
         for plex_type, context in kinds:
             # Delete movies that are not on Plex anymore
-            while True:
+            with PlexDB() as plexdb:
+                plex_ids = plexdb.plex_ids_not_in(
+                    plex_type, self.plex_ids_on_pms[plex_type])
+            LOG.debug('Deleting %s items of type %s', len(plex_ids), plex_type)
+            for i in range(0, len(plex_ids), DELETION_BATCH_SIZE):
                 with context(self.current_time) as ctx:
-                    plex_ids = list(
-                        ctx.plexdb.plex_id_by_last_sync(plex_type,
-                                                        self.current_time,
-                                                        DELETION_BATCH_SIZE))
-                    for plex_id in plex_ids:
+                    for plex_id in plex_ids[i:i + DELETION_BATCH_SIZE]:
                         if self.should_cancel():
                             return
                         ctx.remove(plex_id, plex_type)
-                if len(plex_ids) < DELETION_BATCH_SIZE:
-                    break
         LOG.debug('Done looking for items to delete')
 
     @utils.log_time
     def _run(self):
+        metrics.reset()
         try:
             # Get latest Plex libraries and build playlist and video node files
             if self.should_cancel() or not sections.sync_from_pms(self):
@@ -308,6 +312,8 @@ class FullSync(common.LibrarySyncMixin, bg.KillableThread):
             self.full_library_sync()
         finally:
             common.update_kodi_library(video=True, music=True)
+            DU().log_statistics()
+            metrics.write_summary('repair sync' if self.repair else 'full sync')
             if self.dialog:
                 self.dialog.close()
             if not self.successful and not self.should_cancel():
@@ -321,4 +327,4 @@ class FullSync(common.LibrarySyncMixin, bg.KillableThread):
 
 def start(show_dialog, repair=False, callback=None):
     # Call run() and NOT start in order to not spawn another thread
-    FullSync(repair, callback, show_dialog).run()
+    bg.maybe_profiled(FullSync(repair, callback, show_dialog)).run()
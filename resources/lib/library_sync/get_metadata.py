@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 from logging import getLogger
+import queue
 
 from . import common
 from ..plex_api import API
-from .. import backgroundthread, plex_functions as PF, utils, variables as v
+from .. import backgroundthread, plex_functions as PF, utils, app, metrics
+from .. import async_download, variables as v
 
 LOG = getLogger('PLEX.sync.get_metadata')
 LOCK = backgroundthread.threading.Lock()
@@ -13,7 +15,8 @@ class GetMetadataThread(common.LibrarySyncMixin,
                         backgroundthread.KillableThread):
     """
     Threaded download of Plex XML metadata for a certain library item.
-    Fills the queue with the downloaded etree XML objects
+    Fills the queue with the downloaded etree XML objects. Will download the
+    metadata of up to app.SYNC.metadata_batch_size items with one request
     """
     def __init__(self, get_metadata_queue, processing_queue):
         self.get_metadata_queue = get_metadata_queue
@@ -67,56 +70,132 @@ class GetMetadataThread(common.LibrarySyncMixin,
         # Add a "dummy" item so we're not skipping a beat
         self.processing_queue.put((count, {'section': section, 'xml': None}))
 
-    def _run(self):
-        while True:
-            item = self.get_metadata_queue.get()
+    def _get_batch(self):
+        """
+        Blocks until we get the next item from get_metadata_queue, then grabs
+        up to app.SYNC.metadata_batch_size items without blocking. Returns a
+        list of (count, plex_id, section, updated_at) tuples; the sentinel None
+        will always be the last entry of the list
+        """
+        with metrics.timer('wait_get_metadata_queue_ms'):
+            batch = [self.get_metadata_queue.get()]
+        while (batch[-1] is not None and
+               len(batch) < app.SYNC.metadata_batch_size):
             try:
-                if item is None or self.should_cancel():
-                    self._process_abort(item[0] if item else None,
-                                        item[2] if item else None)
+                batch.append(self.get_metadata_queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    @staticmethod
+    def _children_futures(items):
+        """
+        Starts downloading the children of all items that need them using the
+        asyncio download engine. Returns a dict {plex_id: future}
+        """
+        if not app.SYNC.async_downloads:
+            return {}
+        return {plex_id: PF.get_all_plex_children_future(plex_id)
+                for _, plex_id, section, _ in items if section.get_children}
+
+    def _process_item(self, count, plex_id, section, xml, children=None):
+        """
+        Pass in a future for children if we already started downloading the
+        item's children. Returns False if this thread should stop processing
+        items
+        """
+        item = {
+            'xml': xml,
+            'children': None,
+            'section': section
+        }
+        if item['xml'] is None:
+            # Did not receive a valid XML - skip that item for now
+            LOG.error("Could not get metadata for %s. Skipping item "
+                      "for now", plex_id)
+            self._process_skipped_item(count, section)
+            return True
+        elif item['xml'] == 401:
+            LOG.error('HTTP 401 returned by PMS. Too much strain? '
+                      'Cancelling sync for now')
+            utils.window('plex_scancrashed', value='401')
+            self._process_abort(count, section)
+            return False
+        if section.plex_type == v.PLEX_TYPE_MOVIE:
+            # Check for collections/sets
+            collections = False
+            for child in item['xml'][0]:
+                if child.tag == 'Collection':
+                    collections = True
                     break
-                count, plex_id, section = item
-                item = {
-                    'xml': PF.GetPlexMetadata(plex_id),  # This will block
-                    'children': None,
-                    'section': section
-                }
-                if item['xml'] is None:
-                    # Did not receive a valid XML - skip that item for now
-                    LOG.error("Could not get metadata for %s. Skipping item "
-                              "for now", plex_id)
+            if collections:
+                with LOCK:
+                    self._collections(item)
+        if section.get_children:
+            if self.should_cancel():
+                self._process_abort(count, section)
+                return False
+            if children is not None:
+                children_xml = async_download.result(children)
+            else:
+                children_xml = PF.GetAllPlexChildren(plex_id)  # Will block
+            try:
+                children_xml[0].attrib
+            except (TypeError, IndexError, AttributeError):
+                LOG.error('Could not get children for Plex id %s',
+                          plex_id)
+                self._process_skipped_item(count, section)
+                return True
+            else:
+                item['children'] = children_xml
+        self.processing_queue.put((count, item))
+        metrics.gauge('processing_queue', self.processing_queue.qsize())
+        return True
+
+    def _process_batch(self, batch):
+        """
+        Returns False if this thread should stop processing items
+        """
+        items = [x for x in batch if x is not None]
+        if self.should_cancel():
+            self._process_abort(None, None)
+            for count, _, section, _ in items:
+                self._process_skipped_item(count, section)
+            return False
+        children = self._children_futures(items)
+        # Metadata of unchanged items might still be cached, e.g. for repair
+        # syncs
+        xmls = PF.cached_plex_metadata([(x[1], x[3]) for x in items])
+        with metrics.timer('download_metadata_ms'):
+            downloaded = PF.download_plex_metadata([x[1] for x in items
+                                                    if x[1] not in xmls])
+        metrics.count('downloaded_items', len(downloaded))
+        metrics.count('cached_items', len(xmls))
+        PF.cache_plex_metadata(downloaded)
+        xmls.update(downloaded)
+        for i, (count, plex_id, section, _) in enumerate(items):
+            if not self._process_item(count,
+                                      plex_id,
+                                      section,
+                                      xmls[plex_id],
+                                      children.get(plex_id)):
+                # Make sure we're not loosing the rest of this batch
+                for count, _, section, _ in items[i + 1:]:
                     self._process_skipped_item(count, section)
-                    continue
-                elif item['xml'] == 401:
-                    LOG.error('HTTP 401 returned by PMS. Too much strain? '
-                              'Cancelling sync for now')
-                    utils.window('plex_scancrashed', value='401')
-                    self._process_abort(count, section)
+                for future in children.values():
+                    future.cancel()
+                return False
+        if batch[-1] is None:
+            self._process_abort(None, None)
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            batch = self._get_batch()
+            try:
+                if not self._process_batch(batch):
                     break
-                if section.plex_type == v.PLEX_TYPE_MOVIE:
-                    # Check for collections/sets
-                    collections = False
-                    for child in item['xml'][0]:
-                        if child.tag == 'Collection':
-                            collections = True
-                            break
-                    if collections:
-                        with LOCK:
-                            self._collections(item)
-                if section.get_children:
-                    if self.should_cancel():
-                        self._process_abort(count, section)
-                        break
-                    children_xml = PF.GetAllPlexChildren(plex_id)  # Will block
-                    try:
-                        children_xml[0].attrib
-                    except (TypeError, IndexError, AttributeError):
-                        LOG.error('Could not get children for Plex id %s',
-                                  plex_id)
-                        self._process_skipped_item(count, section)
-                        continue
-                    else:
-                        item['children'] = children_xml
-                self.processing_queue.put((count, item))
             finally:
-                self.get_metadata_queue.task_done()
+                for _ in batch:
+                    self.get_metadata_queue.task_done()
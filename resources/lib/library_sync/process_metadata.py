@@ -3,7 +3,7 @@ from logging import getLogger
 
 from . import common, sections
 from ..plex_db import PlexDB
-from .. import backgroundthread, app
+from .. import backgroundthread, app, metrics
 
 LOG = getLogger('PLEX.sync.process_metadata')
 
@@ -13,7 +13,11 @@ COMMIT_TO_DB_EVERY_X_ITEMS = 500
 class ProcessMetadataThread(common.LibrarySyncMixin,
                             backgroundthread.KillableThread):
     """
-    Invoke once in order to process the received PMS metadata xmls
+    Invoke once in order to process the received PMS metadata xmls. Writes to
+    the databases in this very thread: the GetMetadataThreads download and
+    parse the xmls in parallel already, and a separate thread for the
+    remaining xml parsing did not make full syncs faster, see
+    tools/bench/README.md
     """
     def __init__(self, current_time, processing_queue, update_progressbar):
         self.current_time = current_time
@@ -51,9 +55,10 @@ class ProcessMetadataThread(common.LibrarySyncMixin,
 
     def _get(self):
         item = {'xml': None}
-        while item and item['xml'] is None:
-            item = self.processing_queue.get()
-            self.processing_queue.task_done()
+        with metrics.timer('wait_processing_queue_ms'):
+            while item and item['xml'] is None:
+                item = self.processing_queue.get()
+                self.processing_queue.task_done()
         return item
 
     def _run(self):
@@ -78,14 +83,17 @@ class ProcessMetadataThread(common.LibrarySyncMixin,
                     self.update_progressbar(section,
                                             item['xml'][0].get('title'),
                                             section.count)
-                    context.add_update(item['xml'][0],
-                                       section_name=section.name,
-                                       section_id=section.section_id,
-                                       children=item['children'])
+                    with metrics.timer('db_write_item_ms'):
+                        context.add_update(item['xml'][0],
+                                           section_name=section.name,
+                                           section_id=section.section_id,
+                                           children=item['children'])
                     processed += 1
                     section.count += 1
+                    metrics.count('written_items')
                     if processed == COMMIT_TO_DB_EVERY_X_ITEMS:
                         processed = 0
-                        context.commit()
+                        with metrics.timer('db_commit_ms'):
+                            context.commit()
                     item = self._get()
         self.finish_last_section()
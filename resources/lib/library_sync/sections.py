@@ -525,11 +525,13 @@ def _delete_kodi_db_items(section):
         types = ()
         LOG.debug('Skipping deletion of DB elements for section %s', section)
     for plex_type, context in types:
+        last_plex_id = 0
         while True:
             with PlexDB() as plexdb:
                 plex_ids = list(plexdb.plexid_by_sectionid(section.section_id,
                                                            plex_type,
-                                                           BATCH_SIZE))
+                                                           BATCH_SIZE,
+                                                           last_plex_id))
                 with kodi_context(texture_db=True) as kodidb:
                     typus = context(None, plexdb=plexdb, kodidb=kodidb)
                     for plex_id in plex_ids:
@@ -538,6 +540,7 @@ def _delete_kodi_db_items(section):
                         typus.remove(plex_id)
             if len(plex_ids) < BATCH_SIZE:
                 break
+            last_plex_id = plex_ids[-1]
     return True
 
 
@@ -1,12 +1,15 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 from logging import getLogger
+from collections import OrderedDict, defaultdict
+from threading import Lock
+import heapq
+import itertools
 
 from .common import update_kodi_library, PLAYLIST_SYNC_ENABLED
 from .additional_metadata import ProcessMetadataTask
 from ..plex_api import API
 from ..plex_db import PlexDB
-from .. import kodi_db
 from .. import backgroundthread, plex_functions as PF, itemtypes
 from .. import artwork, utils, timing, variables as v, app
 
@@ -17,32 +20,128 @@ LOG = getLogger('PLEX.sync.websocket')
 
 CACHING_ENALBED = utils.settings('enableTextureCache') == "true"
 
-WEBSOCKET_MESSAGES = []
-# Dict to save info for Plex items currently being played somewhere
-PLAYSTATE_SESSIONS = {}
+# Max. number of times we try to process a message
+MAX_ATTEMPTS = 3
 
 
-def multi_delete(input_list, delete_list):
+class WebsocketQueue(object):
     """
-    Deletes the list items of input_list at the positions in delete_list
-    (which can be in any arbitrary order)
+    Thread-safe queue of PMS websocket messages for Plex library items. Holds
+    at most one message per plex_id; a deletion supersedes a pending update.
+    Messages become ready for processing once the PMS had enough time to
+    finish working on the item, see pop_ready()
     """
-    for index in sorted(delete_list, reverse=True):
-        del input_list[index]
-    return input_list
+    def __init__(self):
+        self._lock = Lock()
+        # {plex_id: message} in the order of arrival
+        self._messages = OrderedDict()
+        # Heap of (ready_at, seq, plex_id). Entries are stale if the message
+        # for plex_id has been replaced or removed in the meantime
+        self._heap = []
+        self._seq = itertools.count()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._messages)
+
+    def __contains__(self, plex_id):
+        with self._lock:
+            return plex_id in self._messages
+
+    def _push(self, message, ready_at):
+        message['seq'] = next(self._seq)
+        self._messages[message['plex_id']] = message
+        heapq.heappush(self._heap,
+                       (ready_at, message['seq'], message['plex_id']))
+
+    def put(self, plex_id, plex_type, state):
+        """
+        Queues the message for plex_id unless we already have one for it.
+        Deletions (state 9) are ready immediately
+        """
+        now = timing.unix_timestamp()
+        with self._lock:
+            existing = self._messages.get(plex_id)
+            if existing is not None and (state != 9 or
+                                         existing['state'] == 9):
+                return
+            if state == 9:
+                ready_at = now
+            else:
+                # Give the PMS time to download info from the internet
+                ready_at = now + app.SYNC.backgroundsync_saftymargin
+            self._push({
+                'state': state,
+                'plex_type': plex_type,
+                'plex_id': plex_id,
+                'timestamp': now,
+                'attempt': 0
+            }, ready_at)
+
+    def pop_ready(self):
+        """
+        Removes and returns the list of all messages that are ready for
+        processing, in the order they became ready
+        """
+        now = timing.unix_timestamp()
+        ready = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, seq, plex_id = heapq.heappop(self._heap)
+                message = self._messages.get(plex_id)
+                if message is None or message['seq'] != seq:
+                    continue
+                del self._messages[plex_id]
+                ready.append(message)
+        return ready
+
+    def retry(self, message):
+        """
+        Puts message back for the next processing run if we could not process
+        it - unless we failed too often or got a newer message in the meantime
+        """
+        message['attempt'] += 1
+        if message['attempt'] > MAX_ATTEMPTS:
+            LOG.error('Repeatedly could not process message %s, abort',
+                      message)
+            return
+        with self._lock:
+            if message['plex_id'] not in self._messages:
+                self._push(message, timing.unix_timestamp())
+
+    def requeue(self, messages):
+        """
+        Puts messages back, e.g. because the Kodi DB was locked, without
+        counting this as a failed attempt. Messages keep their timestamps and
+        are ready right away - unless we got a newer message in the meantime
+        """
+        now = timing.unix_timestamp()
+        with self._lock:
+            for message in messages:
+                if message['plex_id'] not in self._messages:
+                    self._push(message, now)
+
+
+WEBSOCKET_MESSAGES = WebsocketQueue()
+# Dict to save info for Plex items currently being played somewhere
+PLAYSTATE_SESSIONS = {}
+# When did we last write the buffered playstates to the Kodi DB?
+LAST_PLAYSTATE_FLUSH = 0
 
 
 def store_websocket_message(message):
     """
     processes json.loads() messages from websocket. Triage what we need to
-    do with "process_" methods
+    do with "process_" methods. Returns True if we wrote to the Kodi DB right
+    away, e.g. playstates of other Plex players
     """
     if message['type'] == 'playing':
-        process_playing(message['PlaySessionStateNotification'])
+        return process_playing(message['PlaySessionStateNotification'])
     elif message['type'] == 'timeline':
         store_timeline_message(message['TimelineEntry'])
     elif message['type'] == 'activity':
         store_activity_message(message['ActivityNotification'])
+    return False
 
 
 def process_websocket_messages():
@@ -70,69 +169,129 @@ def process_websocket_messages():
         5: 'finished',
         6: 'analyzing',
         9: 'deleted'
+
+    Returns True if we changed the Kodi DB
     """
-    global WEBSOCKET_MESSAGES
-    now = timing.unix_timestamp()
-    update_kodi_video_library, update_kodi_music_library = False, False
-    delete_list = []
-    for i, message in enumerate(WEBSOCKET_MESSAGES):
+    messages = WEBSOCKET_MESSAGES.pop_ready()
+    deletions = defaultdict(list)
+    updates = []
+    for message in messages:
         if message['state'] == 9:
-            successful, video, music = process_delete_message(message)
-        elif now - message['timestamp'] < app.SYNC.backgroundsync_saftymargin:
-            # We haven't waited long enough for the PMS to finish processing the
-            # item. Do it later (excepting deletions)
-            continue
+            deletions[message['plex_type']].append(message['plex_id'])
         else:
-            successful, video, music = process_new_item_message(message)
-            if successful:
-                task = ProcessMetadataTask()
-                task.setup(message['plex_id'],
-                           message['plex_type'],
-                           refresh=False)
-                backgroundthread.BGThreader.addTask(task)
-        if successful is True:
-            delete_list.append(i)
-            update_kodi_video_library = True if video else update_kodi_video_library
-            update_kodi_music_library = True if music else update_kodi_music_library
-        else:
-            # Safety net if we can't process an item
-            message['attempt'] += 1
-            if message['attempt'] > 3:
-                LOG.error('Repeatedly could not process message %s, abort',
-                          message)
-                delete_list.append(i)
-
-    # Get rid of the items we just processed
-    if delete_list:
-        WEBSOCKET_MESSAGES = multi_delete(WEBSOCKET_MESSAGES, delete_list)
-    # Let Kodi know of the change
-    if update_kodi_video_library or update_kodi_music_library:
-        update_kodi_library(video=update_kodi_video_library,
-                            music=update_kodi_music_library)
-
-
-def process_new_item_message(message):
-    LOG.debug('Message: %s', message)
-    xml = PF.GetPlexMetadata(message['plex_id'])
+            updates.append(message)
+    # {plex_type: [plex_id]} of all the items we changed
+    changed = defaultdict(list)
+    urls = []
+    # Plex types whose changes we committed to their Kodi DB
+    committed = set()
     try:
-        plex_type = xml[0].attrib['type']
-    except (IndexError, KeyError, TypeError):
-        LOG.error('Could not download metadata for %s', message['plex_id'])
-        return False, False, False
-    LOG.debug("Processing new/updated PMS item: %s", message['plex_id'])
-    with itemtypes.ITEMTYPE_FROM_PLEXTYPE[plex_type](timing.unix_timestamp()) as typus:
-        typus.add_update(xml[0],
-                         section_name=xml.get('librarySectionTitle'),
-                         section_id=utils.cast(int, xml.get('librarySectionID')))
-    cache_artwork(message['plex_id'], plex_type)
-    return True, plex_type in v.PLEX_VIDEOTYPES, plex_type in v.PLEX_AUDIOTYPES
-
-
-def process_delete_message(message):
-    plex_type = message['plex_type']
-    with itemtypes.ITEMTYPE_FROM_PLEXTYPE[plex_type](None) as typus:
-        typus.remove(message['plex_id'], plex_type=plex_type)
-    return True, plex_type in v.PLEX_VIDEOTYPES, plex_type in v.PLEX_AUDIOTYPES
+        # Download everything before we're locking the databases
+        xmls = download_new_items(updates)
+        for plex_types in (v.PLEX_VIDEOTYPES, v.PLEX_AUDIOTYPES):
+            # One single context and commit per media DB
+            db_deletions = {x: y for x, y in deletions.items()
+                            if x in plex_types}
+            db_xmls = {x: y for x, y in xmls.items() if x in plex_types}
+            if db_deletions or db_xmls:
+                db_changed, db_urls = apply_changes(db_deletions, db_xmls)
+                for plex_type, plex_ids in db_changed.items():
+                    changed[plex_type].extend(plex_ids)
+                urls.extend(db_urls)
+            committed.update(plex_types)
+    except Exception:
+        # E.g. LockedDatabase while Kodi is scanning. Try again later
+        WEBSOCKET_MESSAGES.requeue([x for x in messages
+                                    if x['plex_type'] not in committed])
+        raise
+    if not changed:
+        return False
+    if urls:
+        task = artwork.CacheUrlsTask()
+        task.setup(urls)
+        backgroundthread.BGThreader.addTask(task)
+    for plex_type, batch in xmls.items():
+        for plex_id, _ in batch:
+            task = ProcessMetadataTask()
+            task.setup(plex_id, plex_type, refresh=False)
+            backgroundthread.BGThreader.addTask(task)
+    # Don't use cached metadata for these items next time, e.g. for
+    # repair syncs
+    PF.invalidate_cached_metadata(
+        [plex_id for plex_ids in changed.values() for plex_id in plex_ids])
+    # Let Kodi know of the change - once for all the items
+    update_kodi_library(
+        video=any(x in v.PLEX_VIDEOTYPES for x in changed),
+        music=any(x in v.PLEX_AUDIOTYPES for x in changed))
+    return True
+
+
+def download_new_items(messages):
+    """
+    Downloads the metadata for all messages using as few PMS requests as
+    possible. Returns a dict {plex_type: [(plex_id, xml)]}. Messages we could
+    not process are queued again
+    """
+    xmls = defaultdict(list)
+    for i in range(0, len(messages), app.SYNC.metadata_batch_size):
+        batch = messages[i:i + app.SYNC.metadata_batch_size]
+        downloaded = PF.download_plex_metadata([x['plex_id'] for x in batch])
+        for message in batch:
+            LOG.debug('Message: %s', message)
+            xml = downloaded.get(message['plex_id'])
+            try:
+                plex_type = xml[0].attrib['type']
+            except (IndexError, KeyError, TypeError):
+                LOG.error('Could not download metadata for %s',
+                          message['plex_id'])
+                WEBSOCKET_MESSAGES.retry(message)
+                continue
+            xmls[plex_type].append((message['plex_id'], xml))
+    return xmls
+
+
+def apply_changes(deletions, xmls):
+    """
+    Removes the items deletions {plex_type: [plex_id]} and adds or updates
+    the items xmls {plex_type: [(plex_id, xml)]}. All items need to belong to
+    the same Kodi DB (video or music) as we're using one single itemtypes
+    context. Returns the tuple (changed, urls) with changed as a dict
+    {plex_type: [plex_id]} and urls the artwork urls that need caching
+    """
+    changed = defaultdict(list)
+    urls = []
+    itemtype = itemtypes.ITEMTYPE_FROM_PLEXTYPE[next(iter(deletions or xmls))]
+    with itemtype(timing.unix_timestamp()) as context:
+        for plex_type, plex_ids in deletions.items():
+            typus = itemtypes.ITEMTYPE_FROM_PLEXTYPE[plex_type](
+                None, plexdb=context.plexdb, kodidb=context.kodidb)
+            for plex_id in plex_ids:
+                typus.remove(plex_id, plex_type=plex_type)
+            changed[plex_type].extend(plex_ids)
+        for plex_type, batch in xmls.items():
+            typus = itemtypes.ITEMTYPE_FROM_PLEXTYPE[plex_type](
+                context.last_sync, plexdb=context.plexdb, kodidb=context.kodidb)
+            for plex_id, xml in batch:
+                LOG.debug("Processing new/updated PMS item: %s", plex_id)
+                typus.add_update(xml[0],
+                                 section_name=xml.get('librarySectionTitle'),
+                                 section_id=utils.cast(int, xml.get('librarySectionID')))
+                changed[plex_type].append(plex_id)
+                if CACHING_ENALBED:
+                    urls.extend(artwork_urls(context, plex_id, plex_type))
+    return changed, urls
+
+
+def artwork_urls(context, plex_id, plex_type):
+    """
+    Returns a list of the artwork urls of plex_id using the DB connections of
+    the itemtypes context
+    """
+    item = context.plexdb.item_by_id(plex_id, plex_type)
+    if not item:
+        LOG.error('Could not retrieve Plex db info for %s', plex_id)
+        return []
+    return list(context.kodidb.art_urls(item['kodi_id'], item['kodi_type']))
 
 
 def store_timeline_message(data):
@@ -140,7 +299,6 @@ def store_timeline_message(data):
     PMS is messing with the library items, e.g. new or changed. Put in our
     "processing queue" for later
     """
-    global WEBSOCKET_MESSAGES
     for message in data:
         if 'tv.plex' in message.get('identifier', ''):
             # Ommit Plex DVR messages - the Plex IDs are not corresponding
@@ -167,30 +325,13 @@ def store_timeline_message(data):
         elif status == 9:
             # Immediately and always process deletions (as the PMS will
             # send additional message with other codes)
-            WEBSOCKET_MESSAGES.append({
-                'state': status,
-                'plex_type': typus,
-                'plex_id': utils.cast(int, message['itemID']),
-                'timestamp': timing.unix_timestamp(),
-                'attempt': 0
-            })
+            WEBSOCKET_MESSAGES.put(utils.cast(int, message['itemID']),
+                                   typus,
+                                   status)
         elif typus in (v.PLEX_TYPE_MOVIE,
                        v.PLEX_TYPE_EPISODE,
                        v.PLEX_TYPE_SONG) and status == 5:
-            plex_id = int(message['itemID'])
-            # Have we already added this element for processing?
-            for existing_message in WEBSOCKET_MESSAGES:
-                if existing_message['plex_id'] == plex_id:
-                    break
-            else:
-                # Haven't added this element to the queue yet
-                WEBSOCKET_MESSAGES.append({
-                    'state': status,
-                    'plex_type': typus,
-                    'plex_id': plex_id,
-                    'timestamp': timing.unix_timestamp(),
-                    'attempt': 0
-                })
+            WEBSOCKET_MESSAGES.put(int(message['itemID']), typus, status)
 
 
 def store_activity_message(data):
@@ -198,7 +339,6 @@ def store_activity_message(data):
     PMS is re-scanning an item, e.g. after having changed a movie poster.
     WATCH OUT for this if it's triggered by our PKC library scan!
     """
-    global WEBSOCKET_MESSAGES
     for message in data:
         if message['event'] != 'ended':
             # Scan still going on, so skip for now
@@ -221,37 +361,34 @@ def store_activity_message(data):
         if not plex_id:
             # Likely a Plex id like /library/metadata/3/children
             continue
+        if plex_id in WEBSOCKET_MESSAGES:
+            # Already added this element
+            continue
         # We're only looking at existing elements - have we synced yet?
         with PlexDB(lock=False) as plexdb:
             typus = plexdb.item_by_id(plex_id, plex_type=None)
         if not typus:
             LOG.debug('plex_id %s not synced yet - skipping', plex_id)
             continue
-        # Have we already added this element?
-        for existing_message in WEBSOCKET_MESSAGES:
-            if existing_message['plex_id'] == plex_id:
-                break
-        else:
-            # Haven't added this element to the queue yet
-            WEBSOCKET_MESSAGES.append({
-                'state': None,  # Don't need a state here
-                'plex_type': typus['plex_type'],
-                'plex_id': plex_id,
-                'timestamp': timing.unix_timestamp(),
-                'attempt': 0
-            })
+        # Don't need a state here
+        WEBSOCKET_MESSAGES.put(plex_id, typus['plex_type'], None)
 
 
 def process_playing(data):
     """
     Someone (not necessarily the user signed in) is playing something some-
-    where
+    where. Returns True if we wrote playstates to the Kodi DB
     """
     global PLAYSTATE_SESSIONS
+    written = False
     for message in data:
         status = message['state']
-        if status == 'buffering' or status == 'stopped':
-            # Drop buffering and stop messages immediately - no value
+        if status == 'buffering':
+            # Drop buffering messages immediately - no value
+            continue
+        elif status == 'stopped':
+            # Write the last resume point right away and forget the session
+            written = end_session(message.get('sessionKey')) or written
             continue
         plex_id = utils.cast(int, message['ratingKey'])
         skip = False
@@ -272,7 +409,7 @@ def process_playing(data):
             if not typus or 'kodi_fileid' not in typus:
                 # Item not (yet) in Kodi library or not affiliated with a file
                 continue
-            if utils.settings('plex_serverowned') == 'false':
+            if utils.SETTINGS.get('plex_serverowned') == 'false':
                 # Not our PMS, we are not authorized to get the sessions
                 # On the bright side, it must be us playing :-)
                 PLAYSTATE_SESSIONS[session_key] = {}
@@ -295,7 +432,8 @@ def process_playing(data):
             PLAYSTATE_SESSIONS[session_key]['kodi_id'] = typus['kodi_id']
             PLAYSTATE_SESSIONS[session_key]['kodi_type'] = typus['kodi_type']
         session = PLAYSTATE_SESSIONS[session_key]
-        if utils.settings('plex_serverowned') != 'false':
+        session['last_seen'] = timing.unix_timestamp()
+        if utils.SETTINGS.get('plex_serverowned') != 'false':
             # Identify the user - same one as signed on with PKC? Skip
             # update if neither session's username nor userid match
             # (Owner sometime's returns id '1', not always)
@@ -349,37 +487,80 @@ def process_playing(data):
                 continue
         else:
             mark_played = False
-        LOG.debug('Update playstate for user %s for %s with plex id %s to '
+        LOG.debug('Buffer playstate for user %s for %s with plex id %s: '
                   'viewCount %s, resume %s, mark_played %s for item %s',
                   app.ACCOUNT.plex_username, session['kodi_type'], plex_id,
                   session['viewCount'], resume, mark_played, PLAYSTATE_SESSIONS[session_key])
-        func = itemtypes.ITEMTYPE_FROM_KODITYPE[session['kodi_type']]
-        with func(None) as fkt:
-            fkt.update_playstate(mark_played,
-                                 session['viewCount'],
-                                 resume,
-                                 session['duration'],
-                                 session['kodi_fileid'],
-                                 session['kodi_fileid_2'],
-                                 timing.unix_timestamp())
-
-
-def cache_artwork(plex_id, plex_type, kodi_id=None, kodi_type=None):
+        # Only keep the latest resume point, but never lose mark_played
+        session['pending'] = {
+            'mark_played': (mark_played or
+                            session.get('pending', {}).get('mark_played', False)),
+            'resume': resume,
+            'last_viewed_at': timing.unix_timestamp()
+        }
+    return flush_playstates() or written
+
+
+def flush_playstates(force=False):
     """
-    Triggers caching of artwork (if so enabled in the PKC settings)
+    Writes the buffered playstates of all sessions to the Kodi DB once
+    app.SYNC.playstate_flush_interval has passed or if force is True. Will
+    also forget about sessions we haven't heard of for
+    app.SYNC.playstate_session_timeout. Returns True if we wrote playstates
+    to the Kodi DB
     """
-    if not CACHING_ENALBED:
-        return
-    if not kodi_id:
-        with PlexDB(lock=False) as plexdb:
-            item = plexdb.item_by_id(plex_id, plex_type)
-        if not item:
-            LOG.error('Could not retrieve Plex db info for %s', plex_id)
-            return
-        kodi_id, kodi_type = item['kodi_id'], item['kodi_type']
-    with kodi_db.KODIDB_FROM_PLEXTYPE[plex_type](lock=False) as kodidb:
-        for url in kodidb.art_urls(kodi_id, kodi_type):
-            artwork.cache_url(url)
+    global LAST_PLAYSTATE_FLUSH
+    now = timing.unix_timestamp()
+    if not force and now - LAST_PLAYSTATE_FLUSH < app.SYNC.playstate_flush_interval:
+        return False
+    LAST_PLAYSTATE_FLUSH = now
+    written = write_playstates(
+        [x for x in PLAYSTATE_SESSIONS.values() if x.get('pending')])
+    for session_key in [key for key, session in PLAYSTATE_SESSIONS.items()
+                        if now - session['last_seen'] > app.SYNC.playstate_session_timeout]:
+        LOG.debug('Forgetting about inactive session %s', session_key)
+        del PLAYSTATE_SESSIONS[session_key]
+    return written
+
+
+def end_session(session_key):
+    """
+    Writes the buffered playstate of the session session_key to the Kodi DB
+    and forgets about the session. Returns True if we wrote a playstate
+    """
+    session = PLAYSTATE_SESSIONS.get(session_key)
+    written = False
+    if session and session.get('pending'):
+        written = write_playstates([session])
+    PLAYSTATE_SESSIONS.pop(session_key, None)
+    return written
+
+
+def write_playstates(sessions):
+    """
+    Writes the pending playstates of sessions to the Kodi DB, using one single
+    itemtypes context for every kind of item. Playstates stay pending until
+    they have been committed, e.g. if the Kodi DB is locked. Returns True if
+    we wrote any playstate
+    """
+    batches = defaultdict(list)
+    for session in sessions:
+        batches[itemtypes.ITEMTYPE_FROM_KODITYPE[session['kodi_type']]].append(session)
+    for itemtype, batch in batches.items():
+        with itemtype(None) as fkt:
+            for session in batch:
+                pending = session['pending']
+                fkt.update_playstate(pending['mark_played'],
+                                     session['viewCount'],
+                                     pending['resume'],
+                                     session['duration'],
+                                     session['kodi_fileid'],
+                                     session['kodi_fileid_2'],
+                                     pending['last_viewed_at'])
+        for session in batch:
+            del session['pending']
+    return bool(batches)
+
 
 def is_section_synced(section_id):
     """
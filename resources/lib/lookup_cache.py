@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Persistent cache for lookups on external sites like fanart.tv and
+TheMovieDB, keyed by (provider, external_id). Also remembers unsuccessful
+lookups so we're not retrying them on every pass. Lives in plex-responses.db
+"""
+from logging import getLogger
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from threading import Lock
+import json
+
+from . import db, timing, utils
+
+LOG = getLogger('PLEX.lookup_cache')
+
+LOOKUP_CACHE_LOCK = Lock()
+# Unsuccessful lookups are retried after at most this many seconds
+NEGATIVE_TTL = 7 * 24 * 60 * 60
+# Max. number of entries we keep. The least recently stored ones are evicted
+MAX_ENTRIES = 50000
+
+# Sentinel to tell a cached negative result apart from a cache miss
+MISS = object()
+
+_STATS = Counter()
+_STATS_LOCK = Lock()
+
+
+@contextmanager
+def _connection():
+    with LOOKUP_CACHE_LOCK:
+        conn = db.connect('responses')
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def _count(provider, kind):
+    with _STATS_LOCK:
+        _STATS[(provider, kind)] += 1
+
+
+def get(provider, external_id):
+    """
+    Returns the cached answer for external_id on provider, None for a cached
+    unsuccessful lookup or MISS if we need to look it up (again)
+    """
+    with _connection() as conn:
+        row = conn.execute('''
+            SELECT answer, expires FROM lookup
+            WHERE provider = ? AND external_id = ?
+        ''', (provider, external_id)).fetchone()
+    if row is None or row[1] < timing.unix_timestamp():
+        _count(provider, 'miss')
+        return MISS
+    _count(provider, 'hit')
+    return None if row[0] is None else json.loads(row[0])
+
+
+def store(provider, external_id, answer):
+    """
+    Caches answer, anything that can be JSON-serialized. Pass answer=None for
+    unsuccessful lookups
+    """
+    ttl = utils.SETTINGS.get_int('fanartLookupCacheDays', 30) * 24 * 60 * 60
+    if answer is None:
+        ttl = min(ttl, NEGATIVE_TTL)
+    else:
+        answer = json.dumps(answer)
+    now = timing.unix_timestamp()
+    with _connection() as conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO lookup(
+                provider, external_id, answer, stored, expires)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (provider, external_id, answer, now, now + ttl))
+
+
+def cached(provider, key):
+    """
+    Decorator for lookup functions. key(*args) needs to return the
+    external_id [str] for the decorated function's arguments. The decorated
+    function must return None if the lookup was unsuccessful or MISS if it
+    failed temporarily, e.g. due to a connection error, and the answer should
+    not be cached
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args):
+            external_id = key(*args)
+            answer = get(provider, external_id)
+            if answer is MISS:
+                answer = func(*args)
+                if answer is MISS:
+                    return
+                store(provider, external_id, answer)
+            return answer
+        return wrapper
+    return decorator
+
+
+def evict():
+    """
+    Deletes all expired entries and the oldest ones if we exceed MAX_ENTRIES
+    """
+    with _connection() as conn:
+        conn.execute('DELETE FROM lookup WHERE expires < ?',
+                     (timing.unix_timestamp(), ))
+        conn.execute('''
+            DELETE FROM lookup WHERE rowid IN (
+                SELECT rowid FROM lookup ORDER BY stored DESC
+                LIMIT -1 OFFSET ?)
+        ''', (MAX_ENTRIES, ))
+
+
+def log_statistics():
+    """
+    Logs and resets the number of cache hits and misses per provider
+    """
+    with _STATS_LOCK:
+        for provider in sorted(set(x[0] for x in _STATS)):
+            LOG.info('Lookup cache for %s: %s hits, %s misses',
+                     provider,
+                     _STATS[(provider, 'hit')],
+                     _STATS[(provider, 'miss')])
+        _STATS.clear()
+
+
+def initialize():
+    """
+    Run once upon PKC startup to make sure the cache's table exists
+    """
+    with _connection() as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS lookup(
+                provider TEXT,
+                external_id TEXT,
+                answer TEXT,
+                stored INTEGER,
+                expires INTEGER,
+                PRIMARY KEY (provider, external_id))
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS ix_lookup_1
+            ON lookup (stored)
+        ''')
+
+
+def wipe():
+    """
+    Completely wipes the lookup cache. Call initialize() afterwards
+    """
+    with _connection() as conn:
+        conn.execute('DROP TABLE IF EXISTS lookup')
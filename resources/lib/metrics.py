@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lightweight, thread-safe registry of metrics to find out where a library sync
+spends its time. Knows 3 kinds of metrics:
+
+    counters:       count(name), e.g. number of items a sync stage processed
+    gauges:         gauge(name, value), e.g. queue depths. Remembers the last,
+                    min, max and average value
+    histograms:     observe(name, value) or "with timer(name):", e.g. HTTP
+                    latencies or DB commit durations in milliseconds
+
+Call reset() before a sync and write_summary() afterwards
+"""
+from logging import getLogger
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter
+import json
+import os
+import random
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+from . import variables as v
+
+LOG = getLogger('PLEX.metrics')
+
+# Max. number of values we keep per histogram to calculate percentiles
+MAX_SAMPLES = 5000
+PERCENTILES = (50, 90, 99)
+# Summary of the last full sync will be written to this file
+SUMMARY_FILE = os.path.join(v.ADDON_PROFILE, 'sync_metrics.json')
+
+
+class Gauge(object):
+    def __init__(self):
+        self.count = 0
+        self.last = self.min = self.max = None
+        self.total = 0
+
+    def set(self, value):
+        self.count += 1
+        self.last = value
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def summary(self):
+        return {
+            'last': self.last,
+            'min': self.min,
+            'max': self.max,
+            'avg': round(self.total / self.count, 2)
+        }
+
+
+class Histogram(object):
+    """
+    Keeps a uniform random sample (reservoir sampling) of at most MAX_SAMPLES
+    values in order to calculate percentiles with constant memory
+    """
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = None
+        self.samples = []
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.max = value if self.max is None else max(self.max, value)
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(value)
+        else:
+            i = random.randrange(self.count)
+            if i < MAX_SAMPLES:
+                self.samples[i] = value
+
+    def summary(self):
+        samples = sorted(self.samples)
+        answ = {
+            'count': self.count,
+            'total': round(self.total, 2),
+            'avg': round(self.total / self.count, 2),
+            'max': round(self.max, 2)
+        }
+        for percentile in PERCENTILES:
+            index = min(len(samples) - 1, len(samples) * percentile // 100)
+            answ['p%s' % percentile] = round(samples[index], 2)
+        return answ
+
+
+class Registry(object):
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = perf_counter()
+            self.counters = {}
+            self.gauges = {}
+            self.histograms = {}
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        with self._lock:
+            if name not in self.gauges:
+                self.gauges[name] = Gauge()
+            self.gauges[name].set(value)
+
+    def observe(self, name, value):
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].observe(value)
+
+    def summary(self):
+        with self._lock:
+            elapsed = perf_counter() - self.started
+            return {
+                'elapsed_seconds': round(elapsed, 2),
+                # Peak resident set size of the whole Kodi process; in
+                # kilobytes on Linux, in bytes on macOS
+                'peak_rss': (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                             if resource else None),
+                'counters': dict(self.counters),
+                # Per-stage throughput
+                'per_second': {name: round(value / elapsed, 2)
+                               for name, value in self.counters.items()},
+                'gauges': {name: gauge.summary()
+                           for name, gauge in self.gauges.items()},
+                'histograms': {name: histogram.summary()
+                               for name, histogram in self.histograms.items()}
+            }
+
+
+REGISTRY = Registry()
+
+
+def reset():
+    REGISTRY.reset()
+
+
+def count(name, value=1):
+    REGISTRY.count(name, value)
+
+
+def gauge(name, value):
+    REGISTRY.gauge(name, value)
+
+
+def observe(name, value):
+    REGISTRY.observe(name, value)
+
+
+@contextmanager
+def timer(name):
+    """
+    Records the time spent within the with-block in milliseconds
+    """
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe(name, (perf_counter() - start) * 1000)
+
+
+def write_summary(title):
+    """
+    Logs the JSON summary of all metrics recorded since the last reset() and
+    writes it to SUMMARY_FILE
+    """
+    summary = REGISTRY.summary()
+    summary['title'] = title
+    summary = json.dumps(summary, sort_keys=True)
+    LOG.info('Metrics for %s: %s', title, summary)
+    try:
+        with open(SUMMARY_FILE, 'w') as f:
+            f.write(summary)
+    except (IOError, OSError) as err:
+        LOG.warn('Could not write %s: %s', SUMMARY_FILE, err)
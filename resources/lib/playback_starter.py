@@ -16,11 +16,20 @@ class PlaybackTask(backgroundthread.Task):
     """
     Processes new plays
     """
-    def __init__(self, command):
+    def __init__(self, command, channel=None):
         self.command = command
+        # Socket connection to default.py, see transfer.CommandServer
+        self.channel = channel
         super(PlaybackTask, self).__init__()
 
     def run(self):
+        transfer.set_channel(self.channel)
+        try:
+            self._process()
+        finally:
+            transfer.close_channel()
+
+    def _process(self):
         LOG.debug('Starting PlaybackTask with %s', self.command)
         item = self.command
         try:
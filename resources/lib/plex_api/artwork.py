@@ -3,7 +3,6 @@
 from logging import getLogger
 
 from ..kodi_db import KodiVideoDB, KodiMusicDB
-from ..downloadutils import DownloadUtils as DU
 from .. import utils, variables as v, app
 
 from . import fanart_lookup
@@ -198,7 +197,8 @@ class Artwork(object):
         return fanart_lookup.external_item_id(self.title(),
                                               self.year(),
                                               self.plex_type,
-                                              collection)
+                                              collection,
+                                              self.guids.get('tmdb'))
 
     def lookup_fanart_tv(self, media_id, artworks):
         """
@@ -206,28 +206,16 @@ class Artwork(object):
 
         media_id: IMDB id for movies, tvdb id for TV shows
         """
-        api_key = utils.settings('FanArtTVAPIKey')
         typus = self.plex_type
         if typus == v.PLEX_TYPE_SHOW:
             typus = 'tv'
-
-        if typus == v.PLEX_TYPE_MOVIE:
-            url = 'http://webservice.fanart.tv/v3/movies/%s?api_key=%s' \
-                % (media_id, api_key)
-        elif typus == 'tv':
-            url = 'http://webservice.fanart.tv/v3/tv/%s?api_key=%s' \
-                % (media_id, api_key)
-        else:
+        if typus not in (v.PLEX_TYPE_MOVIE, 'tv'):
             # Not supported artwork
             return artworks
-        data = DU().downloadUrl(url,
-                                authenticate=False,
-                                timeout=15,
-                                return_response=True)
-        if data in (None, 401) or not data.ok:
+        data = fanart_lookup.fanart_tv_data(typus, media_id)
+        if data is None:
             LOG.debug('Could not download data from FanartTV')
             return artworks
-        data = data.json()
 
         fanart_tv_types = list(v.FANART_TV_TO_KODI_TYPE)
 
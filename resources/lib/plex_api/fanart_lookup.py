@@ -5,7 +5,7 @@ from re import sub
 from string import punctuation
 
 from ..downloadutils import DownloadUtils as DU
-from .. import utils, variables as v
+from .. import utils, variables as v, lookup_cache
 
 LOG = getLogger('PLEX.api.fanartlookup')
 
@@ -20,7 +20,28 @@ LEVENSHTEIN_RATIO_THRESHOLD = 0.95
 EXCLUDE_CHARS = set(punctuation)
 
 
-def external_item_id(title, year, plex_type, collection):
+def external_item_id(title, year, plex_type, collection, tmdb_id=None):
+    """
+    Returns the tuple (media_id, poster, background) for the item or None,
+    see Artwork.retrieve_external_item_id(). Pass the item's TheMovieDB id
+    tmdb_id if Plex knows it; we'll search TheMovieDB for title otherwise
+    """
+    media_type = 'tv' if plex_type == v.PLEX_TYPE_SHOW else plex_type
+    if tmdb_id is None:
+        tmdb_id = search_tmdb_id(title, year, plex_type)
+        if tmdb_id is None:
+            return
+    return tmdb_details(media_type, str(tmdb_id), collection)
+
+
+@lookup_cache.cached('themoviedb search',
+                     lambda title, year, plex_type:
+                     '%s|%s|%s' % (plex_type, year, title))
+def search_tmdb_id(title, year, plex_type):
+    """
+    Returns TheMovieDB's id for the best match for title or None. There is
+    no external id to key the cache by, hence it's keyed by the title
+    """
     LOG.debug('Start identifying %s (%s, %s)', title, year, plex_type)
     year = int(year) if year else None
     media_type = 'tv' if plex_type == v.PLEX_TYPE_SHOW else plex_type
@@ -37,6 +58,10 @@ def external_item_id(title, year, plex_type, collection):
                             authenticate=False,
                             parameters=parameters,
                             timeout=7)
+    if data in (None, 401):
+        LOG.debug('Could not reach themoviedb for %s (%s, %s)',
+                  title, year, media_type)
+        return lookup_cache.MISS
     try:
         data = data['results']
     except (AttributeError, KeyError, TypeError):
@@ -70,9 +95,18 @@ def external_item_id(title, year, plex_type, collection):
                     and 'popularity' in x]
     entry = max(best_matches, key=lambda x: x['popularity'])
     LOG.debug('Found themoviedb match: %s', entry)
+    return entry.get('id')
 
+
+@lookup_cache.cached('themoviedb',
+                     lambda media_type, tmdb_id, collection:
+                     '%s/%s|%s' % (media_type, tmdb_id, collection))
+def tmdb_details(media_type, tmdb_id, collection):
+    """
+    Returns the tuple (media_id, poster, background) for TheMovieDB's item
+    tmdb_id or None, see Artwork.retrieve_external_item_id()
+    """
     # lookup external tmdb_id and perform artwork lookup on fanart.tv
-    tmdb_id = entry.get('id')
     parameters = {'api_key': API_KEY}
     if media_type == 'movie':
         url = 'https://api.themoviedb.org/3/movie/%s' % tmdb_id
@@ -81,6 +115,8 @@ def external_item_id(title, year, plex_type, collection):
         url = 'https://api.themoviedb.org/3/tv/%s' % tmdb_id
         parameters['append_to_response'] = 'external_ids,videos'
     media_id, poster, background = None, None, None
+    # Did we get any answer from TheMovieDB at all?
+    downloaded, collection_downloaded = False, False
     for language in (v.KODILANGUAGE, 'en'):
         parameters['language'] = language
         data = DU().downloadUrl(url,
@@ -93,6 +129,7 @@ def external_item_id(title, year, plex_type, collection):
             LOG.warning('Could not download %s with parameters %s',
                         url, parameters)
             continue
+        downloaded = True
         if collection is False:
             if data.get('imdb_id'):
                 media_id = str(data.get('imdb_id'))
@@ -109,27 +146,59 @@ def external_item_id(title, year, plex_type, collection):
                 continue
             media_id = str(media_id)
             LOG.debug('Retrieved collections tmdb id %s for %s',
-                      media_id, title)
-            url = 'https://api.themoviedb.org/3/collection/%s' % media_id
-            data = DU().downloadUrl(url,
-                                    authenticate=False,
-                                    parameters=parameters,
-                                    timeout=7)
+                      media_id, tmdb_id)
+            data = DU().downloadUrl(
+                'https://api.themoviedb.org/3/collection/%s' % media_id,
+                authenticate=False,
+                parameters=parameters,
+                timeout=7)
             try:
                 data.get('poster_path')
             except AttributeError:
                 LOG.debug('Could not find TheMovieDB poster paths for %s'
-                          ' in the language %s', title, language)
+                          ' in the language %s', tmdb_id, language)
                 continue
+            collection_downloaded = True
             if not poster and data.get('poster_path'):
                 poster = ('https://image.tmdb.org/t/p/original%s' %
                           data.get('poster_path'))
             if not background and data.get('backdrop_path'):
                 background = ('https://image.tmdb.org/t/p/original%s' %
                               data.get('backdrop_path'))
+    if not downloaded or (media_id is not None and collection is not False
+                          and not collection_downloaded):
+        # Don't cache that we could not reach TheMovieDB
+        return lookup_cache.MISS
+    if media_id is None:
+        return
     return media_id, poster, background
 
 
+@lookup_cache.cached('fanart.tv',
+                     lambda typus, media_id: '%s/%s' % (typus, media_id))
+def fanart_tv_data(typus, media_id):
+    """
+    Returns fanart.tv's answer [dict] for media_id or None. typus is either
+    'movie' (media_id is the IMDB id) or 'tv' (media_id is the tvdb id)
+    """
+    url = 'http://webservice.fanart.tv/v3/%s/%s?api_key=%s' % (
+        'movies' if typus == v.PLEX_TYPE_MOVIE else 'tv',
+        media_id,
+        utils.SETTINGS.get('FanArtTVAPIKey'))
+    data = DU().downloadUrl(url,
+                            authenticate=False,
+                            timeout=15,
+                            return_response=True)
+    if data in (None, 401):
+        return lookup_cache.MISS
+    elif data.status_code == 404:
+        # fanart.tv does not know this item
+        return
+    elif not data.ok:
+        return lookup_cache.MISS
+    return data.json()
+
+
 def __year_almost_matches(year, entry):
     try:
         entry_year = int(entry['release_date'][0:4])
@@ -255,10 +255,10 @@ class Media(object):
             count += 1
         if (count > 1 and (
                 (self.plex_type != v.PLEX_TYPE_CLIP and
-                 utils.settings('firstVideoStream') == 'false')
+                 not utils.SETTINGS.get_bool('firstVideoStream'))
             or
                 (self.plex_type == v.PLEX_TYPE_CLIP and
-                 utils.settings('bestTrailer') == 'false'))):
+                 not utils.SETTINGS.get_bool('bestTrailer')))):
             # Several streams/files available.
             dialoglist = []
             for entry in self.xml.iterfind('./Media'):
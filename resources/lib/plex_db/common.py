@@ -129,14 +129,25 @@ class PlexDBBase(object):
         method = getattr(self, 'entry_to_%s' % v.PLEX_TYPE_FROM_KODI_TYPE[kodi_type])
         return method(self.cursor.fetchone())
 
-    def plex_id_by_last_sync(self, plex_type, last_sync, limit):
+    def plex_ids_not_in(self, plex_type, plex_ids):
         """
-        Returns an iterator for all items where the last_sync is NOT identical
+        Returns a list of all plex_ids of plex_type in the Plex DB that are NOT
+        contained in plex_ids [set of int]. Uses a temporary table and a
+        single anti-join
         """
+        self.cursor.execute('''
+            CREATE TEMP TABLE IF NOT EXISTS plex_ids_seen(
+                plex_id INTEGER PRIMARY KEY)
+        ''')
+        self.cursor.execute('DELETE FROM plex_ids_seen')
+        self.cursor.executemany('INSERT INTO plex_ids_seen(plex_id) VALUES (?)',
+                                ((x, ) for x in plex_ids))
         query = '''
-            SELECT plex_id FROM %s WHERE last_sync <> ? LIMIT %s
-        ''' % (plex_type, limit)
-        return (x[0] for x in self.cursor.execute(query, (last_sync, )))
+            SELECT %s.plex_id FROM %s
+            LEFT JOIN plex_ids_seen ON %s.plex_id = plex_ids_seen.plex_id
+            WHERE plex_ids_seen.plex_id IS NULL
+        ''' % (plex_type, plex_type, plex_type)
+        return [x[0] for x in self.cursor.execute(query)]
 
     def checksum(self, plex_id, plex_type):
         """
@@ -149,74 +160,90 @@ class PlexDBBase(object):
         except TypeError:
             pass
 
-    def update_last_sync(self, plex_id, plex_type, last_sync):
-        """
-        Sets a new timestamp for plex_id
-        """
-        self.cursor.execute('UPDATE %s SET last_sync = ? WHERE plex_id = ?' % plex_type,
-                            (last_sync, plex_id))
-
     def remove(self, plex_id, plex_type):
         """
         Removes the item from our Plex db
         """
         self.cursor.execute('DELETE FROM %s WHERE plex_id = ?' % plex_type, (plex_id, ))
 
-    def every_plex_id(self, plex_type, offset, limit):
+    def every_plex_id(self, plex_type, limit, last_plex_id=0):
         """
-        Returns an iterator for plex_type for every single plex_id
-        Will start with records at DB position offset [int] and return limit
-        [int] number of items
+        Returns an iterator for plex_type for every single plex_id, ordered by
+        plex_id. Will return limit [int] number of items with a plex_id bigger
+        than last_plex_id [int] - pass in the last plex_id of the previous
+        batch to get the next one
         """
-        return (x[0] for x in
-                self.cursor.execute('SELECT plex_id FROM %s LIMIT %s OFFSET %s'
-                                    % (plex_type, limit, offset)))
+        query = '''
+            SELECT plex_id FROM %s WHERE plex_id > ?
+            ORDER BY plex_id LIMIT ?
+        ''' % plex_type
+        return (x[0] for x in self.cursor.execute(query,
+                                                  (last_plex_id, limit)))
 
-    def missing_fanart(self, plex_type, offset, limit):
+    def missing_fanart(self, plex_type, limit, last_plex_id=0):
         """
         Returns an iterator for plex_type for all plex_id, where fanart_synced
-        has not yet been set to 1
-        Will start with records at DB position offset [int] and return limit
-        [int] number of items
+        has not yet been set to 1, ordered by plex_id. Will return limit [int]
+        number of items with a plex_id bigger than last_plex_id [int]
         """
         query = '''
-            SELECT plex_id FROM %s WHERE fanart_synced = 0
-            LIMIT %s OFFSET %s
-        ''' % (plex_type, limit, offset)
-        return (x[0] for x in self.cursor.execute(query))
+            SELECT plex_id FROM %s WHERE fanart_synced = 0 AND plex_id > ?
+            ORDER BY plex_id LIMIT ?
+        ''' % plex_type
+        return (x[0] for x in self.cursor.execute(query,
+                                                  (last_plex_id, limit)))
 
-    def missing_trailers(self, plex_type, offset, limit):
+    def missing_trailers(self, plex_type, limit, last_plex_id=0):
         """
         Returns an iterator for plex_type for all plex_id, where trailer_synced
-        has not yet been set to 1
-        Will start with records at DB position offset [int] and return limit
-        [int] number of items
+        has not yet been set to 1, ordered by plex_id. Will return limit [int]
+        number of items with a plex_id bigger than last_plex_id [int]
         """
         query = '''
-            SELECT plex_id FROM %s WHERE trailer_synced = 0
-            LIMIT %s OFFSET %s
-        ''' % (plex_type, limit, offset)
-        return (x[0] for x in self.cursor.execute(query))
+            SELECT plex_id FROM %s WHERE trailer_synced = 0 AND plex_id > ?
+            ORDER BY plex_id LIMIT ?
+        ''' % plex_type
+        return (x[0] for x in self.cursor.execute(query,
+                                                  (last_plex_id, limit)))
 
-    def set_fanart_synced(self, plex_id, plex_type):
+    def kodi_ids(self, plex_ids, plex_type):
         """
-        Toggles fanart_synced to 1 for plex_id
+        Returns a dict {plex_id: kodi_id} for all plex_ids [list of int] of
+        plex_type that we synced to Kodi. Pass in at most 999 plex_ids
         """
-        self.cursor.execute('UPDATE %s SET fanart_synced = 1 WHERE plex_id = ?' % plex_type,
-                            (plex_id, ))
+        query = 'SELECT plex_id, kodi_id FROM %s WHERE plex_id IN (%s)' % (
+            plex_type, ','.join('?' * len(plex_ids)))
+        return dict(self.cursor.execute(query, plex_ids))
 
-    def set_trailer_synced(self, plex_id, plex_type):
+    def set_fanart_synced(self, plex_ids, plex_type):
         """
-        Toggles fanart_synced to 1 for plex_id
+        Toggles fanart_synced to 1 for all plex_ids [iterable of int]
         """
-        self.cursor.execute('UPDATE %s SET trailer_synced = 1 WHERE plex_id = ?' % plex_type,
-                            (plex_id, ))
+        self.cursor.executemany('UPDATE %s SET fanart_synced = 1 WHERE plex_id = ?' % plex_type,
+                                ((x, ) for x in plex_ids))
+
+    def set_trailer_synced(self, plex_ids, plex_type):
+        """
+        Toggles trailer_synced to 1 for all plex_ids [iterable of int]
+        """
+        self.cursor.executemany('UPDATE %s SET trailer_synced = 1 WHERE plex_id = ?' % plex_type,
+                                ((x, ) for x in plex_ids))
 
-    def plexid_by_sectionid(self, section_id, plex_type, limit):
+    def plexid_by_sectionid(self, section_id, plex_type, limit,
+                            last_plex_id=0):
+        """
+        Returns an iterator for all plex_ids of plex_type in section_id,
+        ordered by plex_id. Will return limit [int] number of items with a
+        plex_id bigger than last_plex_id [int]
+        """
         query = '''
-            SELECT plex_id FROM %s WHERE section_id = ? LIMIT %s
-        ''' % (plex_type, limit)
-        return (x[0] for x in self.cursor.execute(query, (section_id, )))
+            SELECT plex_id FROM %s WHERE section_id = ? AND plex_id > ?
+            ORDER BY plex_id LIMIT ?
+        ''' % plex_type
+        return (x[0] for x in self.cursor.execute(query,
+                                                  (section_id,
+                                                   last_plex_id,
+                                                   limit)))
 
     def kodiid_by_sectionid(self, section_id, plex_type):
         return (x[0] for x in
@@ -344,9 +371,13 @@ def initialize():
                 'CREATE INDEX IF NOT EXISTS ix_movie_1 ON movie (last_sync)',
                 'CREATE UNIQUE INDEX IF NOT EXISTS ix_movie_2 ON movie (kodi_id)',
                 'CREATE INDEX IF NOT EXISTS ix_movie_3 ON movie (plex_guid)',
+                # Partial indexes for the items we still need to look up
+                'CREATE INDEX IF NOT EXISTS ix_movie_4 ON movie (plex_id) WHERE fanart_synced = 0',
+                'CREATE INDEX IF NOT EXISTS ix_movie_5 ON movie (plex_id) WHERE trailer_synced = 0',
                 'CREATE INDEX IF NOT EXISTS ix_show_1 ON show (last_sync)',
                 'CREATE UNIQUE INDEX IF NOT EXISTS ix_show_2 ON show (kodi_id)',
                 'CREATE INDEX IF NOT EXISTS ix_show_3 ON show (plex_guid)',
+                'CREATE INDEX IF NOT EXISTS ix_show_4 ON show (plex_id) WHERE fanart_synced = 0',
                 'CREATE INDEX IF NOT EXISTS ix_season_1 ON season (last_sync)',
                 'CREATE UNIQUE INDEX IF NOT EXISTS ix_season_2 ON season (kodi_id)',
                 'CREATE INDEX IF NOT EXISTS ix_season_3 ON season (plex_guid)',
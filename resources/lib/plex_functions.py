@@ -2,12 +2,16 @@
 # -*- coding: utf-8 -*-
 from logging import getLogger
 from ast import literal_eval
+from collections import deque
 from copy import deepcopy
+from io import BytesIO
 from time import time
 from threading import Thread
+from xml.etree.ElementTree import Element, tostring
 
 from .downloadutils import DownloadUtils as DU, exceptions
 from . import backgroundthread, utils, plex_tv, variables as v, app
+from . import async_download, response_cache
 
 ###############################################################################
 LOG = getLogger('PLEX.plex_functions')
@@ -456,6 +460,22 @@ def _poke_pms(pms, queue):
              url, pms['uuid'], xml.get('machineIdentifier'))
 
 
+# Arguments used to download the metadata of an individual Plex item
+METADATA_ARGUMENTS = {
+    'checkFiles': 0,
+    'includeExtras': 1,         # Trailers and Extras => Extras
+    'includeReviews': 1,
+    'includeRelated': 0,        # Similar movies => Video -> Related
+    'skipRefresh': 1,
+    'includeMarkers': 1,        # e.g. start + stop of intros
+    # 'includeRelatedCount': 0,
+    # 'includeOnDeck': 1,
+    # 'includeChapters': 1,
+    # 'includePopularLeaves': 1,
+    # 'includeConcerts': 1
+}
+
+
 def GetPlexMetadata(key, reraise=False):
     """
     Returns raw API metadata for key as an etree XML.
@@ -465,26 +485,9 @@ def GetPlexMetadata(key, reraise=False):
 
     Returns None or 401 if something went wrong
     """
-    key = str(key)
-    if '/library/metadata/' in key:
-        url = "{server}" + key
-    else:
-        url = "{server}/library/metadata/" + key
-    arguments = {
-        'checkFiles': 0,
-        'includeExtras': 1,         # Trailers and Extras => Extras
-        'includeReviews': 1,
-        'includeRelated': 0,        # Similar movies => Video -> Related
-        'skipRefresh': 1,
-        'includeMarkers': 1,        # e.g. start + stop of intros
-        # 'includeRelatedCount': 0,
-        # 'includeOnDeck': 1,
-        # 'includeChapters': 1,
-        # 'includePopularLeaves': 1,
-        # 'includeConcerts': 1
-    }
+    url = _metadata_url(key)
     try:
-        xml = DU().downloadUrl(utils.extend_url(url, arguments),
+        xml = DU().downloadUrl(utils.extend_url(url, METADATA_ARGUMENTS),
                                reraise=reraise)
     except exceptions.RequestException:
         # "PMS offline"
@@ -512,6 +515,214 @@ def GetPlexMetadata(key, reraise=False):
         return xml
 
 
+def _metadata_url(key):
+    key = str(key)
+    if '/library/metadata/' in key:
+        return "{server}" + key
+    else:
+        return "{server}/library/metadata/" + key
+
+
+async def _async_download_xml(url):
+    """
+    Coroutine returning the xml etree root of the PMS' answer for url, 401 or
+    None if something went wrong
+    """
+    try:
+        r = await async_download.download(url)
+    except async_download.ERRORS as err:
+        LOG.warn('Could not download %s: %r', url, err)
+        return
+    if r.status == 401:
+        # The AsyncDownloader already counted this 401
+        return 401
+    elif r.status not in (200, 201):
+        LOG.warn('PMS answered with status code %s for %s', r.status, url)
+        return
+    try:
+        return utils.etree.fromstring(r.content)
+    except utils.ParseError:
+        LOG.error('Could not parse the PMS answer for %s', url)
+
+
+async def _async_get_plex_metadata(key):
+    url = _metadata_url(key)
+    xml = await _async_download_xml(utils.extend_url(url, METADATA_ARGUMENTS))
+    if xml == 401:
+        return 401
+    try:
+        xml[0].attrib
+    except (TypeError, IndexError, AttributeError):
+        LOG.error("Error retrieving metadata for %s", url)
+        xml = None
+    return xml
+
+
+def get_plex_metadata_future(key):
+    """
+    Non-blocking version of GetPlexMetadata using the asyncio download engine.
+    Returns a concurrent.futures.Future; its result() will be exactly what
+    GetPlexMetadata(key) returns. Won't show any dialogs to the user
+    """
+    return async_download.submit(_async_get_plex_metadata(key))
+
+
+def get_plex_metadata_batch(plex_ids):
+    """
+    Downloads the metadata for several Plex items with one single request
+    /library/metadata/<id1>,<id2>,...
+
+    Pass in a list of plex_ids [int]. Returns a dict {plex_id: xml} with xml
+    looking exactly like what GetPlexMetadata(plex_id) would have returned.
+    plex_ids that the PMS did not return are missing from the dict.
+
+    Returns None or 401 if something went wrong
+    """
+    url = '{server}/library/metadata/%s' % ','.join(str(x) for x in plex_ids)
+    xml = DU().downloadUrl(utils.extend_url(url, METADATA_ARGUMENTS))
+    if xml == 401:
+        # Either unauthorized (taken care of by doUtils) or PMS under strain
+        return 401
+    try:
+        xml.attrib
+    except AttributeError:
+        LOG.error('Error retrieving batched metadata for %s', url)
+        return
+    answer = {}
+    for child in xml:
+        plex_id = utils.cast(int, child.get('ratingKey'))
+        if plex_id is None:
+            continue
+        # Wrap every item in its own copy of the MediaContainer
+        container = Element(xml.tag, attrib=dict(xml.attrib))
+        container.set('size', '1')
+        container.append(child)
+        answer[plex_id] = container
+    return answer
+
+
+def download_plex_metadata(plex_ids):
+    """
+    Returns a dict {plex_id: xml} for all plex_ids with xml being exactly what
+    GetPlexMetadata(plex_id) would return. Uses one single PMS request for
+    all plex_ids and falls back to one request per item if that fails
+    """
+    if not plex_ids:
+        return {}
+    elif len(plex_ids) == 1:
+        return {plex_ids[0]: GetPlexMetadata(plex_ids[0])}
+    xmls = get_plex_metadata_batch(plex_ids)
+    if xmls == 401:
+        return dict.fromkeys(plex_ids, 401)
+    elif xmls is None:
+        LOG.warn('Batched metadata download failed, downloading items '
+                 'one by one: %s', plex_ids)
+        xmls = {}
+    missing = [x for x in plex_ids if x not in xmls]
+    if app.SYNC.async_downloads:
+        # Keep all these requests in flight at once
+        futures = [get_plex_metadata_future(x) for x in missing]
+        for plex_id, future in zip(missing, futures):
+            xmls[plex_id] = async_download.result(future)
+    else:
+        for plex_id in missing:
+            xmls[plex_id] = GetPlexMetadata(plex_id)  # This will block
+    return xmls
+
+
+def _metadata_cache_url(plex_id):
+    return utils.extend_url(_metadata_url(plex_id), METADATA_ARGUMENTS)
+
+
+def cached_plex_metadata(items):
+    """
+    Pass in a list of tuples (plex_id [int], updated_at [int]). Returns a dict
+    {plex_id: xml} for all items whose metadata we already cached for this
+    very updatedAt. xml will look like GetPlexMetadata(plex_id)'s answer
+    """
+    answ = {}
+    with response_cache.ResponseCache(readonly=True) as cache:
+        for plex_id, updated_at in items:
+            if updated_at is None:
+                continue
+            cached = cache.get(_metadata_cache_url(plex_id), updated_at)
+            if cached is None:
+                continue
+            try:
+                answ[plex_id] = utils.etree.fromstring(cached[0])
+            except utils.ParseError:
+                LOG.warn('Could not parse cached metadata for %s', plex_id)
+    return answ
+
+
+def cache_plex_metadata(xmls):
+    """
+    Pass in a dict {plex_id: xml} with xmls looking like GetPlexMetadata's
+    answers. Stores all valid xmls in our response cache
+    """
+    with response_cache.ResponseCache() as cache:
+        for plex_id, xml in xmls.items():
+            try:
+                updated_at = utils.cast(int, xml[0].get('updatedAt'))
+            except (TypeError, IndexError, AttributeError):
+                continue
+            if updated_at is None:
+                continue
+            cache.store(_metadata_cache_url(plex_id),
+                        tostring(xml),
+                        plex_id=plex_id,
+                        updated_at=updated_at)
+
+
+def invalidate_cached_metadata(plex_ids):
+    """
+    Makes sure we're downloading fresh metadata for plex_ids next time
+    """
+    with response_cache.ResponseCache() as cache:
+        cache.invalidate(plex_ids)
+
+
+def download_conditionally(url):
+    """
+    Downloads url and returns the xml etree root, 401 or None. If the PMS
+    sent an ETag for url before, we're using a conditional request and use our
+    cached answer if the PMS tells us that nothing has changed
+    """
+    with response_cache.ResponseCache(readonly=True) as cache:
+        cached = cache.get(url)
+    header_options = None
+    if cached is not None and cached[1]:
+        header_options = {'If-None-Match': cached[1]}
+    downloader = DU()
+    r = downloader.downloadUrl(url,
+                               headerOptions=header_options,
+                               return_response=True)
+    try:
+        status = r.status_code
+    except AttributeError:
+        # Download failed
+        return
+    if status == 304 and cached is not None:
+        content = cached[0]
+    elif status in (200, 201):
+        content = r.content
+        etag = r.headers.get('ETag')
+        if etag:
+            with response_cache.ResponseCache() as cache:
+                cache.store(url, content, etag=etag)
+    elif status == 401:
+        r.encoding = 'utf-8'
+        downloader.unauthorized(url, r.text)
+        return 401
+    else:
+        LOG.warn('PMS answered with status code %s for %s', status, url)
+        return
+    try:
+        return utils.etree.fromstring(content)
+    except utils.ParseError:
+        LOG.error('Could not parse the PMS answer for %s', url)
+
+
 def get_playback_xml(url, server_name, authenticate=True, token=None):
     """
     Returns None if something went wrong
@@ -561,9 +772,21 @@ def GetAllPlexChildren(key):
     Input:
         key             Key to a Plex item, e.g. 12345
     """
-    return DownloadChunks(utils.extend_url(
-            f'{{server}}/library/metadata/{key}/children',
-            {'includeElements': 'Stream'}))
+    return DownloadChunks(_children_url(key))
+
+
+def get_all_plex_children_future(key):
+    """
+    Non-blocking version of GetAllPlexChildren using the asyncio download
+    engine. Returns a concurrent.futures.Future; its result() will be exactly
+    what GetAllPlexChildren(key) returns
+    """
+    return async_download.submit(_async_download_chunks(_children_url(key)))
+
+
+def _children_url(key):
+    return utils.extend_url(f'{{server}}/library/metadata/{key}/children',
+                            {'includeElements': 'Stream'})
 
 
 class ThreadedDownloadChunk(backgroundthread.Task):
@@ -577,14 +800,7 @@ class ThreadedDownloadChunk(backgroundthread.Task):
         super(ThreadedDownloadChunk, self).__init__()
 
     def run(self):
-        xml = DU().downloadUrl(self.url, parameters=self.args)
-        try:
-            xml.attrib
-        except AttributeError:
-            LOG.error('Error while downloading chunks: %s, args: %s',
-                      self.url, self.args)
-            xml = None
-        self.callback(xml)
+        self.callback(_download_raw_chunk(self.url, self.args))
 
 
 class DownloadGen(object):
@@ -592,13 +808,22 @@ class DownloadGen(object):
     Special iterator object that will yield all child xmls piece-wise. It also
     saves the original xml.attrib.
 
+    Chunks are kept as raw, unparsed PMS answers. They're parsed incrementally
+    and every child is detached from its xml root as soon as it has been
+    parsed completely - so memory is freed once the caller is done with it.
+
     Yields XML etree children or raises RuntimeError at the end
     """
     def __init__(self, url, plex_type, last_viewed_at, updated_at, args,
                  downloader):
         self._downloader = downloader
         self.successful = True
-        self.xml = None
+        # Raw xml chunks [bytes] that have not yet been parsed
+        self._chunks = deque()
+        # iterparse-iterator and xml root of the chunk currently being parsed
+        self._events = None
+        self._root = None
+        self._depth = 0
         self.args = args
         self.args.update({
             'X-Plex-Container-Start': 0,
@@ -612,8 +837,10 @@ class DownloadGen(object):
         if updated_at:
             url = '%supdatedAt>=%s&' % (url, updated_at)
         self.url = url[:-1]
-        _blocking_download_chunk(self.url, self.args, 0, self.set_xml)
-        self.attrib = self.xml.attrib
+        _blocking_download_chunk(self.url, self.args, 0, self._chunks.append)
+        if not self._open_next_chunk():
+            raise RuntimeError('Could not parse xml for %s' % self.url)
+        self.attrib = self._root.attrib
         self.current = 0
         self.total = int(self.attrib['totalSize'])
         self.cache_factor = 10
@@ -625,16 +852,63 @@ class DownloadGen(object):
             self.pending_counter.append(None)
             self._downloader(self.url, self.args, pos, self.on_chunk_downloaded)
 
-    def set_xml(self, xml):
-        self.xml = xml
-
-    def on_chunk_downloaded(self, xml):
-        if xml is not None:
-            self.xml.extend(xml)
+    def on_chunk_downloaded(self, chunk):
+        if chunk is not None:
+            self._chunks.append(chunk)
         else:
             self.successful = False
         self.pending_counter.pop()
 
+    def _open_next_chunk(self):
+        """
+        Starts parsing the next raw chunk we received. Returns False if there
+        is no chunk left or if the chunk could not be parsed
+        """
+        self._events = None
+        try:
+            chunk = self._chunks.popleft()
+        except IndexError:
+            return False
+        events = utils.etree.iterparse(BytesIO(chunk),
+                                       events=('start', 'end'))
+        try:
+            # The very first event yields the xml root, the MediaContainer
+            _, self._root = next(events)
+        except (utils.ParseError, StopIteration):
+            LOG.error('Could not parse xml chunk for %s', self.url)
+            self.successful = False
+            return False
+        self._events = events
+        self._depth = 1
+        return True
+
+    def _next_child(self):
+        """
+        Returns the next completely parsed child of the chunks' xml roots or
+        None if we parsed all chunks received so far
+        """
+        while True:
+            if self._events is None and not self._open_next_chunk():
+                if not self._chunks:
+                    return
+                # Skip a chunk we could not parse
+                continue
+            try:
+                for event, elem in self._events:
+                    if event == 'start':
+                        self._depth += 1
+                        continue
+                    self._depth -= 1
+                    if self._depth == 1:
+                        # Child of the xml root is complete. Detach it in
+                        # order to not hold on to it
+                        self._root.remove(elem)
+                        return elem
+            except utils.ParseError:
+                LOG.error('Could not parse xml chunk for %s', self.url)
+                self.successful = False
+            self._events = None
+
     def get(self, key, default=None):
         """
         Mimick etree xml's way to access xml.attrib via xml.get(key, default)
@@ -646,10 +920,9 @@ class DownloadGen(object):
 
     def __next__(self):
         while True:
-            try:
-                child = self.xml[0]
+            child = self._next_child()
+            if child is not None:
                 self.current += 1
-                self.xml.remove(child)
                 if (self.current % CONTAINERSIZE == 0 and
                         self.current <= self.total - (self.cache_factor - 1) * CONTAINERSIZE):
                     self.pending_counter.append(None)
@@ -659,12 +932,11 @@ class DownloadGen(object):
                         self.current + (self.cache_factor - 1) * CONTAINERSIZE,
                         self.on_chunk_downloaded)
                 return child
-            except IndexError:
-                if not self.pending_counter and not len(self.xml):
-                    if not self.successful:
-                        raise RuntimeError('Could not download everything')
-                    else:
-                        raise StopIteration()
+            if not self.pending_counter and not self._chunks:
+                if not self.successful:
+                    raise RuntimeError('Could not download everything')
+                else:
+                    raise StopIteration()
             LOG.debug('Waiting for download to finish')
             if app.APP.monitor.waitForAbort(0.1):
                 raise StopIteration('PKC needs to exit now')
@@ -672,20 +944,37 @@ class DownloadGen(object):
     next = __next__
 
 
-def _blocking_download_chunk(url, args, start, callback):
+def _download_raw_chunk(url, args):
     """
-    callback will be called with the downloaded xml (fragment)
+    Returns the raw PMS answer [bytes] without parsing it or None if something
+    went wrong
     """
-    args['X-Plex-Container-Start'] = start
-    xml = DU().downloadUrl(url, parameters=args)
+    downloader = DU()
+    r = downloader.downloadUrl(url, parameters=args, return_response=True)
     try:
-        xml.attrib
+        if r.status_code == 401:
+            # return_response=True skips downloadUrl's 401 accounting
+            r.encoding = 'utf-8'
+            downloader.unauthorized(url, r.text)
+        if r.status_code not in (200, 201):
+            raise AttributeError
     except AttributeError:
         LOG.error('Error while downloading chunks: %s, args: %s',
                   url, args)
+        return
+    return r.content
+
+
+def _blocking_download_chunk(url, args, start, callback):
+    """
+    callback will be called with the downloaded raw xml chunk [bytes]
+    """
+    args['X-Plex-Container-Start'] = start
+    chunk = _download_raw_chunk(url, args)
+    if chunk is None:
         raise RuntimeError('Error while downloading chunks for %s'
                            % url)
-    callback(xml)
+    callback(chunk)
 
 
 def _async_download_chunk(url, args, start, callback):
@@ -696,6 +985,37 @@ def _async_download_chunk(url, args, start, callback):
     backgroundthread.BGThreader.addTask(task)
 
 
+async def _async_download_raw_chunk(url, args):
+    """
+    Coroutine returning the raw PMS answer [bytes] without parsing it or None
+    if something went wrong
+    """
+    try:
+        r = await async_download.download(url, args)
+    except async_download.ERRORS as err:
+        LOG.error('Error while downloading chunks: %s, args: %s: %r',
+                  url, args, err)
+        return
+    if r.status not in (200, 201):
+        LOG.error('Error while downloading chunks: %s, args: %s, status: %s',
+                  url, args, r.status)
+        return
+    return r.content
+
+
+def _future_download_chunk(url, args, start, callback):
+    """
+    Uses the asyncio download engine. callback will be called with the raw
+    xml chunk [bytes] or None from the engine's thread
+    """
+    args['X-Plex-Container-Start'] = start
+    future = async_download.submit(
+        _async_download_raw_chunk(url, deepcopy(args)))  # Beware!
+    future.add_done_callback(
+        lambda f: callback(None if f.cancelled() or f.exception()
+                           else f.result()))
+
+
 def get_section_iterator(section_id, plex_type=None, last_viewed_at=None,
                          updated_at=None, args=None):
     args = args or {}
@@ -713,7 +1033,10 @@ def get_section_iterator(section_id, plex_type=None, last_viewed_at=None,
         downloader = _blocking_download_chunk
         args['sort'] = 'addedAt:asc'
     else:
-        downloader = _async_download_chunk
+        if app.SYNC.async_downloads:
+            downloader = _future_download_chunk
+        else:
+            downloader = _async_download_chunk
         args['sort'] = 'id'  # Entries are sorted by plex_id
     if plex_type in (v.PLEX_TYPE_EPISODE, v.PLEX_TYPE_SONG):
         # Annoying Plex bug. You won't get all episodes otherwise
@@ -775,6 +1098,42 @@ def DownloadChunks(url):
     return xml
 
 
+async def _async_download_chunks(url):
+    """
+    Coroutine version of DownloadChunks
+    """
+    xml = None
+    pos = 0
+    error_counter = 0
+    while error_counter < 10:
+        args = {
+            'X-Plex-Container-Size': CONTAINERSIZE,
+            'X-Plex-Container-Start': pos,
+            'sort': 'id'
+        }
+        xmlpart = await _async_download_xml(utils.extend_url(url, args))
+        try:
+            xmlpart.attrib
+        except AttributeError:
+            LOG.error('Error while downloading chunks: %s, args: %s',
+                      url, args)
+            pos += CONTAINERSIZE
+            error_counter += 1
+            continue
+        if xml is None:
+            xml = xmlpart
+        else:
+            for child in xmlpart:
+                xml.append(child)
+        if len(xmlpart) < CONTAINERSIZE:
+            break
+        pos += CONTAINERSIZE
+    if error_counter == 10:
+        LOG.error('Fatal error while downloading chunks for %s', url)
+        return None
+    return xml
+
+
 def GetPlexOnDeck(viewId):
     """
     """
@@ -782,7 +1141,7 @@ def GetPlexOnDeck(viewId):
 
 
 def get_plex_hub():
-    return DU().downloadUrl('{server}/hubs')
+    return download_conditionally('{server}/hubs')
 
 
 def get_plex_sections():
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Opt-in profiling of PKC's threads, e.g. if a sync takes ages on a user's
+machine. If activated in the PKC settings, the run() method of the selected
+KillableThreads is profiled with cProfile and, optionally, the memory
+allocations are traced with tracemalloc. Once a thread exits, a .pstats file
+and a text summary are written to the folder "profiling" in the addon profile
+"""
+from logging import getLogger
+from functools import wraps
+from threading import Lock, local
+import cProfile
+import io
+import os
+import pstats
+import time
+import tracemalloc
+
+from . import utils, path_ops, variables as v
+
+LOG = getLogger('PLEX.profiling')
+
+PROFILING_PATH = os.path.join(v.ADDON_PROFILE, 'profiling')
+# Number of functions and allocation sites to list in the text summary
+TOP_N = 50
+# Number of frames tracemalloc stores per allocation
+TRACEMALLOC_FRAMES = 10
+
+# Number of profiled threads currently using tracemalloc
+_TRACING = 0
+_TRACING_LOCK = Lock()
+# The cProfile.Profile currently running in this thread, if any
+_ACTIVE = local()
+
+
+def _start_tracing():
+    global _TRACING
+    with _TRACING_LOCK:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        _TRACING += 1
+    return tracemalloc.take_snapshot()
+
+
+def _stop_tracing(snapshot):
+    global _TRACING
+    diff = tracemalloc.take_snapshot().compare_to(snapshot, 'lineno')
+    with _TRACING_LOCK:
+        _TRACING -= 1
+        if not _TRACING:
+            tracemalloc.stop()
+    return diff
+
+
+def _write_results(name, profile, allocations):
+    filename = os.path.join(PROFILING_PATH, '%s-%s' % (
+        name, time.strftime('%Y%m%d-%H%M%S')))
+    try:
+        if not path_ops.exists(path_ops.append_os_sep(PROFILING_PATH)):
+            path_ops.makedirs(PROFILING_PATH)
+        summary = io.StringIO()
+        if profile is not None:
+            profile.dump_stats(filename + '.pstats')
+            stats = pstats.Stats(profile, stream=summary)
+            stats.sort_stats('cumulative').print_stats(TOP_N)
+        if allocations is not None:
+            summary.write('\nTop %s memory allocations while running %s:\n'
+                          % (TOP_N, name))
+            for stat in allocations[:TOP_N]:
+                summary.write('%s\n' % stat)
+        with open(filename + '.txt', 'w') as f:
+            f.write(summary.getvalue())
+    except (IOError, OSError) as err:
+        LOG.error('Could not write profiling results for %s: %s', name, err)
+    else:
+        LOG.info('Wrote profiling results for %s to %s', name, filename)
+
+
+def profiled(run, name):
+    """
+    Wraps a thread's run method run in order to profile it. name [str] will
+    be used for the result files. If run is called while another run of the
+    same thread is profiled, e.g. FullSync.run() within Sync.run(), the outer
+    profile is paused and thus does not contain the inner run
+    """
+    @wraps(run)
+    def wrapper():
+        allocations = snapshot = None
+        if utils.SETTINGS.get_bool('profilingTracemalloc'):
+            snapshot = _start_tracing()
+        outer = getattr(_ACTIVE, 'profile', None)
+        if outer is not None:
+            outer.disable()
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as err:
+            # Python 3.12+ only allows one active profiler at a time, e.g.
+            # if we're profiling another thread already
+            LOG.warn('Cannot profile %s: %s', name, err)
+            profile = None
+        else:
+            LOG.info('Start profiling %s', name)
+            _ACTIVE.profile = profile
+        try:
+            return run()
+        finally:
+            if profile is not None:
+                profile.disable()
+            _ACTIVE.profile = outer
+            if outer is not None:
+                outer.enable()
+            if snapshot is not None:
+                allocations = _stop_tracing(snapshot)
+            if profile is not None or allocations is not None:
+                _write_results(name, profile, allocations)
+    return wrapper
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Persistent, size-bounded cache for PMS answers. Answers are stored as
+zlib-compressed blobs in their own SQLite database plex-responses.db, keyed
+by url and Plex token.
+
+An entry is only valid as long as the Plex item's updatedAt did not change
+or as long as the PMS confirms the entry's ETag.
+"""
+from logging import getLogger
+from hashlib import sha1
+from threading import Lock
+import zlib
+
+from . import db, timing, utils, app
+
+LOG = getLogger('PLEX.response_cache')
+
+RESPONSE_CACHE_LOCK = Lock()
+# Max. size of all cached answers (compressed) in bytes
+MAX_CACHE_SIZE = 100 * 1024 * 1024
+# Every cache eviction shrinks the cache to this fraction of MAX_CACHE_SIZE
+EVICTION_TARGET = 0.8
+
+# Running total of the cache size in bytes; None if we need to ask the DB.
+# Over-estimates the size as we're not subtracting replaced answers
+_SIZE = None
+# Cache keys of answers we used since the last write {key: unix timestamp}.
+# Their last_access is updated in one go with the next write
+_ACCESSED = {}
+
+
+def cache_key(url):
+    """
+    Returns the cache key for url. Different PMS and Plex users will get
+    different answers, hence we're including the PMS address and Plex token
+    """
+    key = '%s|%s' % (url.replace('{server}', app.CONN.server or ''),
+                     utils.window('pms_token'))
+    return sha1(key.encode('utf-8')).hexdigest()
+
+
+class ResponseCache(object):
+    """
+    Use as a context manager. Pass readonly=True if you only want to get()
+    answers - several threads can then read at the same time
+    """
+    def __init__(self, lock=True, readonly=False):
+        self.lock = lock and not readonly
+        self.readonly = readonly
+        self.conn = None
+        self.cursor = None
+
+    def __enter__(self):
+        if self.lock:
+            RESPONSE_CACHE_LOCK.acquire()
+        self.conn = db.connect('responses', readonly=self.readonly)
+        self.cursor = self.conn.cursor()
+        return self
+
+    def __exit__(self, e_typ, e_val, trcbak):
+        try:
+            if e_typ:
+                # re-raise any exception
+                return False
+            if not self.readonly:
+                self._update_last_access()
+                if _SIZE is None or _SIZE > MAX_CACHE_SIZE:
+                    self.evict()
+                self.conn.commit()
+        finally:
+            self.conn.close()
+            if self.lock:
+                RESPONSE_CACHE_LOCK.release()
+
+    def get(self, url, updated_at=None):
+        """
+        Returns the tuple (content [bytes], etag) for url or None if we did not
+        cache url yet. Pass in updated_at to only get an answer that was cached
+        for this updatedAt. An outdated answer will be replaced once we store
+        the new one
+        """
+        key = cache_key(url)
+        self.cursor.execute('''
+            SELECT content, etag, updated_at FROM response WHERE key = ?
+        ''', (key, ))
+        answ = self.cursor.fetchone()
+        if answ is None:
+            return
+        if updated_at is not None and answ[2] != updated_at:
+            # Plex item has changed in the meantime
+            return
+        _ACCESSED[key] = timing.unix_timestamp()
+        return zlib.decompress(answ[0]), answ[1]
+
+    def store(self, url, content, plex_id=None, updated_at=None, etag=None):
+        """
+        Caches the PMS answer content [bytes] for url
+        """
+        global _SIZE
+        content = zlib.compress(content)
+        self.cursor.execute('''
+            INSERT OR REPLACE INTO response(
+                key, plex_id, updated_at, etag, content, size, last_access)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (cache_key(url), plex_id, updated_at, etag, content,
+              len(content), timing.unix_timestamp()))
+        if _SIZE is not None:
+            _SIZE += len(content)
+
+    def invalidate(self, plex_ids):
+        """
+        Deletes all cached answers for the Plex items plex_ids
+        """
+        self.cursor.executemany('DELETE FROM response WHERE plex_id = ?',
+                                ((x, ) for x in plex_ids))
+
+    def _update_last_access(self):
+        """
+        Records when we used the answers we got since the last write
+        """
+        if not _ACCESSED:
+            return
+        accessed = list(_ACCESSED.items())
+        _ACCESSED.clear()
+        self.cursor.executemany(
+            'UPDATE response SET last_access = ? WHERE key = ?',
+            ((timestamp, key) for key, timestamp in accessed))
+
+    def evict(self):
+        """
+        Deletes the least recently used answers if the cache grew too big.
+        Needs to sum up the size of all answers, so we're only called if our
+        running total exceeds MAX_CACHE_SIZE
+        """
+        global _SIZE
+        self.cursor.execute('SELECT SUM(size) FROM response')
+        size = self.cursor.fetchone()[0] or 0
+        if size <= EVICTION_TARGET * MAX_CACHE_SIZE:
+            _SIZE = size
+            return
+        target = size - EVICTION_TARGET * MAX_CACHE_SIZE
+        freed = 0
+        keys = []
+        for key, entry_size in self.cursor.execute(
+                'SELECT key, size FROM response ORDER BY last_access').fetchall():
+            keys.append((key, ))
+            freed += entry_size
+            if freed >= target:
+                break
+        self.cursor.executemany('DELETE FROM response WHERE key = ?', keys)
+        _SIZE = size - freed
+        LOG.debug('Evicted %s answers with %s bytes from the cache',
+                  len(keys), freed)
+
+
+def initialize():
+    """
+    Run once upon PKC startup to make sure the cache's table exists
+    """
+    with ResponseCache() as cache:
+        cache.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS response(
+                key TEXT PRIMARY KEY,
+                plex_id INTEGER,
+                updated_at INTEGER,
+                etag TEXT,
+                content BLOB,
+                size INTEGER,
+                last_access INTEGER)
+        ''')
+        cache.cursor.execute('''
+            CREATE INDEX IF NOT EXISTS ix_response_1
+            ON response (plex_id)
+        ''')
+        cache.cursor.execute('''
+            CREATE INDEX IF NOT EXISTS ix_response_2
+            ON response (last_access)
+        ''')
+
+
+def wipe():
+    """
+    Completely wipes the response cache. Call initialize() afterwards
+    """
+    global _SIZE
+    _ACCESSED.clear()
+    _SIZE = 0
+    with ResponseCache() as cache:
+        cache.cursor.execute('DROP TABLE IF EXISTS response')
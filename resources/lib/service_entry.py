@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 import logging
+import queue
 import sys
 
 import xbmc
@@ -15,12 +16,14 @@ from . import plex_db
 from . import plex_companion
 from . import plex_functions as PF
 from . import playback_starter
+from . import transfer
 from . import variables as v
 from . import app
 from . import loghandler
 from . import backgroundthread
 from . import skip_plex_markers
 from . import downloadutils
+from . import async_download
 from .windows import userselect
 
 ###############################################################################
@@ -105,6 +108,9 @@ class Service(object):
         self.setup = None
         self.pms_ws = None
         self.alexa_ws = None
+        self.command_server = None
+        # Commands received via transfer.CommandServer, see on_command
+        self.commands = queue.Queue()
         # Flags for other threads
         self.connection_check_running = False
         self.auth_running = False
@@ -116,6 +122,21 @@ class Service(object):
             return True
         return app.APP.monitor.abortRequested() or app.APP.stop_pkc
 
+    def on_command(self, command, channel):
+        """
+        Called by transfer.CommandServer for every command another PKC Python
+        instance sent us. Playback is started right away in order to answer
+        default.py as fast as possible; everything else is processed in our
+        main loop
+        """
+        if command and command.startswith('PLAY-'):
+            task = playback_starter.PlaybackTask(command.replace('PLAY-', ''),
+                                                 channel=channel)
+            backgroundthread.BGThreader.addTasksToFront([task])
+        else:
+            transfer.close_channel(channel)
+            self.commands.put(command)
+
     def on_connection_check(self, result):
         """
         Call this method after PF.check_connection()
@@ -488,6 +509,14 @@ class Service(object):
         app.init()
         app.APP.monitor = kodimonitor.KodiMonitor()
         app.APP.player = xbmc.Player()
+        # Accept commands from other PKC Python instances via a socket
+        try:
+            self.command_server = transfer.CommandServer(self.on_command)
+        except OSError as err:
+            LOG.error('Could not open a socket for commands, using window '
+                      'properties: %s', err)
+        else:
+            self.command_server.start()
 
         # Server auto-detect
         self.setup = initialsetup.InitialSetup()
@@ -509,10 +538,16 @@ class Service(object):
 
             # Check for PKC commands from other Python instances
             plex_command = utils.window('plexkodiconnect.command')
+            if plex_command:
+                utils.window('plexkodiconnect.command', clear=True)
+            else:
+                try:
+                    plex_command = self.commands.get(block=False)
+                except queue.Empty:
+                    pass
             if plex_command:
                 # Commands/user interaction received from other PKC Python
                 # instances (default.py and context.py instead of service.py)
-                utils.window('plexkodiconnect.command', clear=True)
                 task = None
                 if plex_command.startswith('PLAY-'):
                     # Add-on path playback!
@@ -624,12 +659,15 @@ class Service(object):
         # Tell all threads to terminate (e.g. several lib sync threads)
         LOG.debug('Aborting all threads')
         app.APP.stop_pkc = True
+        if self.command_server is not None:
+            self.command_server.stop()
         backgroundthread.BGThreader.shutdown(block=False)
         # Load/Reset PKC entirely - important for user/Kodi profile switch
         # Clear video nodes properties
         library_sync.clear_window_vars()
         # Will block until threads have quit
         app.APP.stop_threads()
+        async_download.shutdown()
         # CLEANUP
         # Kodi's xbmc.Monitor() stalls
         # delete xbmc.Player() just to be sure
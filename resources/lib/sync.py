@@ -4,7 +4,7 @@ from logging import getLogger
 import xbmc
 
 from .downloadutils import DownloadUtils as DU
-from . import library_sync, timing
+from . import library_sync, timing, widget_cache, widget_precompute
 from . import backgroundthread, utils, artwork, variables as v, app
 from . import kodi_db
 
@@ -75,6 +75,8 @@ class Sync(backgroundthread.KillableThread):
         self.last_full_sync = timing.unix_timestamp()
         if not successful:
             LOG.warn('Could not finish scheduled full sync')
+        else:
+            widget_cache.invalidate()
         app.APP.resume_metadata_thread()
         app.APP.resume_caching_thread()
 
@@ -230,9 +232,15 @@ class Sync(backgroundthread.KillableThread):
                     # refreshes lead to flickering)
                     if (library_sync.WEBSOCKET_MESSAGES and
                             now - last_websocket_processing > 5 and
-                            (utils.settings('delayBackgroundSyncWhilePlaying') == "false" or not app.APP.is_playing_video)):
+                            (not utils.SETTINGS.get_bool('delayBackgroundSyncWhilePlaying') or not app.APP.is_playing_video)):
                         last_websocket_processing = now
-                        library_sync.process_websocket_messages()
+                        if library_sync.process_websocket_messages():
+                            widget_cache.invalidate()
+                    # Write buffered resume points of other Plex players
+                    if library_sync.flush_playstates():
+                        widget_cache.invalidate()
+                    # Precompute widgets if something changed
+                    widget_precompute.refresh()
                     # See if there is a PMS message we need to handle
                     try:
                         message = queue.get(block=False)
@@ -240,12 +248,15 @@ class Sync(backgroundthread.KillableThread):
                         pass
                     # Got a message from PMS; process it
                     else:
-                        library_sync.store_websocket_message(message)
+                        if library_sync.store_websocket_message(message):
+                            widget_cache.invalidate()
                         queue.task_done()
                         # Sleep just a bit
                         self.sleep(0.01)
                         continue
             self.sleep(0.1)
+        # Don't lose resume points of other Plex players
+        library_sync.flush_playstates(force=True)
         # Shut down playlist monitoring
         if playlist_monitor:
             playlist_monitor.stop()
@@ -3,9 +3,22 @@
 """
 Used to shovel data from separate Kodi Python instances to the main thread
 and vice versa.
+
+The PKC service listens on a localhost socket, see CommandServer. Every
+command opens a new connection that is then used for all the data
+belonging to this command, e.g. the ListItem for a playback startup. Messages
+are length-prefixed JSON frames carrying the command's request id. If the
+socket is not available, we're falling back to window properties
 """
 from logging import getLogger
+import hmac
 import json
+import secrets
+import socket
+import struct
+import threading
+import time
+import uuid
 
 import xbmc
 import xbmcgui
@@ -15,8 +28,22 @@ WINDOW = xbmcgui.Window(10000)
 WINDOW_UPSTREAM = 'plexkodiconnect.result.upstream'
 WINDOW_DOWNSTREAM = 'plexkodiconnect.result.downstream'
 WINDOW_COMMAND = 'plexkodiconnect.command'
+WINDOW_IPC_PORT = 'plexkodiconnect.ipc.port'
+WINDOW_IPC_SECRET = 'plexkodiconnect.ipc.secret'
 KODIVERSION = int(xbmc.getInfoLabel("System.BuildVersion")[:2])
 
+# Frame header: length of the JSON payload in bytes
+HEADER = struct.Struct('!I')
+# Max. number of seconds to wait for the PKC service to accept a command
+IPC_TIMEOUT = 2.0
+# Socket timeout in seconds while waiting for data, e.g. while the PKC service
+# is busy starting playback. We'll check for Kodi's abort in between
+IPC_POLL_INTERVAL = 0.5
+
+# The connection (socket, request_id) used by send() and wait_for_transfer()
+# in the current thread, or None to use window properties
+_LOCAL = threading.local()
+
 
 def cast(func, value):
     """
@@ -75,11 +102,114 @@ def kodi_window(property, value=None, clear=False):
         return WINDOW.getProperty(property)
 
 
+def _recv_exactly(sock, size, deadline=None):
+    """
+    Receives exactly size bytes from sock. Raises socket.timeout once
+    time.monotonic() passed deadline. Without a deadline, waits until Kodi
+    is shutting down
+    """
+    data = b''
+    while len(data) < size:
+        try:
+            chunk = sock.recv(size - len(data))
+        except socket.timeout:
+            if deadline is not None:
+                if time.monotonic() >= deadline:
+                    raise
+            elif xbmc.Monitor().abortRequested():
+                raise ConnectionAbortedError('Kodi is shutting down')
+            continue
+        if not chunk:
+            raise ConnectionResetError('Connection closed by other side')
+        data += chunk
+    return data
+
+
+def send_frame(sock, message):
+    """
+    Sends message, anything that can be JSON-serialized, over sock
+    """
+    payload = json.dumps(message).encode('utf-8')
+    sock.sendall(HEADER.pack(len(payload)) + payload)
+
+
+def recv_frame(sock, timeout=None):
+    """
+    Blocks until a message sent with send_frame() arrived on sock. Raises
+    OSError if the connection broke down or if the message did not arrive
+    within timeout seconds and ValueError for garbage. Pass timeout=None to
+    wait until Kodi is shutting down
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    size = HEADER.unpack(_recv_exactly(sock, HEADER.size, deadline))[0]
+    return json.loads(_recv_exactly(sock, size, deadline).decode('utf-8'))
+
+
+def _channel():
+    return getattr(_LOCAL, 'channel', None)
+
+
+def set_channel(channel):
+    """
+    Use channel, the tuple (socket, request_id), for send() and
+    wait_for_transfer() in the current thread
+    """
+    _LOCAL.channel = channel
+
+
+def close_channel(channel=None):
+    """
+    Closes channel or the current thread's channel. send() and
+    wait_for_transfer() will use window properties again
+    """
+    if channel is None:
+        channel = _channel()
+        _LOCAL.channel = None
+    if channel is not None:
+        try:
+            channel[0].close()
+        except OSError:
+            pass
+
+
+def _send_command(value):
+    """
+    Sends the command value to the PKC service's socket. Returns the
+    channel (socket, request_id) to transfer data for this command
+    """
+    port = int(kodi_window(WINDOW_IPC_PORT))
+    sock = socket.create_connection(('127.0.0.1', port), timeout=IPC_TIMEOUT)
+    try:
+        request_id = uuid.uuid4().hex
+        send_frame(sock, {
+            'id': request_id,
+            'secret': kodi_window(WINDOW_IPC_SECRET),
+            'command': value
+        })
+        # The PKC service confirms that it accepted the command
+        if recv_frame(sock, IPC_TIMEOUT).get('id') != request_id:
+            raise ValueError('Unexpected answer from the PKC service')
+    except Exception:
+        sock.close()
+        raise
+    sock.settimeout(IPC_POLL_INTERVAL)
+    return sock, request_id
+
+
 def plex_command(value):
     """
-    Used to funnel states between different Python instances. NOT really thread
-    safe - let's hope the Kodi user can't click fast enough
+    Used to funnel states between different Python instances. Uses the PKC
+    service's socket if possible. Otherwise, uses window properties which is
+    NOT really thread safe - let's hope the Kodi user can't click fast enough
     """
+    close_channel()
+    try:
+        set_channel(_send_command(value))
+    except (OSError, ValueError) as err:
+        LOG.warn('Socket of the PKC service not available, falling back to '
+                 'window properties: %s', err)
+    else:
+        return
     while kodi_window(WINDOW_COMMAND):
         xbmc.sleep(50)
     kodi_window(WINDOW_COMMAND, value=value)
@@ -116,8 +246,16 @@ def send(pkc_listitem, target='default'):
     Set target='default' if you send data TO another Python default.py
     instance, 'main' if your default.py needs to send to the main thread
     """
-    window = WINDOW_DOWNSTREAM if target == 'default' else WINDOW_UPSTREAM
     LOG.debug('Sending: %s', pkc_listitem)
+    channel = _channel()
+    if channel is not None:
+        try:
+            send_frame(channel[0], {'id': channel[1],
+                                    'data': serialize(pkc_listitem)})
+        except OSError as err:
+            LOG.error('Could not send to request %s: %s', channel[1], err)
+        return
+    window = WINDOW_DOWNSTREAM if target == 'default' else WINDOW_UPSTREAM
     kodi_window(window,
                 value=json.dumps(serialize(pkc_listitem)))
 
@@ -128,6 +266,20 @@ def wait_for_transfer(source='main'):
     instance, 'main' if your default.py needs to wait for the main thread
     """
     LOG.debug('Waiting for transfer from %s', source)
+    channel = _channel()
+    if channel is not None:
+        try:
+            answ = recv_frame(channel[0])
+        except (OSError, ValueError) as err:
+            LOG.error('Connection for request %s broke down: %s',
+                      channel[1], err)
+            # Same as if the other side told us that there's nothing to do
+            return True
+        if answ.get('id') != channel[1]:
+            LOG.warn('Received answer %s for request %s',
+                     answ.get('id'), channel[1])
+        LOG.debug('Received')
+        return de_serialize(answ['data'])
     window = WINDOW_DOWNSTREAM if source == 'main' else WINDOW_UPSTREAM
     result = ''
     while not result:
@@ -140,6 +292,68 @@ def wait_for_transfer(source='main'):
         xbmc.sleep(50)
 
 
+class CommandServer(threading.Thread):
+    """
+    Runs in the PKC service. Accepts commands from other PKC Python instances
+    on a localhost socket and hands them over to callback(command, channel)
+    in a separate thread per connection. callback is responsible for closing
+    the channel, e.g. with close_channel(channel)
+    """
+    def __init__(self, callback):
+        self.callback = callback
+        self.secret = secrets.token_hex(16)
+        self._stop_event = threading.Event()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(8)
+        self.sock.settimeout(IPC_POLL_INTERVAL)
+        super(CommandServer, self).__init__(name='CommandServer', daemon=True)
+
+    def start(self):
+        super(CommandServer, self).start()
+        kodi_window(WINDOW_IPC_SECRET, value=self.secret)
+        kodi_window(WINDOW_IPC_PORT, value=str(self.sock.getsockname()[1]))
+        LOG.info('Accepting commands on port %s', self.sock.getsockname()[1])
+
+    def stop(self):
+        kodi_window(WINDOW_IPC_PORT, clear=True)
+        kodi_window(WINDOW_IPC_SECRET, clear=True)
+        self._stop_event.set()
+
+    def run(self):
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    conn, _ = self.sock.accept()
+                except socket.timeout:
+                    continue
+                except OSError as err:
+                    LOG.error('Could not accept a connection: %s', err)
+                    continue
+                threading.Thread(target=self._handle,
+                                 args=(conn, ),
+                                 daemon=True).start()
+        finally:
+            self.sock.close()
+
+    def _handle(self, conn):
+        conn.settimeout(IPC_TIMEOUT)
+        try:
+            request = recv_frame(conn, IPC_TIMEOUT)
+            if not hmac.compare_digest(str(request.get('secret')),
+                                       self.secret):
+                raise ValueError('Wrong secret')
+            send_frame(conn, {'id': request['id']})
+        except (OSError, ValueError, KeyError, AttributeError) as err:
+            LOG.error('Rejecting command: %s', err)
+            conn.close()
+            return
+        conn.settimeout(IPC_POLL_INTERVAL)
+        LOG.debug('Received command %s with request id %s',
+                  request.get('command'), request['id'])
+        self.callback(request.get('command'), (conn, request['id']))
+
+
 def convert_pkc_to_listitem(pkc_listitem):
     """
     Insert a PKCListItem() and you will receive a valid XBMC listitem
@@ -122,6 +122,58 @@ def settings(setting, value=None):
         else:
             # Should return unicode by default, but just in case
             return addon.getSetting(setting)
+    SETTINGS.forget(setting)
+
+
+class SettingsSnapshot(object):
+    """
+    Remembers PKC settings once read so we don't need to instantiate
+    xbmcaddon.Addon for every single access. Use for settings that are read
+    often, e.g. for every websocket message. The PKC service empties the
+    snapshot whenever the settings change, see KodiMonitor.onSettingsChanged
+    """
+    def __init__(self):
+        self._settings = {}
+
+    def get(self, setting):
+        """
+        Returns the setting as unicode, exactly like settings(setting)
+        """
+        with SETTINGS_LOCK:
+            try:
+                return self._settings[setting]
+            except KeyError:
+                value = xbmcaddon.Addon(
+                    'plugin.video.plexkodiconnect').getSetting(setting)
+                self._settings[setting] = value
+                return value
+
+    def get_bool(self, setting):
+        return self.get(setting) == 'true'
+
+    def get_int(self, setting, default=None):
+        """
+        Returns the setting as int or default if the setting is not set or
+        not a number, e.g. on a fresh Kodi profile
+        """
+        try:
+            return int(self.get(setting))
+        except ValueError:
+            return default
+
+    def forget(self, setting=None):
+        """
+        Forgets setting or all settings if setting is None; they will be read
+        again from Kodi on next access
+        """
+        with SETTINGS_LOCK:
+            if setting is None:
+                self._settings.clear()
+            else:
+                self._settings.pop(setting, None)
+
+
+SETTINGS = SettingsSnapshot()
 
 
 def lang(stringid):
@@ -469,7 +521,7 @@ def wipe_database(reboot=True):
     LOG.warn('Start wiping')
     from .library_sync.sections import delete_files
     from .library_sync.common import PLAYLIST_SYNC_ENABLED
-    from . import kodi_db, plex_db
+    from . import kodi_db, plex_db, response_cache, lookup_cache, widget_precompute
     delete_files()
     if PLAYLIST_SYNC_ENABLED:
         from .playlists import remove_synced_playlists
@@ -489,6 +541,9 @@ def wipe_database(reboot=True):
     LOG.info("Resetting all cached artwork.")
     kodi_db.wipe_dbs(music)
     plex_db.wipe()
+    response_cache.wipe()
+    lookup_cache.wipe()
+    widget_precompute.wipe()
 
     # reset the install run flag
     settings('SyncInstallRunDone', value="false")
@@ -507,9 +562,12 @@ def init_dbs():
     """
     Call e.g. on startup to ensure that Plex and Kodi DBs look like they should
     """
-    from . import kodi_db, plex_db
+    from . import kodi_db, plex_db, response_cache, lookup_cache, widget_precompute
     # Ensure that Plex DB is set-up
     plex_db.initialize()
+    response_cache.initialize()
+    lookup_cache.initialize()
+    widget_precompute.initialize()
     # Hack to speed up look-ups for actors (giant table!)
     kodi_db.create_kodi_db_indicees()
     kodi_db.setup_kodi_default_entries()
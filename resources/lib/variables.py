@@ -114,6 +114,7 @@ DB_TEXTURE_VERSION = None
 DB_TEXTURE_PATH = None
 DB_PLEX_PATH = xbmcvfs.translatePath("special://database/plex.db")
 DB_PLEX_COPY_PATH = xbmcvfs.translatePath("special://database/plex-copy.db")
+DB_RESPONSE_CACHE_PATH = xbmcvfs.translatePath("special://database/plex-responses.db")
 
 EXTERNAL_SUBTITLE_TEMP_PATH = xbmcvfs.translatePath(
     "special://profile/addon_data/%s/temp/" % ADDON_ID)
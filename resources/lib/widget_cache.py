@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Widgets and other add-on listings run in a new Python instance every single
+time. In order to show them without asking the PMS or Kodi, the PKC service
+precomputes the listings that were requested recently, e.g. hubs or On Deck,
+whenever a sync or PMS websocket message changed the Kodi DB, see
+widget_precompute. They're stored in plex-responses.db, keyed by the add-on
+call's parameters and the Plex token.
+
+This module is the add-on's side: it only ever reads the cache. Showing a
+precomputed listing must stay fast, so only import what's absolutely needed
+"""
+from logging import getLogger
+from hashlib import sha1
+from pathlib import Path
+import json
+import sqlite3
+import time
+
+import xbmcaddon
+import xbmcgui
+
+from . import variables as v
+
+LOG = getLogger('PLEX.widget_cache')
+
+WINDOW = xbmcgui.Window(10000)
+# Parameters of an add-on call that determine its listing. Skins might append
+# other parameters, e.g. to force Kodi to reload a widget
+PARAMS = ('mode', 'key', 'plex_type', 'section_id', 'synched', 'content_type')
+# Keys ending with these are cached, besides all hubs
+CACHED_KEYS = ('/onDeck', '/recentlyAdded')
+# Precomputed listings older than this many seconds are not shown anymore,
+# e.g. if the PKC service is not running
+MAX_AGE = 60 * 60
+# Showing a precomputed listing renews its request at most every x seconds
+REQUEST_RENEWAL = 24 * 60 * 60
+# Seconds to wait for the PKC service if it is writing to the cache
+DB_TIMEOUT = 1
+
+# Window property that tells the PKC service to precompute listings again
+OUTDATED = 'plex_widgets_outdated'
+# Window property with the JSON list of the params of all listings that were
+# requested since the PKC service last looked
+REQUESTED = 'plex_widgets_requested'
+
+
+def cacheable(params):
+    """
+    Returns True if we precompute the listing for the add-on call with params
+    [dict]
+    """
+    if xbmcaddon.Addon().getSetting('widgetCache') != 'true':
+        return False
+    if params.get('mode') == 'hub':
+        return True
+    if (params.get('mode') != 'browseplex' or
+            'prompt' in params or 'query' in params):
+        return False
+    key = params.get('key') or ''
+    return (key.startswith('/hubs/') or
+            key.split('?', 1)[0].endswith(CACHED_KEYS))
+
+
+def _params(params):
+    return json.dumps({x: params[x] for x in PARAMS if x in params},
+                      sort_keys=True)
+
+
+def cache_key(params):
+    """
+    Returns the cache key for params [str, JSON]. Different PMS and Plex users
+    will get different listings, hence we're including the Plex token
+    """
+    key = '%s|%s' % (params, WINDOW.getProperty('pms_token'))
+    return sha1(key.encode('utf-8')).hexdigest()
+
+
+def get(params):
+    """
+    Returns the tuple (content_type, items, key) that the PKC service
+    precomputed for the add-on call with params [dict], see
+    entrypoint.prepare_listing(), or None. Tells the PKC service about new
+    listings so it will precompute them from now on
+    """
+    params = _params(params)
+    now = int(time.time())
+    try:
+        conn = sqlite3.connect(
+            '%s?mode=ro' % Path(v.DB_RESPONSE_CACHE_PATH).as_uri(),
+            uri=True,
+            timeout=DB_TIMEOUT,
+            isolation_level=None)
+        try:
+            row = conn.execute(
+                'SELECT content, stored, requested FROM widget WHERE key = ?',
+                (cache_key(params), )).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.OperationalError as err:
+        # E.g. the PKC service did not yet create the table
+        LOG.warn('Could not use the widget cache: %s', err)
+        return
+    if row is None or row[2] < now - REQUEST_RENEWAL:
+        _request(params)
+    if row is None or row[0] is None or row[1] < now - MAX_AGE:
+        return
+    listing = json.loads(row[0])
+    return tuple(listing) if listing else None
+
+
+def _request(params):
+    """
+    Lets the PKC service know that the listing for params [str, JSON] was
+    requested, so we never need to write to the DB here. Another add-on call
+    might overwrite REQUESTED at the same time; the listing will then simply
+    be requested again with its next call
+    """
+    requested = WINDOW.getProperty(REQUESTED)
+    requested = json.loads(requested) if requested else []
+    if params not in requested:
+        requested.append(params)
+        WINDOW.setProperty(REQUESTED, json.dumps(requested))
+
+
+def show(params):
+    """
+    Shows the listing that the PKC service precomputed for the add-on call
+    with params [dict], without asking the PMS. Returns False if there is no
+    such listing
+    """
+    if not cacheable(params):
+        return False
+    # Only needs xbmc* and variables, just like this module
+    from . import widgets
+    if params.get('mode') == 'hub':
+        params = dict(params,
+                      content_type=params.get('content_type') or widgets.guess_video_or_audio())
+    listing = get(params)
+    if listing is None:
+        return False
+    LOG.debug('Showing precomputed listing for %s', params)
+    widgets.add_listing(*listing)
+    return True
+
+
+def invalidate():
+    """
+    Tells the PKC service to precompute all listings again, e.g. because the
+    PMS told us about changes. Works in any Python instance
+    """
+    WINDOW.setProperty(OUTDATED, 'true')
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+The PKC service's side of the widget cache, see widget_cache: precomputes
+the listings that add-on calls requested recently and stores them in
+plex-responses.db
+"""
+from logging import getLogger
+from contextlib import contextmanager
+from threading import Lock
+import json
+import sqlite3
+
+from . import db, timing, utils, backgroundthread, app, widget_cache
+
+LOG = getLogger('PLEX.widget_precompute')
+
+WIDGET_CACHE_LOCK = Lock()
+# We stop precomputing a listing if it has not been requested for this many
+# seconds
+REQUEST_TTL = 7 * 24 * 60 * 60
+# Precompute listings at most every x seconds
+REFRESH_DELAY = 30
+
+_LAST_REFRESH = 0
+_TASK = None
+
+
+@contextmanager
+def _connection():
+    with WIDGET_CACHE_LOCK:
+        conn = db.connect('responses')
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def store(params, listing, requested):
+    """
+    Stores listing, the tuple returned by entrypoint.prepare_listing(), for
+    the add-on call with params [str, JSON]
+    """
+    with _connection() as conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO widget(
+                key, params, content, stored, requested)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (widget_cache.cache_key(params), params, json.dumps(listing),
+              timing.unix_timestamp(), requested))
+
+
+def refresh():
+    """
+    Call regularly from the PKC service. Starts to precompute all recently
+    requested listings if they're outdated or if new ones were requested
+    """
+    global _LAST_REFRESH, _TASK
+    if not utils.SETTINGS.get_bool('widgetCache'):
+        return
+    now = timing.unix_timestamp()
+    if _TASK is not None and _TASK.isValid():
+        # Still precomputing
+        return
+    if now - _LAST_REFRESH < REFRESH_DELAY or app.APP.is_playing_video:
+        return
+    requested = utils.window(widget_cache.REQUESTED)
+    if (not requested and utils.window(widget_cache.OUTDATED) != 'true' and
+            now - _LAST_REFRESH < widget_cache.MAX_AGE / 2):
+        return
+    utils.window(widget_cache.REQUESTED, clear=True)
+    utils.window(widget_cache.OUTDATED, clear=True)
+    _LAST_REFRESH = now
+    _TASK = RefreshTask().setup(json.loads(requested) if requested else [])
+    _TASK.start()
+
+
+class RefreshTask(backgroundthread.Task):
+    """
+    Records the listings that were requested since the last refresh, then
+    precomputes all listings that were requested within REQUEST_TTL
+    """
+    def setup(self, requested):
+        # params [str, JSON] of the listings the add-on asked for
+        self.requested = requested
+        return self
+
+    def run(self):
+        try:
+            self._precompute()
+        except sqlite3.Error as err:
+            LOG.warn('Could not precompute listings: %s', err)
+        finally:
+            # Task._run() only marks us finished if we did not raise - never
+            # keep refresh() from starting a new task
+            self.finished = True
+
+    def _precompute(self):
+        from . import entrypoint
+        now = timing.unix_timestamp()
+        with _connection() as conn:
+            for params in self.requested:
+                key = widget_cache.cache_key(params)
+                conn.execute('''
+                    INSERT OR IGNORE INTO widget(
+                        key, params, content, stored, requested)
+                    VALUES (?, ?, NULL, 0, ?)
+                ''', (key, params, now))
+                conn.execute('UPDATE widget SET requested = ? WHERE key = ?',
+                             (now, key))
+            conn.execute('DELETE FROM widget WHERE requested < ?',
+                         (now - REQUEST_TTL, ))
+            rows = conn.execute('''
+                SELECT params, MAX(requested) FROM widget GROUP BY params
+            ''').fetchall()
+        LOG.debug('Precomputing %s listings', len(rows))
+        for params, requested in rows:
+            if self.should_cancel():
+                break
+            args = json.loads(params)
+            try:
+                if args['mode'] == 'hub':
+                    xml = entrypoint.hub_xml(args.get('content_type'))
+                    listing = entrypoint.prepare_listing(
+                        xml,
+                        playlist_type=args.get('content_type'),
+                        gui=False)
+                else:
+                    xml = entrypoint.browse_xml(args['key'])
+                    if xml is None:
+                        LOG.warn('Could not precompute listing %s', params)
+                        continue
+                    listing = entrypoint.prepare_listing(
+                        xml,
+                        plex_type=args.get('plex_type'),
+                        section_id=args.get('section_id'),
+                        synched=args.get('synched') != 'false',
+                        key=args['key'],
+                        gui=False)
+            except entrypoint.ListingException:
+                LOG.warn('Could not precompute listing %s', params)
+                continue
+            # An empty listing is stored as None; the add-on will then ask
+            # the PMS itself
+            store(params, listing, requested)
+
+
+def initialize():
+    """
+    Run once upon PKC startup to make sure the cache's table exists
+    """
+    with _connection() as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS widget(
+                key TEXT PRIMARY KEY,
+                params TEXT,
+                content TEXT,
+                stored INTEGER,
+                requested INTEGER)
+        ''')
+
+
+def wipe():
+    """
+    Completely wipes the widget cache. Call initialize() afterwards
+    """
+    with _connection() as conn:
+        conn.execute('DROP TABLE IF EXISTS widget')
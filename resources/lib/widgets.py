@@ -7,29 +7,83 @@ Loads of different functions called in SEPARATE Python instances through
 e.g. plugin://... calls. Hence be careful to only rely on window variables.
 """
 from logging import getLogger
+from collections import defaultdict
+from urllib.parse import unquote
+import sqlite3
+import sys
 
 import xbmc
 import xbmcgui
+import xbmcplugin
 import xbmcvfs
 
-from . import json_rpc as js, utils, variables as v
+# Showing precomputed widgets only needs add_listing(), see widget_cache.
+# Hence import json_rpc and utils only where we're generating items
+from . import variables as v
 
 LOG = getLogger('PLEX.widget')
 
-# To easily use threadpool, we can only pass one argument
-PLEX_TYPE = None
-SECTION_ID = None
-APPEND_SHOW_TITLE = None
-APPEND_SXXEXX = None
-SYNCHED = True
-# Need to chain the PMS keys
-KEY = None
+# Kodi types whose details we read directly from the Kodi DB
+KODI_DB_TYPES = (v.KODI_TYPE_MOVIE, v.KODI_TYPE_EPISODE)
 
 # use getVideoInfoTag to set some list item properties
 USE_TAGS = v.KODIVERSION >= 20
 # properties that should be set by tag methods
 TAG_PROPERTIES = ("resumetime", "totaltime")
 
+
+class Listing(object):
+    """
+    What generate_item() needs to know about the listing an item is shown in,
+    see entrypoint.prepare_listing(). Passed explicitly because the PKC
+    service precomputes several listings in its own threads
+    """
+    def __init__(self, plex_type=None, section_id=None, key=None,
+                 append_show_title=False, append_sxxexx=False,
+                 kodi_details=None):
+        self.plex_type = plex_type
+        self.section_id = section_id
+        # Need to chain the PMS keys
+        self.key = key
+        self.append_show_title = append_show_title
+        self.append_sxxexx = append_sxxexx
+        # Kodi item details fetched in advance, see fetch_kodi_details()
+        # {(kodi_id, kodi_type): item dict}
+        self.kodi_details = kodi_details or {}
+
+
+def guess_video_or_audio():
+    """
+    Returns either 'video', 'audio' or 'image', based how the user navigated to
+    the current view.
+    Returns None if this failed, e.g. when the user picks widgets
+    """
+    content_type = None
+    if xbmc.getCondVisibility('Window.IsActive(Videos)'):
+        content_type = 'video'
+    elif xbmc.getCondVisibility('Window.IsActive(Music)'):
+        content_type = 'audio'
+    elif xbmc.getCondVisibility('Window.IsActive(Pictures)'):
+        content_type = 'image'
+    elif xbmc.getCondVisibility('Container.Content(movies)'):
+        content_type = 'video'
+    elif xbmc.getCondVisibility('Container.Content(episodes)'):
+        content_type = 'video'
+    elif xbmc.getCondVisibility('Container.Content(seasons)'):
+        content_type = 'video'
+    elif xbmc.getCondVisibility('Container.Content(tvshows)'):
+        content_type = 'video'
+    elif xbmc.getCondVisibility('Container.Content(albums)'):
+        content_type = 'audio'
+    elif xbmc.getCondVisibility('Container.Content(artists)'):
+        content_type = 'audio'
+    elif xbmc.getCondVisibility('Container.Content(songs)'):
+        content_type = 'audio'
+    elif xbmc.getCondVisibility('Container.Content(pictures)'):
+        content_type = 'image'
+    return content_type
+
+
 def get_clean_image(image):
     '''
     helper to strip all kodi tags/formatting of an image path/url
@@ -47,7 +101,7 @@ def get_clean_image(image):
         image = thumbcache
     if image and 'image://' in image:
         image = image.replace('image://', '')
-        image = utils.unquote(image)
+        image = unquote(image)
         if image.endswith('/'):
             image = image[:-1]
         return image
@@ -55,7 +109,7 @@ def get_clean_image(image):
         return image
 
 
-def generate_item(api):
+def generate_item(api, listing=None):
     """
     Meant to be consumed by metadatautils.kodidb.prepare_listitem(), and then
     subsequently by metadatautils.kodidb.create_listitem()
@@ -65,20 +119,24 @@ def generate_item(api):
         listitem.setProperty('resumetime', str(userdata['Resume']))
 
     The key 'file' needs to be set later with the item's path
+
+    Pass the Listing the item is shown in as listing
     """
+    listing = listing or Listing()
     try:
         if api.tag in ('Directory', 'Playlist', 'Hub'):
-            return _generate_folder(api)
+            return _generate_folder(api, listing)
         else:
-            return _generate_content(api)
+            return _generate_content(api, listing)
     except Exception:
         # Usefull to catch everything here since we're using threadpool
+        from . import utils
         LOG.error('xml that caused the crash: "%s": %s',
                   api.tag, api.attrib)
         utils.ERROR(notify=True)
 
 
-def _generate_folder(api):
+def _generate_folder(api, listing):
     '''Generates "folder"/"directory" items that user can further navigate'''
     typus = ''
     if api.plex_type == v.PLEX_TYPE_GENRE:
@@ -96,11 +154,11 @@ def _generate_folder(api):
     elif api.fast_key and '?collection=' in api.fast_key:
         typus = v.KODI_TYPE_SET
     if typus and typus != v.KODI_TYPE_SET:
-        content = _generate_content(api)
+        content = _generate_content(api, listing)
         content['type'] = typus
-        content['file'] = api.directory_path(section_id=SECTION_ID,
-                                             plex_type=PLEX_TYPE,
-                                             old_key=KEY)
+        content['file'] = api.directory_path(section_id=listing.section_id,
+                                             plex_type=listing.plex_type,
+                                             old_key=listing.key)
         content['isFolder'] = True
         content['IsPlayable'] = 'false'
         return content
@@ -110,9 +168,9 @@ def _generate_folder(api):
         return {
             'title': title,
             'label': title,
-            'file': api.directory_path(section_id=SECTION_ID,
-                                       plex_type=PLEX_TYPE,
-                                       old_key=KEY),
+            'file': api.directory_path(section_id=listing.section_id,
+                                       plex_type=listing.plex_type,
+                                       old_key=listing.key),
             'icon': 'DefaultFolder.png',
             'art': {
                 'thumb': art['thumb'] if 'thumb' in art else
@@ -126,12 +184,17 @@ def _generate_folder(api):
         }
 
 
-def _generate_content(api):
+def _generate_content(api, listing):
+    from . import json_rpc as js, utils
     plex_type = api.plex_type
     if api.kodi_id:
         # Item is synched to the Kodi db - let's use that info
         # (will thus e.g. include additional artwork or metadata)
-        item = js.item_details(api.kodi_id, api.kodi_type)
+        try:
+            # Pop as we're modifying item below
+            item = listing.kodi_details.pop((api.kodi_id, api.kodi_type))
+        except KeyError:
+            item = js.item_details(api.kodi_id, api.kodi_type)
 
     # In rare cases, Kodi's JSON reply does not provide 'title' plus potentially
     # other fields - let's use the PMS answer to be safe
@@ -221,9 +284,9 @@ def _generate_content(api):
     if plex_type == v.PLEX_TYPE_EPISODE:
         # Prefix to the episode's title/label
         if api.season_number() is not None and api.index() is not None:
-            if APPEND_SXXEXX is True:
+            if listing.append_sxxexx:
                 item['title'] = "S%.2dE%.2d - %s" % (api.season_number(), api.index(), item['title'])
-        if APPEND_SHOW_TITLE is True:
+        if listing.append_show_title:
             item['title'] = "%s - %s " % (api.show_title(), item['title'])
         item['label'] = item['title']
 
@@ -249,6 +312,36 @@ def _generate_content(api):
     return item
 
 
+def fetch_kodi_details(items):
+    """
+    Pass in a list of tuples (kodi_id, kodi_type). Returns the dict
+    {(kodi_id, kodi_type): item dict} like json_rpc.items_details(). Movies
+    and episodes are read directly and read-only from the Kodi video DB, which
+    is a lot faster than decoding Kodi's JSON RPC answer. Everything else and
+    anything we could not read from the DB is fetched via JSON RPC
+    """
+    answ = {}
+    kodi_ids = defaultdict(list)
+    for kodi_id, kodi_type in items:
+        if kodi_type in KODI_DB_TYPES:
+            kodi_ids[kodi_type].append(kodi_id)
+    if kodi_ids:
+        # Not needed for precomputed widgets, see widget_cache
+        from .kodi_db import KodiVideoDB
+        try:
+            with KodiVideoDB(lock=False, readonly=True) as kodidb:
+                for kodi_type, ids in kodi_ids.items():
+                    for kodi_id, item in kodidb.items_details(ids,
+                                                              kodi_type).items():
+                        answ[(kodi_id, kodi_type)] = item
+        except sqlite3.Error as err:
+            LOG.warn('Could not read the Kodi DB, using JSON RPC: %s', err)
+            answ = {}
+    from . import json_rpc as js
+    answ.update(js.items_details([x for x in items if x not in answ]))
+    return answ
+
+
 def prepare_listitem(item, listing_key = None):
     """helper to convert kodi output from json api to compatible format for
     listitems"""
@@ -798,3 +891,17 @@ def _create_SubtitleStreamDetail(stream):
         stream_detail.setLanguage(str(stream["language"]))
 
     return stream_detail
+
+
+def add_listing(content_type, items, key=None):
+    """
+    Adds items [list of dicts], e.g. returned by entrypoint.prepare_listing(),
+    to the Kodi listing
+    """
+    xbmcplugin.setContent(int(sys.argv[1]), content_type)
+    all_items = [prepare_listitem(item, key) for item in items]
+    # fill that listing...
+    all_items = [create_listitem(item) for item in all_items]
+    xbmcplugin.addDirectoryItems(int(sys.argv[1]), all_items, len(all_items))
+    # end directory listing
+    xbmcplugin.addSortMethod(int(sys.argv[1]), xbmcplugin.SORT_METHOD_UNSORTED)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Round trip of an add-on playback call to the PKC service and back, via
+transfer.CommandServer's socket and via the window property fallback.
+
+Like default.py, the add-on side sends a PLAY- command with
+transfer.plex_command(), waits for the ListItem and confirms that it resolved
+the path. Like playback_starter.PlaybackTask, the service side sends the
+ListItem and waits for the confirmation. For the fallback, a thread emulates
+the service's main loop polling the window property WINDOW_COMMAND.
+
+    python tools/bench/bench_ipc.py --rounds 50
+"""
+from statistics import median
+from threading import Thread, Event
+from time import perf_counter
+import argparse
+import json
+import logging
+import sys
+
+import harness
+
+# Milliseconds the PKC service's main loop sleeps, see service_entry
+SERVICE_LOOP_SLEEP = 200
+
+
+def listitem():
+    from resources.lib import transfer
+    item = transfer.PKCListItem(label='Movie 1', path='/media/movies/Movie 1.mkv')
+    item.setArt({'thumb': 'http://127.0.0.1:32400/library/metadata/1/thumb',
+                 'fanart': 'http://127.0.0.1:32400/library/metadata/1/art'})
+    item.setProperty('plexid', '1')
+    item.setInfo('video', {'title': 'Movie 1', 'year': 2001,
+                           'plot': 'Plot of movie 1. ' * 20})
+    return item
+
+
+def play(channel=None):
+    """
+    The PKC service's side of a playback startup
+    """
+    from resources.lib import transfer
+    transfer.set_channel(channel)
+    try:
+        transfer.send(listitem())
+        # Wait for default.py to have completed xbmcplugin.setResolvedUrl()
+        transfer.wait_for_transfer(source='default')
+    finally:
+        transfer.close_channel()
+
+
+def request():
+    """
+    default.py's side of a playback startup. Returns the seconds it took to
+    receive the ListItem
+    """
+    from resources.lib import transfer
+    start = perf_counter()
+    transfer.plex_command('PLAY-dummy?mode=play&plex_id=1')
+    item = transfer.wait_for_transfer()
+    elapsed = perf_counter() - start
+    if item is None:
+        raise RuntimeError('Did not receive a ListItem')
+    transfer.send(True, target='main')
+    transfer.close_channel()
+    return elapsed
+
+
+def service_loop(stop, loop_sleep):
+    """
+    Emulates the PKC service's main loop checking for commands sent via
+    window properties
+    """
+    import xbmc
+    from resources.lib import transfer
+    while not stop.is_set():
+        if transfer.kodi_window(transfer.WINDOW_COMMAND):
+            transfer.kodi_window(transfer.WINDOW_COMMAND, clear=True)
+            Thread(target=play).start()
+        xbmc.sleep(loop_sleep)
+
+
+def measure(rounds):
+    times = [request() * 1000 for _ in range(rounds)]
+    times.sort()
+    return (round(median(times), 2),
+            round(times[min(len(times) - 1, len(times) * 90 // 100)], 2),
+            round(times[-1], 2))
+
+
+def run(rounds, loop_sleep):
+    harness.setup()
+    from resources.lib import transfer
+    results = []
+    server = transfer.CommandServer(lambda command, channel: Thread(
+        target=play, args=(channel, )).start())
+    server.start()
+    try:
+        results.append(('socket', measure(rounds)))
+    finally:
+        server.stop()
+        server.join()
+    # plex_command() warns about the fallback with every single call
+    logging.getLogger('PLEX.transfer').setLevel(logging.ERROR)
+    stop = Event()
+    loop = Thread(target=service_loop, args=(stop, loop_sleep))
+    loop.start()
+    try:
+        results.append(('window properties', measure(rounds)))
+    finally:
+        stop.set()
+        loop.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rounds', type=int, default=50,
+                        help='Number of round trips (default: %(default)s)')
+    parser.add_argument('--loop-sleep', type=int, default=SERVICE_LOOP_SLEEP,
+                        help='Milliseconds the emulated service main loop '
+                             'sleeps (default: %(default)s)')
+    parser.add_argument('--json', action='store_true',
+                        help='Print the results as JSON')
+    args = parser.parse_args()
+    results = run(args.rounds, args.loop_sleep)
+    if args.json:
+        print(json.dumps({label: dict(zip(('median_ms', 'p90_ms', 'max_ms'), x))
+                          for label, x in results}, sort_keys=True))
+    else:
+        harness.report(
+            'Playback round trip add-on -> PKC service -> add-on, %s rounds'
+            % args.rounds,
+            [(label, 'median %7.2f ms  p90 %7.2f ms  max %7.2f ms' % x)
+             for label, x in results])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Access to PKC's settings: reading a setting via utils.settings(), which
+instantiates xbmcaddon.Addon every time, against utils.SETTINGS, the snapshot
+of frequently read settings. Also counts the Kodi getSetting() calls while
+the PKC service processes websocket messages that someone is playing an item.
+
+    python tools/bench/bench_settings.py
+    python tools/bench/bench_settings.py --repo /tmp/pkc-baseline
+
+The stub xbmcaddon only looks the setting up in a dict. In Kodi, every
+getSetting() call crosses from Python into Kodi, so multiply the calls saved
+with what that costs on your device.
+"""
+from time import perf_counter
+import argparse
+import copy
+import json
+import sys
+
+import harness
+import bench_sync
+
+
+def per_call(function, calls):
+    """
+    Calls function calls times. Returns the microseconds per call
+    """
+    start = perf_counter()
+    for _ in range(calls):
+        function()
+    return round((perf_counter() - start) * 1000000 / calls, 2)
+
+
+def settings_access(calls):
+    """
+    Returns [(label, microseconds per call, getSetting() calls per call)]
+    """
+    import xbmcaddon
+    from resources.lib import utils
+    results = []
+    functions = [('utils.settings()',
+                  lambda: utils.settings('plex_serverowned'))]
+    if hasattr(utils, 'SETTINGS'):
+        functions.append(('utils.SETTINGS.get()',
+                          lambda: utils.SETTINGS.get('plex_serverowned')))
+    for label, function in functions:
+        before = xbmcaddon.GET_SETTING_CALLS
+        micro = per_call(function, calls)
+        results.append((label, micro,
+                        (xbmcaddon.GET_SETTING_CALLS - before) / calls))
+    return results
+
+
+def playing_messages(messages):
+    """
+    Lets websocket.process_playing() handle messages PMS websocket messages
+    that another Plex client is playing a synced movie. Returns the tuple
+    (microseconds per message, getSetting() calls per message)
+    """
+    import xbmcaddon
+    from resources.lib import app
+    from resources.lib.library_sync import websocket
+    from resources.lib.plex_db import PlexDB
+    # Kodi is not playing anything, like KodiMonitor sets up on startup
+    for playerid in app.PLAYSTATE.player_states:
+        app.PLAYSTATE.player_states[playerid] = copy.deepcopy(app.PLAYSTATE.template)
+    with PlexDB(lock=False) as plexdb:
+        plex_id = plexdb.cursor.execute(
+            'SELECT plex_id FROM movie LIMIT 1').fetchone()[0]
+    # The first message fetches the movie's duration from the PMS
+    websocket.process_playing([{
+        'state': 'playing', 'ratingKey': str(plex_id), 'sessionKey': '1',
+        'viewOffset': 0}])
+    data = [[{'state': 'playing', 'ratingKey': str(plex_id),
+              'sessionKey': '1', 'viewOffset': 60 + i}]
+            for i in range(messages)]
+    before = xbmcaddon.GET_SETTING_CALLS
+    start = perf_counter()
+    for message in data:
+        websocket.process_playing(message)
+    elapsed = perf_counter() - start
+    return (round(elapsed * 1000000 / messages, 2),
+            (xbmcaddon.GET_SETTING_CALLS - before) / messages)
+
+
+def run(repo, calls, messages):
+    # Another user's PMS: no need to ask the PMS for its sessions
+    with harness.FakePMS(100) as pms:
+        harness.setup(repo, settings={'port': str(pms.port),
+                                      'plex_serverowned': 'false'})
+        harness.init_pkc()
+        try:
+            if not bench_sync.sync(pms)['successful']:
+                raise RuntimeError('Full sync failed')
+            results = settings_access(calls)
+            results.append(('websocket playing message',)
+                           + playing_messages(messages))
+            return results
+        finally:
+            harness.shutdown_pkc()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repo', default=harness.REPO,
+                        help='PKC tree to benchmark (default: %(default)s)')
+    parser.add_argument('--calls', type=int, default=100000,
+                        help='Settings read per measurement (default: %(default)s)')
+    parser.add_argument('--messages', type=int, default=1000,
+                        help='Websocket messages to process (default: %(default)s)')
+    parser.add_argument('--json', action='store_true',
+                        help='Print the results as JSON')
+    args = parser.parse_args()
+    results = run(args.repo, args.calls, args.messages)
+    if args.json:
+        print(json.dumps({label: {'us': micro, 'get_setting_calls': calls}
+                          for label, micro, calls in results},
+                         sort_keys=True))
+    else:
+        harness.report('Settings access', [
+            (label, '%8.2f us  %5.2f getSetting() calls' % (micro, calls))
+            for label, micro, calls in results])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Full library sync of the fake PMS into blank Kodi DBs. Reports items/sec, peak
+RSS, SQL statements and execute() calls per database, PMS requests and the
+number of Kodi getSetting() calls.
+
+    python tools/bench/bench_sync.py --size 10000
+    python tools/bench/bench_sync.py --size 10000 --repo /tmp/pkc-baseline
+"""
+from time import perf_counter
+import argparse
+import json
+import sys
+
+import harness
+
+
+def sync(pms):
+    """
+    Full sync of the library of pms [harness.FakePMS] into the Kodi DBs.
+    Call harness.setup() and harness.init_pkc() first
+    """
+    import xbmcaddon
+    from resources.lib.library_sync import full_sync
+    harness.SQL.reset()
+    settings_calls = xbmcaddon.GET_SETTING_CALLS
+    requests = pms.stats()['requests']
+    successful = []
+    start = perf_counter()
+    full_sync.start(show_dialog=False, callback=successful.append)
+    elapsed = perf_counter() - start
+    settings_calls = xbmcaddon.GET_SETTING_CALLS - settings_calls
+    sql = harness.SQL.snapshot()
+    sql_calls = harness.SQL.calls_snapshot()
+    requests = {endpoint: count - requests.get(endpoint, 0)
+                for endpoint, count in pms.stats()['requests'].items()
+                if endpoint != 'stats'}
+    items = sum(pms.items.values())
+    return {
+        'successful': successful == [True],
+        'items': items,
+        'kodi_items': harness.kodi_item_counts(),
+        'seconds': round(elapsed, 2),
+        'items_per_second': round(items / elapsed, 1),
+        'peak_rss_mb': harness.peak_rss_mb(),
+        'sql_statements': sql,
+        'sql_statements_total': sum(sql.values()),
+        'sql_calls': sql_calls,
+        'sql_calls_total': sum(sql_calls.values()),
+        'pms_requests': requests,
+        'pms_requests_total': sum(requests.values()),
+        'get_setting_calls': settings_calls,
+    }
+
+
+def run(size, repo, log_level=None):
+    with harness.FakePMS(size) as pms:
+        harness.setup(repo, settings={'port': str(pms.port)}, log_level=log_level)
+        harness.init_pkc()
+        try:
+            return sync(pms)
+        finally:
+            harness.shutdown_pkc()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--size', type=int, default=1000,
+                        help='Approximate number of movies, episodes and '
+                             'tracks (default: %(default)s)')
+    parser.add_argument('--repo', default=harness.REPO,
+                        help='PKC tree to benchmark (default: %(default)s)')
+    parser.add_argument('--log', type=int, default=None,
+                        help='Print Kodi log messages of at least this level, '
+                             'e.g. 1 for info')
+    parser.add_argument('--json', action='store_true',
+                        help='Print the results as JSON')
+    args = parser.parse_args()
+    result = run(args.size, args.repo, args.log)
+    if args.json:
+        print(json.dumps(result, sort_keys=True))
+    else:
+        harness.report('Full sync of %s items' % result['items'], [
+            ('successful', result['successful']),
+            ('in Kodi DBs', ', '.join('%s %s' % (count, table) for table, count
+                                      in sorted(result['kodi_items'].items()))),
+            ('seconds', result['seconds']),
+            ('items/sec', result['items_per_second']),
+            ('peak RSS [MB]', result['peak_rss_mb']),
+            ('SQL statements', result['sql_statements_total']),
+        ] + [
+            ('  %s' % db, count)
+            for db, count in sorted(result['sql_statements'].items())
+        ] + [
+            ('SQL execute() calls', result['sql_calls_total']),
+        ] + [
+            ('  %s' % db, count)
+            for db, count in sorted(result['sql_calls'].items())
+        ] + [
+            ('PMS requests', result['pms_requests_total']),
+        ] + [
+            ('  %s' % endpoint, count)
+            for endpoint, count in sorted(result['pms_requests'].items())
+        ] + [
+            ('getSetting() calls', result['get_setting_calls']),
+        ])
+    return 0 if result['successful'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
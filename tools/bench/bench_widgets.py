@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Widget rendering after a full sync of the fake PMS. Compares 3 ways to get the
+Kodi details of the widget items:
+
+    per item    one JSON RPC call per item, json_rpc.item_details()
+    batched     one JSON RPC batch call, json_rpc.items_details()
+    sqlite      read directly from the Kodi DB, widgets.fetch_kodi_details()
+                with KodiVideoDB.items_details()
+
+and times the whole rendering of widgets, entrypoint.prepare_listing() plus
+widgets.add_listing(), with each of them. The stub Kodi answers JSON RPC calls
+after a simulated latency.
+
+    python tools/bench/bench_widgets.py --size 10000 --latency 5
+"""
+from statistics import median
+from time import perf_counter, sleep
+import argparse
+import json
+import sys
+
+import harness
+import bench_sync
+
+# Widgets that are rendered, see fake_pms.RECENT_ITEMS for their sizes
+WIDGETS = (
+    ('/library/sections/1/recentlyAdded', 1),
+    ('/library/sections/2/recentlyAdded', 2),
+    ('/library/sections/1/onDeck', 1),
+    ('/library/sections/2/onDeck', 2),
+)
+
+
+class KodiJsonRpc(object):
+    """
+    Answers VideoLibrary.GetMovieDetails and GetEpisodeDetails JSON RPC
+    requests, single or batched, like Kodi would. Every call takes latency
+    seconds. The answers are read from the Kodi DB beforehand, so that Kodi's
+    work does not show up in PKC's numbers
+    """
+    def __init__(self, details, latency):
+        # {(kodi_type, kodi_id): item dict}
+        self.details = details
+        self.latency = latency
+
+    def answer(self, request):
+        kodi_type = 'movie' if request['method'].endswith('MovieDetails') else 'episode'
+        item = self.details.get((kodi_type, request['params']['%sid' % kodi_type]))
+        if item is None:
+            return {'id': request['id'], 'jsonrpc': '2.0',
+                    'error': {'code': -32602, 'message': 'Invalid params.'}}
+        return {'id': request['id'], 'jsonrpc': '2.0',
+                'result': {'%sdetails' % kodi_type: item}}
+
+    def __call__(self, request):
+        sleep(self.latency)
+        if isinstance(request, list):
+            return [self.answer(x) for x in request]
+        return self.answer(request)
+
+
+def measure(function, rounds):
+    """
+    Calls function rounds times. Returns the tuple (median milliseconds,
+    JSON RPC calls per round, SQL statements per round)
+    """
+    import xbmc
+    times = []
+    calls = xbmc.JSONRPC_CALLS
+    harness.SQL.reset()
+    for _ in range(rounds):
+        start = perf_counter()
+        function()
+        times.append((perf_counter() - start) * 1000)
+    sql = sum(harness.SQL.snapshot().values())
+    return (round(median(times), 2),
+            (xbmc.JSONRPC_CALLS - calls) // rounds,
+            sql // rounds)
+
+
+def run(size, repo, latency, rounds):
+    with harness.FakePMS(size) as pms:
+        harness.setup(repo, settings={'port': str(pms.port)})
+        harness.init_pkc()
+        try:
+            synced = bench_sync.sync(pms)
+            if not synced['successful']:
+                raise RuntimeError('Full sync failed')
+            return widgets(latency, rounds)
+        finally:
+            harness.shutdown_pkc()
+
+
+def widgets(latency, rounds):
+    import xbmc
+    import xbmcplugin
+    from resources.lib import entrypoint, widgets, json_rpc as js
+    from resources.lib.kodi_db import KodiVideoDB
+    from resources.lib.plex_api import API
+
+    xmls = [(entrypoint.browse_xml(key), key, section_id)
+            for key, section_id in WIDGETS]
+    items = []
+    for xml, _, _ in xmls:
+        for api in (API(x) for x in xml):
+            if api.kodi_id and (api.kodi_id, api.kodi_type) not in items:
+                items.append((api.kodi_id, api.kodi_type))
+    details = {}
+    with KodiVideoDB(lock=False) as kodidb:
+        for kodi_type in ('movie', 'episode'):
+            ids = [kodi_id for kodi_id, typus in items if typus == kodi_type]
+            for kodi_id, item in kodidb.items_details(ids, kodi_type).items():
+                details[(kodi_type, kodi_id)] = item
+    xbmc.JSONRPC_HANDLER = KodiJsonRpc(details, latency / 1000.0)
+
+    def per_item(items):
+        return {item: js.item_details(*item) for item in items}
+
+    def render():
+        del xbmcplugin.DIRECTORY[:]
+        for xml, key, section_id in xmls:
+            listing = entrypoint.prepare_listing(
+                # prepare_listing() might change the xml
+                xml.__copy__(), section_id=section_id, key=key)
+            widgets.add_listing(*listing)
+
+    fetch_kodi_details = widgets.fetch_kodi_details
+    results = []
+    for label, fetch in (('per item', per_item),
+                         ('batched', js.items_details),
+                         ('sqlite', fetch_kodi_details)):
+        results.append(('%s, %s items' % (label, len(items)),
+                        measure(lambda: fetch(items), rounds)))
+        widgets.fetch_kodi_details = fetch
+        try:
+            results.append(('%s, %s widgets' % (label, len(xmls)),
+                            measure(render, rounds)))
+        finally:
+            widgets.fetch_kodi_details = fetch_kodi_details
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--size', type=int, default=1000,
+                        help='Approximate number of movies, episodes and '
+                             'tracks (default: %(default)s)')
+    parser.add_argument('--repo', default=harness.REPO,
+                        help='PKC tree to benchmark (default: %(default)s)')
+    parser.add_argument('--latency', type=float, default=2.0,
+                        help='Milliseconds Kodi needs to answer a JSON RPC '
+                             'call (default: %(default)s)')
+    parser.add_argument('--rounds', type=int, default=10,
+                        help='Repetitions per measurement (default: %(default)s)')
+    parser.add_argument('--json', action='store_true',
+                        help='Print the results as JSON')
+    args = parser.parse_args()
+    results = run(args.size, args.repo, args.latency, args.rounds)
+    if args.json:
+        print(json.dumps({label: {'ms': ms, 'jsonrpc_calls': calls,
+                                  'sql_statements': sql}
+                          for label, (ms, calls, sql) in results},
+                         sort_keys=True))
+    else:
+        harness.report(
+            'Kodi details of widget items, JSON RPC latency %s ms' % args.latency,
+            [(label, '%8.2f ms  %4s JSON RPC calls  %4s SQL statements' % x)
+             for label, x in results])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
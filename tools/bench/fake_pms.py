@@ -0,0 +1,563 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Fake Plex Media Server serving a deterministic library of movies, shows with
+seasons and episodes and artists with albums and tracks. Answers the requests
+PKC's library sync and widgets need:
+
+    /library/sections
+    /library/sections/<id>/all, /allLeaves, /recentlyAdded, /onDeck
+    /library/metadata/<id>[,<id>...]
+    /library/metadata/<id>/children
+    /hubs
+
+GET /bench/stats returns the number of requests per endpoint as JSON.
+
+Run it standalone with e.g.
+    python tools/bench/fake_pms.py --size 10000 --port 32400
+"""
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock
+from urllib.parse import urlsplit, parse_qsl
+from xml.sax.saxutils import quoteattr
+import argparse
+import json
+import sys
+
+MACHINE_IDENTIFIER = 'pkc-bench-pms'
+# Timestamp of the very first item added to the library
+ADDED_AT = 1600000000
+
+SECTION_MOVIES = 1
+SECTION_SHOWS = 2
+SECTION_MUSIC = 3
+SECTIONS = (
+    (SECTION_MOVIES, 'movie', 'Movies', '/media/movies'),
+    (SECTION_SHOWS, 'show', 'TV Shows', '/media/tv'),
+    (SECTION_MUSIC, 'artist', 'Music', '/media/music'),
+)
+
+# Plex type numbers, see PLEX_TYPE_NUMBER_FROM_PLEX_TYPE
+TYPE_NUMBERS = {1: 'movie', 2: 'show', 3: 'season', 4: 'episode',
+                8: 'artist', 9: 'album', 10: 'track'}
+DEFAULT_TYPE = {SECTION_MOVIES: 'movie', SECTION_SHOWS: 'show',
+                SECTION_MUSIC: 'artist'}
+LEAF_TYPE = {SECTION_SHOWS: 'episode', SECTION_MUSIC: 'track'}
+SEASONS_PER_SHOW = 2
+EPISODES_PER_SEASON = 10
+ALBUMS_PER_ARTIST = 5
+TRACKS_PER_ALBUM = 10
+# Number of items for recentlyAdded, onDeck and the hubs
+RECENT_ITEMS = 50
+
+GENRES = ('Action', 'Adventure', 'Animation', 'Comedy', 'Crime',
+          'Documentary', 'Drama', 'Family', 'Fantasy', 'History', 'Horror',
+          'Music', 'Mystery', 'Romance', 'Science Fiction', 'Thriller', 'War',
+          'Western')
+COUNTRIES = ('United States of America', 'United Kingdom', 'France',
+             'Germany', 'Japan', 'Canada', 'Italy', 'Spain', 'India',
+             'Australia')
+RATINGS = ('G', 'PG', 'PG-13', 'R', 'TV-14', 'TV-MA')
+# Size of the pool of people the cast, directors and writers are picked from
+PEOPLE = 5000
+STUDIOS = 40
+
+
+def _pick(key, salt, modulo):
+    """
+    Deterministic, well spread pseudo-random number in [0, modulo)
+    """
+    return ((key * 2654435761 + salt * 40503) >> 7) % modulo
+
+
+class Library(object):
+    """
+    The library of the fake PMS. size is the approximate total number of
+    movies, episodes and tracks: 40% movies, 40% episodes, 20% tracks
+    """
+    def __init__(self, size):
+        episodes_per_show = SEASONS_PER_SHOW * EPISODES_PER_SEASON
+        tracks_per_artist = ALBUMS_PER_ARTIST * TRACKS_PER_ALBUM
+        movies = max(1, size * 4 // 10)
+        shows = max(1, size * 4 // 10 // episodes_per_show)
+        artists = max(1, size * 2 // 10 // tracks_per_artist)
+        # {plex_type: [rating_key]}
+        self.keys = {x: [] for x in TYPE_NUMBERS.values()}
+        # {rating_key: (plex_type, parent rating_key, index)}
+        self.items = {}
+        # {rating_key: [child rating_key]}
+        self.children = {}
+        for _ in range(movies):
+            self._add('movie', None, 1)
+        for _ in range(shows):
+            show = self._add('show', None, 1)
+            for season_index in range(1, SEASONS_PER_SHOW + 1):
+                season = self._add('season', show, season_index)
+                for index in range(1, EPISODES_PER_SEASON + 1):
+                    self._add('episode', season, index)
+        for _ in range(artists):
+            artist = self._add('artist', None, 1)
+            for album_index in range(1, ALBUMS_PER_ARTIST + 1):
+                album = self._add('album', artist, album_index)
+                for index in range(1, TRACKS_PER_ALBUM + 1):
+                    self._add('track', album, index)
+
+    def _add(self, plex_type, parent, index):
+        rating_key = len(self.items) + 1
+        self.items[rating_key] = (plex_type, parent, index)
+        self.keys[plex_type].append(rating_key)
+        if parent is not None:
+            self.children.setdefault(parent, []).append(rating_key)
+        return rating_key
+
+    def counts(self):
+        return {plex_type: len(keys) for plex_type, keys in self.keys.items()}
+
+    def section_id(self, rating_key):
+        plex_type = self.items[rating_key][0]
+        if plex_type == 'movie':
+            return SECTION_MOVIES
+        elif plex_type in ('show', 'season', 'episode'):
+            return SECTION_SHOWS
+        return SECTION_MUSIC
+
+    def parent(self, rating_key):
+        return self.items[rating_key][1]
+
+    def index(self, rating_key):
+        return self.items[rating_key][2]
+
+    @staticmethod
+    def title(plex_type, rating_key):
+        return '%s %s' % (plex_type.capitalize(), rating_key)
+
+    # Attributes every item has
+
+    def _common(self, rating_key):
+        plex_type, _, index = self.items[rating_key]
+        section_id = self.section_id(rating_key)
+        added_at = ADDED_AT + rating_key * 60
+        attrib = {
+            'ratingKey': rating_key,
+            'key': ('/library/metadata/%s' % rating_key
+                    if plex_type in ('movie', 'episode', 'track') else
+                    '/library/metadata/%s/children' % rating_key),
+            'guid': 'plex://%s/%024x' % (plex_type, rating_key),
+            'type': plex_type,
+            'title': self.title(plex_type, rating_key),
+            'summary': 'Summary of %s %s. ' % (plex_type, rating_key) * 5,
+            'index': index,
+            'thumb': '/library/metadata/%s/thumb/%s' % (rating_key, added_at),
+            'art': '/library/metadata/%s/art/%s' % (rating_key, added_at),
+            'addedAt': added_at,
+            'updatedAt': added_at + 3600,
+            'librarySectionID': section_id,
+            'librarySectionKey': '/library/sections/%s' % section_id,
+            'librarySectionTitle': SECTIONS[section_id - 1][2],
+        }
+        if plex_type in ('movie', 'episode', 'track'):
+            if rating_key % 7 == 0:
+                attrib['viewCount'] = 1
+                attrib['lastViewedAt'] = added_at + 7200
+            elif rating_key % 11 == 0:
+                attrib['viewOffset'] = 600000
+                attrib['lastViewedAt'] = added_at + 7200
+        return attrib
+
+    def _video_attrib(self, rating_key, attrib):
+        year = 1950 + _pick(rating_key, 1, 70)
+        attrib.update({
+            'year': year,
+            'originallyAvailableAt': '%s-%02d-%02d' % (
+                year, 1 + _pick(rating_key, 2, 12), 1 + _pick(rating_key, 3, 28)),
+            'contentRating': RATINGS[_pick(rating_key, 4, len(RATINGS))],
+            'rating': '%.1f' % (_pick(rating_key, 5, 100) / 10.0),
+            'audienceRating': '%.1f' % (_pick(rating_key, 6, 100) / 10.0),
+            'audienceRatingImage': 'rottentomatoes://image.rating.upright',
+            'studio': 'Studio %s' % _pick(rating_key, 7, STUDIOS),
+        })
+
+    def _tags(self, rating_key, full):
+        """
+        Genres, countries and people. Section listings only carry a few
+        """
+        tags = []
+        for i in range(2 if full else 1):
+            tags.append(('Genre', {'tag': GENRES[_pick(rating_key, 10 + i, len(GENRES))]}))
+        tags.append(('Country', {'tag': COUNTRIES[_pick(rating_key, 12, len(COUNTRIES))]}))
+        tags.append(('Director', {'tag': 'Director %s' % _pick(rating_key, 13, PEOPLE)}))
+        for i in range(2 if full else 1):
+            tags.append(('Writer', {'tag': 'Writer %s' % _pick(rating_key, 14 + i, PEOPLE)}))
+        for i in range(8 if full else 3):
+            person = _pick(rating_key, 20 + i, PEOPLE)
+            tags.append(('Role', {
+                'tag': 'Actor %s' % person,
+                'role': 'Role %s' % _pick(rating_key, 30 + i, 1000),
+                'thumb': 'https://metadata-static.plex.tv/people/%s.jpg' % person}))
+        if full:
+            tags.extend((
+                ('Guid', {'id': 'imdb://tt%07d' % rating_key}),
+                ('Guid', {'id': 'tmdb://%s' % rating_key}),
+                ('Guid', {'id': 'tvdb://%s' % rating_key}),
+            ))
+        return tags
+
+    @staticmethod
+    def _media(rating_key, file, duration, video, full):
+        if video:
+            media = {'id': rating_key, 'duration': duration, 'bitrate': 8000,
+                     'width': 1920, 'height': 1080, 'aspectRatio': '1.78',
+                     'audioChannels': 6, 'audioCodec': 'ac3',
+                     'videoCodec': 'h264', 'videoResolution': '1080',
+                     'container': 'mkv', 'videoFrameRate': '24p'}
+            streams = (
+                {'id': rating_key * 10 + 1, 'streamType': 1, 'codec': 'h264',
+                 'index': 0, 'height': 1080, 'width': 1920, 'default': 1},
+                {'id': rating_key * 10 + 2, 'streamType': 2, 'codec': 'ac3',
+                 'index': 1, 'channels': 6, 'language': 'English',
+                 'languageCode': 'eng', 'selected': 1, 'default': 1},
+                {'id': rating_key * 10 + 3, 'streamType': 3, 'codec': 'srt',
+                 'index': 2, 'language': 'English', 'languageCode': 'eng'},
+            )
+        else:
+            media = {'id': rating_key, 'duration': duration, 'bitrate': 1000,
+                     'audioChannels': 2, 'audioCodec': 'flac',
+                     'container': 'flac'}
+            streams = (
+                {'id': rating_key * 10 + 1, 'streamType': 2, 'codec': 'flac',
+                 'index': 0, 'channels': 2, 'selected': 1},
+            )
+        part = {'id': rating_key,
+                'key': '/library/parts/%s/%s/file.%s' % (rating_key, ADDED_AT, media['container']),
+                'duration': duration,
+                'file': file,
+                'size': duration * 1000,
+                'container': media['container']}
+        return ('Media', media, [
+            ('Part', part, [('Stream', x) for x in streams] if full else [])
+        ])
+
+    # The individual items
+
+    def movie(self, rating_key, full):
+        attrib = self._common(rating_key)
+        self._video_attrib(rating_key, attrib)
+        attrib['tagline'] = 'Tagline of movie %s' % rating_key
+        attrib['duration'] = 5400000 + _pick(rating_key, 8, 3600) * 1000
+        name = '%s (%s)' % (attrib['title'], attrib['year'])
+        file = '/media/movies/%s/%s.mkv' % (name, name)
+        children = [self._media(rating_key, file, attrib['duration'], True, full)]
+        children.extend(self._tags(rating_key, full))
+        return ('Video', attrib, children)
+
+    def show(self, rating_key, full):
+        attrib = self._common(rating_key)
+        self._video_attrib(rating_key, attrib)
+        attrib.update({
+            'duration': 2700000,
+            'childCount': SEASONS_PER_SHOW,
+            'leafCount': SEASONS_PER_SHOW * EPISODES_PER_SEASON,
+            'viewedLeafCount': 0,
+        })
+        children = self._tags(rating_key, full)
+        if full:
+            children.append(('Location',
+                             {'path': '/media/tv/%s' % attrib['title']}))
+        return ('Directory', attrib, children)
+
+    def season(self, rating_key, full):
+        show = self.parent(rating_key)
+        attrib = self._common(rating_key)
+        attrib.update({
+            'title': 'Season %s' % self.index(rating_key),
+            'parentRatingKey': show,
+            'parentGuid': 'plex://show/%024x' % show,
+            'parentKey': '/library/metadata/%s' % show,
+            'parentTitle': self.title('show', show),
+            'parentIndex': 1,
+            'parentThumb': '/library/metadata/%s/thumb/%s' % (show, ADDED_AT),
+            'leafCount': EPISODES_PER_SEASON,
+            'viewedLeafCount': 0,
+        })
+        return ('Directory', attrib, [])
+
+    def episode(self, rating_key, full):
+        season = self.parent(rating_key)
+        show = self.parent(season)
+        attrib = self._common(rating_key)
+        self._video_attrib(rating_key, attrib)
+        del attrib['studio']
+        attrib.update({
+            'parentRatingKey': season,
+            'grandparentRatingKey': show,
+            'parentGuid': 'plex://season/%024x' % season,
+            'grandparentGuid': 'plex://show/%024x' % show,
+            'parentKey': '/library/metadata/%s' % season,
+            'grandparentKey': '/library/metadata/%s' % show,
+            'parentTitle': 'Season %s' % self.index(season),
+            'grandparentTitle': self.title('show', show),
+            'parentIndex': self.index(season),
+            'parentThumb': '/library/metadata/%s/thumb/%s' % (season, ADDED_AT),
+            'grandparentThumb': '/library/metadata/%s/thumb/%s' % (show, ADDED_AT),
+            'grandparentArt': '/library/metadata/%s/art/%s' % (show, ADDED_AT),
+            'duration': 2700000,
+        })
+        file = '/media/tv/%s/Season %02d/%s - S%02dE%02d.mkv' % (
+            attrib['grandparentTitle'], attrib['parentIndex'],
+            attrib['grandparentTitle'], attrib['parentIndex'],
+            attrib['index'])
+        children = [self._media(rating_key, file, attrib['duration'], True, full)]
+        children.extend(x for x in self._tags(rating_key, full)
+                        if x[0] not in ('Genre', 'Country'))
+        return ('Video', attrib, children)
+
+    def artist(self, rating_key, full):
+        attrib = self._common(rating_key)
+        children = [('Genre', {'tag': GENRES[_pick(rating_key, 10, len(GENRES))]}),
+                    ('Country', {'tag': COUNTRIES[_pick(rating_key, 12, len(COUNTRIES))]})]
+        return ('Directory', attrib, children)
+
+    def album(self, rating_key, full):
+        artist = self.parent(rating_key)
+        attrib = self._common(rating_key)
+        year = 1960 + _pick(rating_key, 1, 60)
+        attrib.update({
+            'parentRatingKey': artist,
+            'parentGuid': 'plex://artist/%024x' % artist,
+            'parentKey': '/library/metadata/%s' % artist,
+            'parentTitle': self.title('artist', artist),
+            'parentThumb': '/library/metadata/%s/thumb/%s' % (artist, ADDED_AT),
+            'studio': 'Label %s' % _pick(rating_key, 7, STUDIOS),
+            'year': year,
+            'originallyAvailableAt': '%s-01-01' % year,
+            'leafCount': TRACKS_PER_ALBUM,
+        })
+        children = [('Genre', {'tag': GENRES[_pick(rating_key, 10, len(GENRES))]})]
+        return ('Directory', attrib, children)
+
+    def track(self, rating_key, full):
+        album = self.parent(rating_key)
+        artist = self.parent(album)
+        attrib = self._common(rating_key)
+        attrib.update({
+            'parentRatingKey': album,
+            'grandparentRatingKey': artist,
+            'parentGuid': 'plex://album/%024x' % album,
+            'grandparentGuid': 'plex://artist/%024x' % artist,
+            'parentKey': '/library/metadata/%s' % album,
+            'grandparentKey': '/library/metadata/%s' % artist,
+            'parentTitle': self.title('album', album),
+            'grandparentTitle': self.title('artist', artist),
+            'parentIndex': 1,
+            'parentYear': 1960 + _pick(album, 1, 60),
+            'parentThumb': '/library/metadata/%s/thumb/%s' % (album, ADDED_AT),
+            'grandparentThumb': '/library/metadata/%s/thumb/%s' % (artist, ADDED_AT),
+            'duration': 180000 + _pick(rating_key, 8, 120) * 1000,
+        })
+        file = '/media/music/%s/%s/%02d %s.flac' % (
+            attrib['grandparentTitle'], attrib['parentTitle'],
+            attrib['index'], attrib['title'])
+        return ('Track', attrib, [
+            self._media(rating_key, file, attrib['duration'], False, full)])
+
+    def element(self, rating_key, full=False):
+        plex_type = self.items[rating_key][0]
+        return getattr(self, plex_type)(rating_key, full)
+
+
+def to_xml(element, out):
+    """
+    Appends the XML of element, the tuple (tag, attrib[, children]), to the
+    list out
+    """
+    tag, attrib = element[0], element[1]
+    out.append('<%s' % tag)
+    for key, value in attrib.items():
+        out.append(' %s=%s' % (key, quoteattr(str(value))))
+    children = element[2] if len(element) > 2 else None
+    if children:
+        out.append('>')
+        for child in children:
+            to_xml(child, out)
+        out.append('</%s>' % tag)
+    else:
+        out.append('/>')
+
+
+def container(elements, **attrib):
+    out = ['<?xml version="1.0" encoding="UTF-8"?>\n']
+    attrib.setdefault('size', len(elements))
+    to_xml(('MediaContainer', attrib, elements), out)
+    return ''.join(out).encode('utf-8')
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'PlexMediaServer/1.40.0.0000'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        # Keep filters like updatedAt>=x as 'updatedAt>' with value x
+        params = dict(parse_qsl(url.query, keep_blank_values=True))
+        for key in ('X-Plex-Container-Start', 'X-Plex-Container-Size'):
+            if key not in params and self.headers.get(key):
+                params[key] = self.headers[key]
+        parts = [x for x in url.path.split('/') if x]
+        try:
+            endpoint, body = self.server.route(parts, params)
+        except (KeyError, ValueError, IndexError):
+            endpoint, body = 'not found', None
+        self.server.count(endpoint)
+        if body is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type',
+                         'application/json' if endpoint == 'stats' else
+                         'text/xml;charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakePMS(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, size, port=0):
+        self.library = Library(size)
+        self._requests = Counter()
+        self._lock = Lock()
+        super(FakePMS, self).__init__(('127.0.0.1', port), Handler)
+
+    def count(self, endpoint):
+        with self._lock:
+            self._requests[endpoint] += 1
+
+    def route(self, parts, params):
+        """
+        Returns the tuple (endpoint, body [bytes]). body is None for 404
+        """
+        lib = self.library
+        if parts == ['bench', 'stats']:
+            with self._lock:
+                stats = {'requests': dict(self._requests),
+                         'items': lib.counts()}
+            return 'stats', json.dumps(stats).encode('utf-8')
+        if parts == ['identity']:
+            return 'identity', container(
+                [], machineIdentifier=MACHINE_IDENTIFIER, version='1.40.0')
+        if parts == ['library', 'sections']:
+            return 'sections', container([
+                ('Directory', {
+                    'key': section_id, 'type': plex_type, 'title': title,
+                    'uuid': 'pkc-bench-section-%s' % section_id,
+                    'art': '/:/resources/%s-fanart.jpg' % plex_type,
+                    'thumb': '/:/resources/%s.png' % plex_type,
+                    'composite': '/library/sections/%s/composite/1' % section_id,
+                    'agent': 'tv.plex.agents.%s' % plex_type,
+                    'language': 'en-US', 'updatedAt': ADDED_AT,
+                    'createdAt': ADDED_AT, 'scannedAt': ADDED_AT,
+                }, [('Location', {'id': section_id, 'path': path})])
+                for section_id, plex_type, title, path in SECTIONS
+            ], title1='Plex Library')
+        if parts[:2] == ['library', 'sections'] and len(parts) == 4:
+            section_id, kind = int(parts[2]), parts[3]
+            if kind == 'all':
+                type_number = int(params.get('type') or 0)
+                if type_number == 18:
+                    # Collections
+                    return 'collections', container(
+                        [], totalSize=0, offset=0, librarySectionID=section_id)
+                plex_type = TYPE_NUMBERS.get(type_number,
+                                             DEFAULT_TYPE[section_id])
+            elif kind == 'allLeaves':
+                plex_type = LEAF_TYPE[section_id]
+            elif kind in ('recentlyAdded', 'onDeck'):
+                plex_type = ('movie' if section_id == SECTION_MOVIES else
+                             LEAF_TYPE[section_id])
+                keys = lib.keys[plex_type][-RECENT_ITEMS:][::-1]
+                return kind, container(
+                    [lib.element(x) for x in keys],
+                    librarySectionID=section_id)
+            else:
+                return kind, None
+            if lib.section_id(lib.keys[plex_type][0]) != section_id:
+                return 'section %s' % kind, None
+            return 'section %s' % kind, self._page(
+                lib.keys[plex_type], params, librarySectionID=section_id)
+        if parts[:2] == ['library', 'metadata']:
+            rating_keys = [int(x) for x in parts[2].split(',')]
+            if len(parts) == 4 and parts[3] == 'children':
+                parent = rating_keys[0]
+                return 'children', self._page(
+                    lib.children.get(parent, []), params, key=parent,
+                    parentRatingKey=parent,
+                    librarySectionID=lib.section_id(parent))
+            elif len(parts) == 3:
+                elements = [lib.element(x, full=True) for x in rating_keys
+                            if x in lib.items]
+                if not elements:
+                    return 'metadata', None
+                return 'metadata', container(
+                    elements,
+                    librarySectionID=elements[0][1]['librarySectionID'],
+                    identifier='com.plexapp.plugins.library')
+        if parts == ['hubs']:
+            hubs = []
+            for plex_type, title, hub_type in (
+                    ('movie', 'Recently Added Movies', 'movie'),
+                    ('episode', 'Recently Added TV', 'mixed')):
+                keys = lib.keys[plex_type][-RECENT_ITEMS // 5:][::-1]
+                hubs.append(('Hub', {
+                    'hubIdentifier': 'home.%s.recent' % plex_type,
+                    'key': '/hubs/home/recentlyAdded?type=%s' % plex_type,
+                    'title': title, 'type': hub_type,
+                    'size': len(keys), 'more': 1,
+                }, [lib.element(x) for x in keys]))
+            return 'hubs', container(hubs)
+        return '/'.join(parts[:3]), None
+
+    def _page(self, rating_keys, params, **attrib):
+        lib = self.library
+        for attribute in ('updatedAt', 'lastViewedAt'):
+            since = params.get('%s>' % attribute)
+            if since:
+                since = int(since)
+                rating_keys = [x for x in rating_keys
+                               if lib._common(x).get(attribute, 0) >= since]
+        start = int(params.get('X-Plex-Container-Start', 0))
+        size = int(params.get('X-Plex-Container-Size', len(rating_keys)))
+        page = rating_keys[start:start + size]
+        return container([lib.element(x) for x in page],
+                         totalSize=len(rating_keys),
+                         offset=start,
+                         **attrib)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--size', type=int, default=1000,
+                        help='Approximate number of movies, episodes and '
+                             'tracks (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=32400,
+                        help='0 picks a free port (default: %(default)s)')
+    args = parser.parse_args()
+    server = FakePMS(args.size, args.port)
+    # Tell whoever started us where to find us
+    print('PORT %s' % server.server_address[1], flush=True)
+    print('ITEMS %s' % json.dumps(server.library.counts()), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
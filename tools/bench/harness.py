@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+Runs PKC outside of Kodi: stub xbmc* modules from stubs/, a temporary Kodi
+home with blank Kodi-schema databases and a fake PMS in a separate process.
+
+Call setup() before importing anything from resources.lib. The PKC tree
+imported is the one passed as repo, e.g. a git worktree of an older commit,
+so the numbers of 2 commits can be compared.
+"""
+from collections import Counter
+from threading import Lock
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import urllib.request
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import kodi_schema
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+STUBS = os.path.join(BENCH, 'stubs')
+REPO = os.path.abspath(os.path.join(BENCH, '..', '..'))
+
+# PKC settings needed to sync against the fake PMS without any dialogs
+SETTINGS = {
+    'ipaddress': '127.0.0.1',
+    'https': 'false',
+    'plex_servername': 'PKC bench',
+    'plex_machineIdentifier': 'pkc-bench-pms',
+    # Skips the dialog to choose the libraries to sync
+    'sections_asked_for_machine_identifier': 'pkc-bench-pms',
+    'plexToken': 'pkc-bench-token',
+    'accessToken': 'pkc-bench-token',
+    'username': 'bench',
+    'enableTextureCache': 'false',
+    'enablePlaylistSync': 'false',
+    'enableMusic': 'true',
+    'sync_specialmonitoring': 'false',
+}
+
+
+def _db_name(database):
+    """
+    Short name of the database, e.g. 'video' for .../MyVideos131.db or
+    file:///.../MyVideos131.db?mode=ro
+    """
+    name = os.path.basename(str(database).split('?')[0])
+    for prefix, short in (('MyVideos', 'video'), ('MyMusic', 'music'),
+                          ('Textures', 'texture')):
+        if name.startswith(prefix):
+            return short
+    return name[:-3] if name.endswith('.db') else name
+
+
+class SqlCounter(object):
+    """
+    Counts the SQL statements executed per database by wrapping
+    sqlite3.connect. PKC calls sqlite3.connect for every connection, so this
+    works for any PKC tree. SQLite reports every statement it steps through,
+    so executemany() counts once per row. The calls of execute() and
+    executemany() from Python are counted separately
+    """
+    def __init__(self):
+        self.counts = Counter()
+        self.calls = Counter()
+        self._lock = Lock()
+        self.original_connect = sqlite3.connect
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def _count_call(self, name):
+        with self._lock:
+            self.calls[name] += 1
+
+    def install(self):
+        original = self.original_connect
+        counter = self
+
+        class Cursor(sqlite3.Cursor):
+            def execute(self, *args):
+                counter._count_call(self.connection.bench_name)
+                return super(Cursor, self).execute(*args)
+
+            def executemany(self, *args):
+                counter._count_call(self.connection.bench_name)
+                return super(Cursor, self).executemany(*args)
+
+        class Connection(sqlite3.Connection):
+            def cursor(self, factory=Cursor):
+                return super(Connection, self).cursor(factory)
+
+            def execute(self, *args):
+                counter._count_call(self.bench_name)
+                return super(Connection, self).execute(*args)
+
+            def executemany(self, *args):
+                counter._count_call(self.bench_name)
+                return super(Connection, self).executemany(*args)
+
+        def connect(database, *args, **kwargs):
+            kwargs.setdefault('factory', Connection)
+            conn = original(database, *args, **kwargs)
+            name = _db_name(database)
+            conn.bench_name = name
+            conn.set_trace_callback(lambda statement: self._count(name))
+            return conn
+        sqlite3.connect = connect
+
+    def uninstall(self):
+        sqlite3.connect = self.original_connect
+
+    def reset(self):
+        with self._lock:
+            self.counts.clear()
+            self.calls.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def calls_snapshot(self):
+        with self._lock:
+            return dict(self.calls)
+
+
+SQL = SqlCounter()
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB or None on Windows
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(rss / (1024.0 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class FakePMS(object):
+    """
+    Runs fake_pms.py in its own process, so that its CPU time and memory do
+    not show up in PKC's numbers
+    """
+    def __init__(self, size):
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.join(BENCH, 'fake_pms.py'),
+             '--size', str(size), '--port', '0'],
+            stdout=subprocess.PIPE,
+            universal_newlines=True)
+        self.port = int(self.process.stdout.readline().split()[1])
+        self.items = json.loads(self.process.stdout.readline().split(' ', 1)[1])
+
+    def stats(self):
+        url = 'http://127.0.0.1:%s/bench/stats' % self.port
+        with urllib.request.urlopen(url) as answer:
+            return json.loads(answer.read().decode('utf-8'))
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+        self.process.stdout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def setup(repo=REPO, home=None, settings=None, log_level=None):
+    """
+    Makes the stub xbmc* modules and the PKC tree in repo importable, creates
+    blank Kodi DBs in the Kodi home dir home (a new temporary dir if None) and
+    applies the PKC settings. Kodi log messages of at least log_level are
+    printed. Returns the Kodi home dir
+    """
+    home = home or tempfile.mkdtemp(prefix='pkc-bench-')
+    # Read by the stubs when they are imported
+    os.environ['PKC_BENCH_HOME'] = home
+    os.environ['PKC_BENCH_REPO'] = repo
+    sys.path[:0] = [STUBS, repo]
+    import xbmc
+    import xbmcaddon
+    import xbmcvfs
+    if log_level is not None:
+        xbmc.LOG_LEVEL = log_level
+    xbmcaddon.SETTINGS.update(SETTINGS)
+    xbmcaddon.SETTINGS.update(settings or {})
+    kodi_schema.create(xbmcvfs.translatePath('special://database'))
+    # Kodi's default video nodes that PKC copies to the user profile
+    nodes = xbmcvfs.translatePath('special://xbmc/system/library/video')
+    xbmcvfs.mkdirs(nodes)
+    with open(os.path.join(nodes, 'index.xml'), 'w') as f:
+        f.write('<node order="0" visible="true"><label>342</label></node>\n')
+    xbmcvfs.mkdirs(xbmcvfs.translatePath(xbmcaddon.ADDON_INFO['profile']))
+    # PKC plugin calls get their handle from sys.argv
+    sys.argv = ['plugin://%s/' % xbmcaddon.ADDON_ID, '1', '']
+    SQL.install()
+    return home
+
+
+def init_pkc():
+    """
+    Initializes PKC like the service does on startup. Call after setup()
+    """
+    import xbmc
+    from resources.lib import variables as v, app, utils
+    v.database_paths()
+    app.init()
+    app.APP.monitor = xbmc.Monitor()
+    app.APP.player = xbmc.Player()
+    utils.init_dbs()
+
+
+def kodi_item_counts():
+    """
+    Returns the number of items per Kodi DB table, e.g. {'movie': 400}
+    """
+    import xbmcvfs
+    counts = {}
+    directory = xbmcvfs.translatePath('special://database')
+    for filename, tables in (
+            (kodi_schema.VIDEO_DB, ('movie', 'tvshow', 'seasons', 'episode')),
+            (kodi_schema.MUSIC_DB, ('artist', 'album', 'song'))):
+        # Not via sqlite3.connect so these queries are not counted
+        conn = SQL.original_connect(os.path.join(directory, filename))
+        try:
+            for table in tables:
+                counts[table] = conn.execute(
+                    'SELECT COUNT(*) FROM %s' % table).fetchone()[0]
+        finally:
+            conn.close()
+    return counts
+
+
+def shutdown_pkc():
+    """
+    Stops PKC's background workers like the service does on exit
+    """
+    from resources.lib import backgroundthread
+    backgroundthread.BGThreader.shutdown(block=True)
+
+
+def report(title, values):
+    """
+    Prints values, a list of tuples (label, value), as an aligned table
+    """
+    print(title)
+    width = max(len(label) for label, _ in values)
+    for label, value in values:
+        print('  %s  %s' % (label.ljust(width), value))
@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+"""
+Creates blank Kodi 21 "Omega" databases MyVideos131.db, MyMusic83.db and
+Textures13.db. Tables, indices, triggers and views follow Kodi's
+VideoDatabase, MusicDatabase and TextureDatabase CreateTables(), reduced to
+what PKC reads and writes
+"""
+import os
+import sqlite3
+
+VIDEO_DB = 'MyVideos131.db'
+MUSIC_DB = 'MyMusic83.db'
+TEXTURE_DB = 'Textures13.db'
+
+
+def _columns(prefix, count):
+    return ', '.join('%s%02d TEXT' % (prefix, i) for i in range(count))
+
+
+VIDEO = '''
+CREATE TABLE version (idVersion INTEGER, iCompressCount INTEGER);
+CREATE TABLE bookmark (idBookmark INTEGER PRIMARY KEY, idFile INTEGER,
+    timeInSeconds DOUBLE, totalTimeInSeconds DOUBLE, thumbNailImage TEXT,
+    player TEXT, playerState TEXT, type INTEGER);
+CREATE TABLE settings (idFile INTEGER, Deinterlace BOOL, ViewMode INTEGER,
+    ZoomAmount FLOAT, PixelRatio FLOAT, VerticalShift FLOAT,
+    AudioStream INTEGER, SubtitleStream INTEGER, SubtitleDelay FLOAT,
+    SubtitlesOn BOOL, Brightness FLOAT, Contrast FLOAT, Gamma FLOAT,
+    VolumeAmplification FLOAT, AudioDelay FLOAT, ResumeTime INTEGER,
+    Sharpness FLOAT, NoiseReduction FLOAT, NonLinStretch BOOL,
+    PostProcess BOOL, ScalingMethod INTEGER, DeinterlaceMode INTEGER,
+    StereoMode INTEGER, StereoInvert BOOL, VideoStream INTEGER,
+    TonemapMethod INTEGER, TonemapParam FLOAT, Orientation INTEGER,
+    CenterMixLevel INTEGER);
+CREATE TABLE stacktimes (idFile INTEGER, times TEXT);
+CREATE TABLE genre (genre_id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE genre_link (genre_id INTEGER, media_id INTEGER, media_type TEXT);
+CREATE TABLE country (country_id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE country_link (country_id INTEGER, media_id INTEGER,
+    media_type TEXT);
+CREATE TABLE movie (idMovie INTEGER PRIMARY KEY, idFile INTEGER, {movie},
+    idSet INTEGER, userrating INTEGER, premiered TEXT);
+CREATE TABLE actor (actor_id INTEGER PRIMARY KEY, name TEXT, art_urls TEXT);
+CREATE TABLE actor_link (actor_id INTEGER, media_id INTEGER, media_type TEXT,
+    role TEXT, cast_order INTEGER);
+CREATE TABLE director_link (actor_id INTEGER, media_id INTEGER,
+    media_type TEXT);
+CREATE TABLE writer_link (actor_id INTEGER, media_id INTEGER,
+    media_type TEXT);
+CREATE TABLE path (idPath INTEGER PRIMARY KEY, strPath TEXT, strContent TEXT,
+    strScraper TEXT, strHash TEXT, scanRecursive INTEGER,
+    useFolderNames BOOL, strSettings TEXT, noUpdate BOOL, exclude BOOL,
+    allAudio BOOL, dateAdded TEXT, idParentPath INTEGER);
+CREATE TABLE files (idFile INTEGER PRIMARY KEY, idPath INTEGER,
+    strFilename TEXT, playCount INTEGER, lastPlayed TEXT, dateAdded TEXT);
+CREATE TABLE tvshow (idShow INTEGER PRIMARY KEY, {tvshow},
+    userrating INTEGER, duration INTEGER);
+CREATE TABLE episode (idEpisode INTEGER PRIMARY KEY, idFile INTEGER,
+    {episode}, idShow INTEGER, userrating INTEGER, idSeason INTEGER);
+CREATE TABLE tvshowlinkpath (idShow INTEGER, idPath INTEGER);
+CREATE TABLE movielinktvshow (idMovie INTEGER, IdShow INTEGER);
+CREATE TABLE studio (studio_id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE studio_link (studio_id INTEGER, media_id INTEGER,
+    media_type TEXT);
+CREATE TABLE musicvideo (idMVideo INTEGER PRIMARY KEY, idFile INTEGER,
+    {musicvideo}, userrating INTEGER, premiered TEXT);
+CREATE TABLE streamdetails (idFile INTEGER, iStreamType INTEGER,
+    strVideoCodec TEXT, fVideoAspect FLOAT, iVideoWidth INTEGER,
+    iVideoHeight INTEGER, strAudioCodec TEXT, iAudioChannels INTEGER,
+    strAudioLanguage TEXT, strSubtitleLanguage TEXT, iVideoDuration INTEGER,
+    strStereoMode TEXT, strVideoLanguage TEXT, strHdrType TEXT);
+CREATE TABLE sets (idSet INTEGER PRIMARY KEY, strSet TEXT,
+    strOverview TEXT);
+CREATE TABLE seasons (idSeason INTEGER PRIMARY KEY, idShow INTEGER,
+    season INTEGER, name TEXT, userrating INTEGER);
+CREATE TABLE art (art_id INTEGER PRIMARY KEY, media_id INTEGER,
+    media_type TEXT, type TEXT, url TEXT);
+CREATE TABLE tag (tag_id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE tag_link (tag_id INTEGER, media_id INTEGER, media_type TEXT);
+CREATE TABLE rating (rating_id INTEGER PRIMARY KEY, media_id INTEGER,
+    media_type TEXT, rating_type TEXT, rating FLOAT, votes INTEGER);
+CREATE TABLE uniqueid (uniqueid_id INTEGER PRIMARY KEY, media_id INTEGER,
+    media_type TEXT, value TEXT, type TEXT);
+CREATE TABLE videoversiontype (id INTEGER PRIMARY KEY, name TEXT,
+    owner INTEGER, itemType INTEGER);
+CREATE TABLE videoversion (idFile INTEGER PRIMARY KEY, idMedia INTEGER,
+    media_type TEXT, itemType INTEGER, idType INTEGER);
+
+CREATE INDEX ix_bookmark ON bookmark (idFile, type);
+CREATE UNIQUE INDEX ix_settings ON settings (idFile);
+CREATE UNIQUE INDEX ix_stacktimes ON stacktimes (idFile);
+CREATE INDEX ix_path ON path (strPath);
+CREATE INDEX ix_path2 ON path (idParentPath);
+CREATE INDEX ix_files ON files (idPath, strFilename);
+CREATE UNIQUE INDEX ix_movie_file_1 ON movie (idFile, idMovie);
+CREATE UNIQUE INDEX ix_movie_file_2 ON movie (idMovie, idFile);
+CREATE UNIQUE INDEX ix_tvshowlinkpath_1 ON tvshowlinkpath (idShow, idPath);
+CREATE UNIQUE INDEX ix_tvshowlinkpath_2 ON tvshowlinkpath (idPath, idShow);
+CREATE UNIQUE INDEX ix_movielinktvshow_1 ON movielinktvshow (idShow, idMovie);
+CREATE UNIQUE INDEX ix_movielinktvshow_2 ON movielinktvshow (idMovie, idShow);
+CREATE UNIQUE INDEX ix_episode_file_1 ON episode (idEpisode, idFile);
+CREATE UNIQUE INDEX id_episode_file_2 ON episode (idFile, idEpisode);
+CREATE INDEX ix_episode_season_episode ON episode (c12, c13);
+CREATE INDEX ix_episode_bookmark ON episode (c17);
+CREATE INDEX ix_episode_show1 ON episode (idEpisode, idShow);
+CREATE INDEX ix_episode_show2 ON episode (idShow, idEpisode);
+CREATE UNIQUE INDEX ix_musicvideo_file_1 ON musicvideo (idMVideo, idFile);
+CREATE UNIQUE INDEX ix_musicvideo_file_2 ON musicvideo (idFile, idMVideo);
+CREATE INDEX ixMovieBasePath ON movie (c23);
+CREATE INDEX ixMusicVideoBasePath ON musicvideo (c14);
+CREATE INDEX ixEpisodeBasePath ON episode (c19);
+CREATE INDEX ix_streamdetails ON streamdetails (idFile);
+CREATE INDEX ix_seasons ON seasons (idShow, season);
+CREATE INDEX ix_art ON art (media_id, media_type, type);
+CREATE INDEX ix_rating ON rating (media_id, media_type);
+CREATE INDEX ix_uniqueid1 ON uniqueid (media_id, media_type, type);
+CREATE INDEX ix_uniqueid2 ON uniqueid (media_type, value);
+CREATE UNIQUE INDEX ix_actor_1 ON actor (name);
+CREATE UNIQUE INDEX ix_actor_link_1 ON actor_link
+    (actor_id, media_type, media_id, role);
+CREATE INDEX ix_actor_link_2 ON actor_link (media_id, media_type, actor_id);
+CREATE UNIQUE INDEX ix_director_link_1 ON director_link
+    (actor_id, media_type, media_id);
+CREATE INDEX ix_director_link_2 ON director_link
+    (media_id, media_type, actor_id);
+CREATE UNIQUE INDEX ix_writer_link_1 ON writer_link
+    (actor_id, media_type, media_id);
+CREATE INDEX ix_writer_link_2 ON writer_link (media_id, media_type, actor_id);
+CREATE UNIQUE INDEX ix_tag_1 ON tag (name);
+CREATE UNIQUE INDEX ix_tag_link_1 ON tag_link (tag_id, media_type, media_id);
+CREATE INDEX ix_tag_link_2 ON tag_link (media_id, media_type, tag_id);
+CREATE UNIQUE INDEX ix_genre_1 ON genre (name);
+CREATE UNIQUE INDEX ix_genre_link_1 ON genre_link
+    (genre_id, media_type, media_id);
+CREATE INDEX ix_genre_link_2 ON genre_link (media_id, media_type, genre_id);
+CREATE UNIQUE INDEX ix_studio_1 ON studio (name);
+CREATE UNIQUE INDEX ix_studio_link_1 ON studio_link
+    (studio_id, media_type, media_id);
+CREATE INDEX ix_studio_link_2 ON studio_link (media_id, media_type, studio_id);
+CREATE UNIQUE INDEX ix_country_1 ON country (name);
+CREATE UNIQUE INDEX ix_country_link_1 ON country_link
+    (country_id, media_type, media_id);
+CREATE INDEX ix_country_link_2 ON country_link
+    (media_id, media_type, country_id);
+CREATE INDEX ix_videoversion ON videoversion (idMedia, media_type);
+
+CREATE TRIGGER delete_movie AFTER DELETE ON movie FOR EACH ROW BEGIN
+    DELETE FROM genre_link WHERE media_id=old.idMovie AND media_type='movie';
+    DELETE FROM actor_link WHERE media_id=old.idMovie AND media_type='movie';
+    DELETE FROM director_link WHERE media_id=old.idMovie AND media_type='movie';
+    DELETE FROM studio_link WHERE media_id=old.idMovie AND media_type='movie';
+    DELETE FROM country_link WHERE media_id=old.idMovie AND media_type='movie';
+    DELETE FROM writer_link WHERE media_id=old.idMovie AND media_type='movie';
+    DELETE FROM movielinktvshow WHERE idMovie=old.idMovie;
+    DELETE FROM art WHERE media_id=old.idMovie AND media_type='movie';
+    DELETE FROM tag_link WHERE media_id=old.idMovie AND media_type='movie';
+    DELETE FROM rating WHERE media_id=old.idMovie AND media_type='movie';
+    DELETE FROM uniqueid WHERE media_id=old.idMovie AND media_type='movie';
+END;
+CREATE TRIGGER delete_tvshow AFTER DELETE ON tvshow FOR EACH ROW BEGIN
+    DELETE FROM actor_link WHERE media_id=old.idShow AND media_type='tvshow';
+    DELETE FROM director_link WHERE media_id=old.idShow AND media_type='tvshow';
+    DELETE FROM studio_link WHERE media_id=old.idShow AND media_type='tvshow';
+    DELETE FROM tvshowlinkpath WHERE idShow=old.idShow;
+    DELETE FROM genre_link WHERE media_id=old.idShow AND media_type='tvshow';
+    DELETE FROM movielinktvshow WHERE idShow=old.idShow;
+    DELETE FROM seasons WHERE idShow=old.idShow;
+    DELETE FROM art WHERE media_id=old.idShow AND media_type='tvshow';
+    DELETE FROM tag_link WHERE media_id=old.idShow AND media_type='tvshow';
+    DELETE FROM rating WHERE media_id=old.idShow AND media_type='tvshow';
+    DELETE FROM uniqueid WHERE media_id=old.idShow AND media_type='tvshow';
+END;
+CREATE TRIGGER delete_season AFTER DELETE ON seasons FOR EACH ROW BEGIN
+    DELETE FROM art WHERE media_id=old.idSeason AND media_type='season';
+END;
+CREATE TRIGGER delete_episode AFTER DELETE ON episode FOR EACH ROW BEGIN
+    DELETE FROM actor_link WHERE media_id=old.idEpisode AND media_type='episode';
+    DELETE FROM director_link WHERE media_id=old.idEpisode AND media_type='episode';
+    DELETE FROM writer_link WHERE media_id=old.idEpisode AND media_type='episode';
+    DELETE FROM art WHERE media_id=old.idEpisode AND media_type='episode';
+    DELETE FROM rating WHERE media_id=old.idEpisode AND media_type='episode';
+    DELETE FROM uniqueid WHERE media_id=old.idEpisode AND media_type='episode';
+END;
+CREATE TRIGGER delete_set AFTER DELETE ON sets FOR EACH ROW BEGIN
+    DELETE FROM art WHERE media_id=old.idSet AND media_type='set';
+END;
+CREATE TRIGGER delete_person AFTER DELETE ON actor FOR EACH ROW BEGIN
+    DELETE FROM art WHERE media_id=old.actor_id
+        AND media_type IN ('actor', 'artist', 'writer', 'director');
+END;
+CREATE TRIGGER delete_tag AFTER DELETE ON tag_link FOR EACH ROW BEGIN
+    DELETE FROM tag WHERE tag_id=old.tag_id
+        AND tag_id NOT IN (SELECT DISTINCT tag_id FROM tag_link);
+END;
+CREATE TRIGGER delete_file AFTER DELETE ON files FOR EACH ROW BEGIN
+    DELETE FROM bookmark WHERE idFile=old.idFile;
+    DELETE FROM settings WHERE idFile=old.idFile;
+    DELETE FROM stacktimes WHERE idFile=old.idFile;
+    DELETE FROM streamdetails WHERE idFile=old.idFile;
+END;
+
+CREATE VIEW movie_view AS SELECT movie.*, sets.strSet AS strSet,
+    sets.strOverview AS strSetOverview, files.strFileName AS strFileName,
+    path.strPath AS strPath, files.playCount AS playCount,
+    files.lastPlayed AS lastPlayed, files.dateAdded AS dateAdded,
+    bookmark.timeInSeconds AS resumeTimeInSeconds,
+    bookmark.totalTimeInSeconds AS totalTimeInSeconds,
+    bookmark.playerState AS playerState, rating.rating AS rating,
+    rating.votes AS votes, rating.rating_type AS rating_type,
+    uniqueid.value AS uniqueid_value, uniqueid.type AS uniqueid_type
+    FROM movie
+    LEFT JOIN sets ON sets.idSet = movie.idSet
+    JOIN files ON files.idFile = movie.idFile
+    JOIN path ON path.idPath = files.idPath
+    LEFT JOIN bookmark ON bookmark.idFile = movie.idFile AND bookmark.type = 1
+    LEFT JOIN rating ON rating.rating_id = movie.c05
+    LEFT JOIN uniqueid ON uniqueid.uniqueid_id = movie.c09;
+CREATE VIEW episode_view AS SELECT episode.*,
+    files.strFileName AS strFileName, path.strPath AS strPath,
+    files.playCount AS playCount, files.lastPlayed AS lastPlayed,
+    files.dateAdded AS dateAdded, tvshow.c00 AS strTitle,
+    tvshow.c08 AS genre, tvshow.c14 AS studio, tvshow.c05 AS premiered,
+    tvshow.c13 AS mpaa, bookmark.timeInSeconds AS resumeTimeInSeconds,
+    bookmark.totalTimeInSeconds AS totalTimeInSeconds,
+    bookmark.playerState AS playerState, rating.rating AS rating,
+    rating.votes AS votes, rating.rating_type AS rating_type,
+    uniqueid.value AS uniqueid_value, uniqueid.type AS uniqueid_type
+    FROM episode
+    JOIN files ON files.idFile = episode.idFile
+    JOIN tvshow ON tvshow.idShow = episode.idShow
+    JOIN seasons ON seasons.idSeason = episode.idSeason
+    JOIN path ON files.idPath = path.idPath
+    LEFT JOIN bookmark ON bookmark.idFile = episode.idFile AND bookmark.type = 1
+    LEFT JOIN rating ON rating.rating_id = episode.c03
+    LEFT JOIN uniqueid ON uniqueid.uniqueid_id = episode.c20;
+
+INSERT INTO version (idVersion, iCompressCount) VALUES (131, 0);
+INSERT INTO videoversiontype (id, name, owner, itemType)
+    VALUES (40400, 'Standard Edition', 0, 0);
+'''.format(movie=_columns('c', 24),
+           tvshow=_columns('c', 24),
+           episode=_columns('c', 24),
+           musicvideo=_columns('c', 15))
+
+
+MUSIC = '''
+CREATE TABLE version (idVersion INTEGER, iCompressCount INTEGER);
+CREATE TABLE versiontagscan (idVersion INTEGER, iNeedsScan INTEGER,
+    lastscanned VARCHAR(20), lastcleaned VARCHAR(20),
+    artistlinksupdated VARCHAR(20), genresupdated VARCHAR(20));
+CREATE TABLE artist (idArtist INTEGER PRIMARY KEY, strArtist VARCHAR(256),
+    strMusicBrainzArtistID TEXT, strSortName TEXT, strType TEXT,
+    strGender TEXT, strDisambiguation TEXT, strBorn TEXT, strFormed TEXT,
+    strGenres TEXT, strMoods TEXT, strStyles TEXT, strInstruments TEXT,
+    strBiography TEXT, strDied TEXT, strDisbanded TEXT,
+    strYearsActive TEXT, strImage TEXT, lastScraped VARCHAR(20) DEFAULT NULL,
+    bScrapedMBID INTEGER NOT NULL DEFAULT 0,
+    idInfoSetting INTEGER NOT NULL DEFAULT 0, dateAdded TEXT, dateNew TEXT,
+    dateModified TEXT);
+CREATE TABLE album (idAlbum INTEGER PRIMARY KEY, strAlbum VARCHAR(256),
+    strMusicBrainzAlbumID TEXT, strReleaseGroupMBID TEXT,
+    strArtistDisp TEXT, strArtistSort TEXT, strGenres TEXT,
+    strReleaseDate TEXT, strOrigReleaseDate TEXT,
+    bBoxedSet INTEGER NOT NULL DEFAULT 0,
+    bCompilation INTEGER NOT NULL DEFAULT '0', strMoods TEXT,
+    strStyles TEXT, strThemes TEXT, strReview TEXT, strImage TEXT,
+    strLabel TEXT, strType TEXT, strReleaseStatus TEXT,
+    fRating FLOAT NOT NULL DEFAULT 0, iVotes INTEGER NOT NULL DEFAULT 0,
+    iUserrating INTEGER NOT NULL DEFAULT 0,
+    lastScraped VARCHAR(20) DEFAULT NULL,
+    bScrapedMBID INTEGER NOT NULL DEFAULT 0, strReleaseType TEXT,
+    iDiscTotal INTEGER NOT NULL DEFAULT 0,
+    idInfoSetting INTEGER NOT NULL DEFAULT 0,
+    iAlbumDuration INTEGER NOT NULL DEFAULT 0, dateAdded TEXT, dateNew TEXT,
+    dateModified TEXT);
+CREATE TABLE album_artist (idArtist INTEGER, idAlbum INTEGER,
+    iOrder INTEGER, strArtist TEXT);
+CREATE TABLE album_genre (idGenre INTEGER, idAlbum INTEGER,
+    iOrder INTEGER);
+CREATE TABLE genre (idGenre INTEGER PRIMARY KEY, strGenre VARCHAR(256));
+CREATE TABLE path (idPath INTEGER PRIMARY KEY, strPath VARCHAR(512),
+    strHash TEXT);
+CREATE TABLE song (idSong INTEGER PRIMARY KEY, idAlbum INTEGER,
+    idPath INTEGER, strArtistDisp TEXT, strArtistSort TEXT, strGenres TEXT,
+    strTitle VARCHAR(512), iTrack INTEGER, iDuration INTEGER,
+    strReleaseDate TEXT, strOrigReleaseDate TEXT, strDiscSubtitle TEXT,
+    strFileName TEXT, strMusicBrainzTrackID TEXT,
+    iTimesPlayed INTEGER DEFAULT 0, iStartOffset INTEGER,
+    iEndOffset INTEGER, lastplayed VARCHAR(20) DEFAULT NULL,
+    rating FLOAT NOT NULL DEFAULT 0, votes INTEGER NOT NULL DEFAULT 0,
+    userrating INTEGER NOT NULL DEFAULT 0, comment TEXT, mood TEXT,
+    iBPM INTEGER NOT NULL DEFAULT 0, iBitRate INTEGER NOT NULL DEFAULT 0,
+    iSampleRate INTEGER NOT NULL DEFAULT 0,
+    iChannels INTEGER NOT NULL DEFAULT 0, strVideoURL TEXT,
+    strReplayGain TEXT, dateAdded TEXT, dateNew TEXT, dateModified TEXT);
+CREATE TABLE song_artist (idArtist INTEGER, idSong INTEGER,
+    idRole INTEGER, iOrder INTEGER, strArtist TEXT);
+CREATE TABLE song_genre (idGenre INTEGER, idSong INTEGER, iOrder INTEGER);
+CREATE TABLE albuminfosong (idAlbumInfoSong INTEGER PRIMARY KEY,
+    idAlbumInfo INTEGER, iTrack INTEGER, strTitle TEXT, iDuration INTEGER);
+CREATE TABLE role (idRole INTEGER PRIMARY KEY, strRole TEXT);
+CREATE TABLE art (art_id INTEGER PRIMARY KEY, media_id INTEGER,
+    media_type TEXT, type TEXT, url TEXT);
+
+CREATE INDEX idxAlbum ON album (strAlbum);
+CREATE INDEX idxAlbum_1 ON album (bCompilation);
+CREATE UNIQUE INDEX idxAlbumArtist_1 ON album_artist (idAlbum, idArtist);
+CREATE UNIQUE INDEX idxAlbumArtist_2 ON album_artist (idArtist, idAlbum);
+CREATE UNIQUE INDEX idxAlbumGenre_1 ON album_genre (idAlbum, idGenre);
+CREATE UNIQUE INDEX idxAlbumGenre_2 ON album_genre (idGenre, idAlbum);
+CREATE INDEX idxGenre ON genre (strGenre);
+CREATE INDEX idxArtist ON artist (strArtist);
+CREATE UNIQUE INDEX idxPath ON path (strPath);
+CREATE INDEX idxSong ON song (strTitle);
+CREATE INDEX idxSong1 ON song (iTimesPlayed);
+CREATE INDEX idxSong2 ON song (lastplayed);
+CREATE INDEX idxSong3 ON song (idAlbum);
+CREATE INDEX idxSong6 ON song (idPath, strFileName);
+CREATE UNIQUE INDEX idxSongArtist_1 ON song_artist
+    (idSong, idArtist, idRole);
+CREATE INDEX idxSongArtist_2 ON song_artist (idSong, idRole);
+CREATE INDEX idxSongArtist_3 ON song_artist (idArtist, idRole);
+CREATE INDEX idxSongArtist_4 ON song_artist (idRole);
+CREATE UNIQUE INDEX idxSongGenre_1 ON song_genre (idSong, idGenre);
+CREATE INDEX idxSongGenre_2 ON song_genre (idGenre, idSong);
+CREATE UNIQUE INDEX idxRole ON role (strRole);
+CREATE INDEX ix_art ON art (media_id, media_type, type);
+
+CREATE TRIGGER tgrDeleteAlbum AFTER DELETE ON album FOR EACH ROW BEGIN
+    DELETE FROM song WHERE song.idAlbum = old.idAlbum;
+    DELETE FROM album_artist WHERE album_artist.idAlbum = old.idAlbum;
+    DELETE FROM album_genre WHERE album_genre.idAlbum = old.idAlbum;
+    DELETE FROM art WHERE media_id=old.idAlbum AND media_type='album';
+END;
+CREATE TRIGGER tgrDeleteArtist AFTER DELETE ON artist FOR EACH ROW BEGIN
+    DELETE FROM album_artist WHERE album_artist.idArtist = old.idArtist;
+    DELETE FROM song_artist WHERE song_artist.idArtist = old.idArtist;
+    DELETE FROM art WHERE media_id=old.idArtist AND media_type='artist';
+END;
+CREATE TRIGGER tgrDeleteSong AFTER DELETE ON song FOR EACH ROW BEGIN
+    DELETE FROM song_artist WHERE song_artist.idSong = old.idSong;
+    DELETE FROM song_genre WHERE song_genre.idSong = old.idSong;
+    DELETE FROM art WHERE media_id=old.idSong AND media_type='song';
+END;
+
+INSERT INTO version (idVersion, iCompressCount) VALUES (83, 0);
+'''
+
+
+TEXTURE = '''
+CREATE TABLE version (idVersion INTEGER, iCompressCount INTEGER);
+CREATE TABLE texture (id INTEGER PRIMARY KEY, url TEXT, cachedurl TEXT,
+    imagehash TEXT, lasthashcheck TEXT);
+CREATE TABLE sizes (idtexture INTEGER, size INTEGER, width INTEGER,
+    height INTEGER, usecount INTEGER, lastusetime TEXT);
+CREATE INDEX idxTexture ON texture (url);
+CREATE INDEX idxSize ON sizes (idtexture, size);
+CREATE INDEX idxSize2 ON sizes (idtexture, width, height);
+CREATE TRIGGER textureDelete AFTER DELETE ON texture FOR EACH ROW BEGIN
+    DELETE FROM sizes WHERE sizes.idtexture=old.id;
+END;
+INSERT INTO version (idVersion, iCompressCount) VALUES (13, 0);
+'''
+
+
+def create(directory):
+    """
+    Creates the blank Kodi databases in directory, replacing existing ones.
+    Returns the dict {'video': path, 'music': path, 'texture': path}
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for kind, filename, schema in (('video', VIDEO_DB, VIDEO),
+                                   ('music', MUSIC_DB, MUSIC),
+                                   ('texture', TEXTURE_DB, TEXTURE)):
+        path = os.path.join(directory, filename)
+        if os.path.exists(path):
+            os.remove(path)
+        conn = sqlite3.connect(path)
+        conn.executescript(schema)
+        conn.commit()
+        conn.close()
+        paths[kind] = path
+    return paths
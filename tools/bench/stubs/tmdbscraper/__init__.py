@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+"""
+Stand-in for the TheMovieDB scraper add-on metadata.themoviedb.org.python
+"""
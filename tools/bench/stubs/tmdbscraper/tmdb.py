@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+
+
+class TMDBMovieScraper(object):
+    def __init__(self, settings, language, certification_country,
+                 search_language=''):
+        pass
+
+    def get_details(self, uniqueids):
+        return {'error': 'Not available in the PKC bench'}
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Stand-in for Kodi's xbmc module, just enough to run PKC outside of Kodi. See
+tools/bench/README.md
+"""
+import json
+import os
+import sys
+import time
+
+LOGDEBUG = 0
+LOGINFO = 1
+LOGNOTICE = 1
+LOGWARNING = 2
+LOGERROR = 3
+LOGFATAL = 4
+LOGNONE = 5
+
+ISO_639_1 = 0
+ISO_639_2 = 1
+ENGLISH_NAME = 2
+
+PLAYLIST_MUSIC = 0
+PLAYLIST_VIDEO = 1
+
+# Kodi version we're pretending to be, e.g. for the Kodi DB versions
+BUILD_VERSION = os.environ.get('PKC_BENCH_KODI_VERSION',
+                               '21.0 (21.0.0) Git:20240406-3ae7be85fa')
+INFO_LABELS = {
+    'System.BuildVersion': BUILD_VERSION,
+    'System.FriendlyName': 'PKC bench',
+}
+# Minimum level of Kodi log messages that are printed to stderr
+LOG_LEVEL = int(os.environ.get('PKC_BENCH_LOG_LEVEL', LOGNONE))
+
+# Set JSONRPC_HANDLER to a function that accepts the decoded JSON RPC request
+# and returns the decoded answer. JSONRPC_CALLS counts executeJSONRPC() calls
+JSONRPC_HANDLER = None
+JSONRPC_CALLS = 0
+
+
+def log(msg, level=LOGDEBUG):
+    if level >= LOG_LEVEL:
+        print(msg, file=sys.stderr)
+
+
+def getInfoLabel(label):
+    return INFO_LABELS.get(label, '')
+
+
+def getCondVisibility(condition):
+    return False
+
+
+def executebuiltin(function, wait=False):
+    pass
+
+
+def executeJSONRPC(request):
+    global JSONRPC_CALLS
+    JSONRPC_CALLS += 1
+    if JSONRPC_HANDLER is None:
+        answer = {'id': 1, 'jsonrpc': '2.0', 'result': {}}
+    else:
+        answer = JSONRPC_HANDLER(json.loads(request))
+    return json.dumps(answer)
+
+
+def getLocalizedString(string_id):
+    return ''
+
+
+def getLanguage(format=ENGLISH_NAME, region=False):
+    return 'en' if format == ISO_639_1 else 'English'
+
+
+def getRegion(setting):
+    return ''
+
+
+def getCacheThumbName(path):
+    return '%08x.tbn' % (hash(path) & 0xffffffff)
+
+
+def sleep(milliseconds):
+    time.sleep(milliseconds / 1000.0)
+
+
+class Monitor(object):
+    def abortRequested(self):
+        return False
+
+    def waitForAbort(self, timeout=None):
+        if timeout:
+            time.sleep(timeout)
+        return False
+
+
+class Player(object):
+    def isPlaying(self):
+        return 0
+
+    def isPlayingVideo(self):
+        return 0
+
+    def isPlayingAudio(self):
+        return 0
+
+
+class PlayList(object):
+    def __init__(self, playlist):
+        self.playlist = playlist
+        self.items = []
+
+    def size(self):
+        return len(self.items)
+
+    def getposition(self):
+        return -1
+
+    def clear(self):
+        self.items = []
+
+
+class _Recorder(object):
+    """
+    Accepts any setter and remembers the last value, e.g. for ListItem info
+    tags and stream details
+    """
+    def __init__(self, *args, **kwargs):
+        self.values = {}
+
+    def __getattr__(self, name):
+        if not name.startswith(('set', 'add')):
+            raise AttributeError(name)
+
+        def setter(*args, **kwargs):
+            self.values[name] = args or kwargs
+        return setter
+
+
+class InfoTagVideo(_Recorder):
+    pass
+
+
+class InfoTagMusic(_Recorder):
+    pass
+
+
+class VideoStreamDetail(_Recorder):
+    pass
+
+
+class AudioStreamDetail(_Recorder):
+    pass
+
+
+class SubtitleStreamDetail(_Recorder):
+    pass
+
+
+class Actor(object):
+    def __init__(self, name='', role='', order=-1, thumbnail=''):
+        self.name = name
+        self.role = role
+        self.order = order
+        self.thumbnail = thumbnail
+
+
+class Keyboard(object):
+    def __init__(self, default='', heading='', hidden=False):
+        self.text = default
+
+    def doModal(self, autoclose=0):
+        pass
+
+    def isConfirmed(self):
+        return False
+
+    def getText(self):
+        return self.text
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Stand-in for Kodi's xbmcaddon module. PKC's settings start with the defaults
+of resources/settings.xml of the PKC tree in PKC_BENCH_REPO; change them via
+SETTINGS before importing PKC modules
+"""
+import os
+import xml.etree.ElementTree as etree
+
+ADDON_ID = 'plugin.video.plexkodiconnect'
+REPO = os.environ.get('PKC_BENCH_REPO') or os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+ADDON_INFO = {
+    'id': ADDON_ID,
+    'name': 'PlexKodiConnect',
+    'version': etree.parse(os.path.join(REPO, 'addon.xml')).getroot().get('version'),
+    'path': REPO,
+    'profile': 'special://profile/addon_data/%s/' % ADDON_ID,
+}
+SETTINGS = {
+    setting.get('id'): setting.get('default')
+    for setting in etree.parse(os.path.join(REPO, 'resources', 'settings.xml')).iter('setting')
+    if setting.get('id') and setting.get('default') is not None
+}
+# Number of getSetting() calls, e.g. to compare settings access
+GET_SETTING_CALLS = 0
+
+
+class Addon(object):
+    def __init__(self, id=ADDON_ID):
+        self.id = id
+
+    def getAddonInfo(self, key):
+        if self.id != ADDON_ID:
+            return ''
+        return ADDON_INFO.get(key, '')
+
+    def getSetting(self, key):
+        global GET_SETTING_CALLS
+        GET_SETTING_CALLS += 1
+        if self.id != ADDON_ID:
+            return ''
+        return SETTINGS.get(key, '')
+
+    def getSettingBool(self, key):
+        return self.getSetting(key) == 'true'
+
+    def getSettingInt(self, key):
+        return int(self.getSetting(key))
+
+    def setSetting(self, key, value):
+        if self.id == ADDON_ID:
+            SETTINGS[key] = value
+
+    def getLocalizedString(self, string_id):
+        return ''
+
+    def openSettings(self):
+        pass
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Stand-in for Kodi's xbmcgui module. Window properties are kept in memory,
+dialogs return immediately as if the user cancelled them
+"""
+import threading
+
+from xbmc import _Recorder, InfoTagVideo, InfoTagMusic
+
+ACTION_SELECT_ITEM = 7
+ACTION_PREVIOUS_MENU = 10
+ACTION_NAV_BACK = 92
+ACTION_BACKSPACE = 110
+
+ALPHANUM_HIDE_INPUT = 2
+INPUT_ALPHANUM = 0
+INPUT_NUMERIC = 1
+INPUT_DATE = 2
+INPUT_TIME = 3
+INPUT_IPADDRESS = 4
+INPUT_PASSWORD = 5
+PASSWORD_VERIFY = 1
+
+NOTIFICATION_INFO = 'info'
+NOTIFICATION_WARNING = 'warning'
+NOTIFICATION_ERROR = 'error'
+
+# {window_id: {property: value}}
+_PROPERTIES = {}
+_LOCK = threading.Lock()
+
+
+def getCurrentWindowId():
+    return 10000
+
+
+def getCurrentWindowDialogId():
+    return 9999
+
+
+class Window(object):
+    def __init__(self, existingWindowId=10000):
+        with _LOCK:
+            self._properties = _PROPERTIES.setdefault(existingWindowId, {})
+
+    def getProperty(self, key):
+        return self._properties.get(key.lower(), '')
+
+    def setProperty(self, key, value):
+        self._properties[key.lower()] = value
+
+    def clearProperty(self, key):
+        self._properties.pop(key.lower(), None)
+
+    def clearProperties(self):
+        self._properties.clear()
+
+
+class WindowXML(Window):
+    def __init__(self, *args, **kwargs):
+        super(WindowXML, self).__init__()
+
+    def doModal(self):
+        pass
+
+    def show(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class WindowXMLDialog(WindowXML):
+    pass
+
+
+class Dialog(object):
+    def ok(self, heading, message):
+        return True
+
+    def yesno(self, heading, message, *args, **kwargs):
+        return False
+
+    def select(self, heading, options, *args, **kwargs):
+        return -1
+
+    def multiselect(self, heading, options, *args, **kwargs):
+        return None
+
+    def input(self, heading, *args, **kwargs):
+        return ''
+
+    def numeric(self, type, heading, *args, **kwargs):
+        return ''
+
+    def notification(self, heading, message, *args, **kwargs):
+        pass
+
+    def contextmenu(self, options):
+        return -1
+
+
+class DialogProgress(object):
+    def create(self, heading, message=''):
+        pass
+
+    def update(self, percent, *args, **kwargs):
+        pass
+
+    def iscanceled(self):
+        return False
+
+    def close(self):
+        pass
+
+
+class DialogProgressBG(DialogProgress):
+    def isFinished(self):
+        return False
+
+
+class ControlImage(object):
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+class ListItem(_Recorder):
+    def __init__(self, label='', label2='', path='', offscreen=False):
+        super(ListItem, self).__init__()
+        self.label = label
+        self.label2 = label2
+        self.path = path
+        self.properties = {}
+        self.art = {}
+        self._video_tag = InfoTagVideo()
+        self._music_tag = InfoTagMusic()
+
+    def getLabel(self):
+        return self.label
+
+    def setLabel(self, label):
+        self.label = label
+
+    def getPath(self):
+        return self.path
+
+    def setPath(self, path):
+        self.path = path
+
+    def getProperty(self, key):
+        return self.properties.get(key.lower(), '')
+
+    def setProperty(self, key, value):
+        self.properties[key.lower()] = value
+
+    def setProperties(self, values):
+        for key, value in values.items():
+            self.setProperty(key, value)
+
+    def getArt(self, key):
+        return self.art.get(key, '')
+
+    def setArt(self, values):
+        self.art.update(values)
+
+    def getVideoInfoTag(self):
+        return self._video_tag
+
+    def getMusicInfoTag(self):
+        return self._music_tag
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+Stand-in for Kodi's xbmcplugin module. Remembers what an add-on call added to
+its listing in DIRECTORY
+"""
+SORT_METHOD_UNSORTED = 0
+SORT_METHOD_LABEL = 1
+
+# Items (url, listitem, is_folder) that were added to listings
+DIRECTORY = []
+# The ListItem passed to setResolvedUrl()
+RESOLVED = None
+
+
+def setContent(handle, content):
+    pass
+
+
+def addDirectoryItem(handle, url, listitem, isFolder=False, totalItems=0):
+    DIRECTORY.append((url, listitem, isFolder))
+    return True
+
+
+def addDirectoryItems(handle, items, totalItems=0):
+    DIRECTORY.extend(items)
+    return True
+
+
+def addSortMethod(handle, sortMethod, *args, **kwargs):
+    pass
+
+
+def endOfDirectory(handle, succeeded=True, updateListing=False,
+                   cacheToDisc=True):
+    pass
+
+
+def setResolvedUrl(handle, succeeded, listitem):
+    global RESOLVED
+    RESOLVED = listitem
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Stand-in for Kodi's xbmcvfs module. special:// paths point to a directory
+tree below the environment variable PKC_BENCH_HOME
+"""
+import os
+import shutil
+import tempfile
+
+HOME = os.environ.get('PKC_BENCH_HOME') or tempfile.mkdtemp(prefix='pkc-bench-')
+# special://<key>/ and the directory below HOME it points to
+SPECIAL = {
+    'home': 'home',
+    'xbmc': 'xbmc',
+    'temp': 'temp',
+    'logpath': 'temp',
+    'profile': 'userdata',
+    'masterprofile': 'userdata',
+    'userdata': 'userdata',
+    'database': os.path.join('userdata', 'Database'),
+    'thumbnails': os.path.join('userdata', 'Thumbnails'),
+}
+
+
+def translatePath(path):
+    if not path.startswith('special://'):
+        return path
+    special, _, rest = path[len('special://'):].partition('/')
+    translated = os.path.join(HOME, SPECIAL[special], rest)
+    if not rest and path.endswith('/'):
+        translated = os.path.join(translated, '')
+    return translated
+
+
+def exists(path):
+    return os.path.exists(translatePath(path))
+
+
+def mkdir(path):
+    os.mkdir(translatePath(path))
+    return True
+
+
+def mkdirs(path):
+    os.makedirs(translatePath(path), exist_ok=True)
+    return True
+
+
+def delete(path):
+    os.remove(translatePath(path))
+    return True
+
+
+def copy(source, destination):
+    shutil.copyfile(translatePath(source), translatePath(destination))
+    return True
+
+
+def listdir(path):
+    path = translatePath(path)
+    dirs, files = [], []
+    for name in os.listdir(path):
+        (dirs if os.path.isdir(os.path.join(path, name)) else files).append(name)
+    return dirs, files
+
+
+def makeLegalFilename(filename):
+    return filename
+
+
+def validatePath(path):
+    return path
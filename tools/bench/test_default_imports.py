@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Checks which PKC modules default.py imports to show a widget that the PKC
+service precomputed. Kodi runs default.py in a new Python instance for every
+add-on call, so these imports are paid for with every widget.
+
+    python -m unittest discover -s tools/bench -p 'test_*.py'
+"""
+import json
+import os
+import runpy
+import sqlite3
+import sys
+import time
+import unittest
+
+import harness
+
+WIDGET = '?mode=browseplex&key=/library/sections/1/onDeck&section_id=1'
+# resources.lib modules default.py may import to show a precomputed widget
+ALLOWED = {
+    'resources',
+    'resources.lib',
+    'resources.lib.loghandler',
+    'resources.lib.path_ops',
+    'resources.lib.transfer',
+    'resources.lib.variables',
+    'resources.lib.widget_cache',
+    'resources.lib.widgets',
+}
+
+
+def pkc_modules():
+    return {x for x in sys.modules
+            if x == 'resources' or x.startswith('resources.')}
+
+
+class DefaultImportsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        harness.setup(settings={'widgetCache': 'true'})
+        harness.SQL.uninstall()
+        import xbmcgui
+        xbmcgui.Window(10000).setProperty('pms_token', 'pkc-bench-token')
+
+    def setUp(self):
+        for module in pkc_modules():
+            del sys.modules[module]
+        import xbmcplugin
+        del xbmcplugin.DIRECTORY[:]
+
+    def run_default(self):
+        sys.argv = ['plugin://plugin.video.plexkodiconnect/', '1', WIDGET]
+        runpy.run_path(os.path.join(harness.REPO, 'default.py'),
+                       run_name='__main__')
+
+    def store_widget(self):
+        from resources.lib import widget_cache, variables as v
+        params = widget_cache._params(dict(
+            x.split('=', 1) for x in WIDGET[1:].split('&')))
+        listing = ['movies', [{
+            'title': 'Movie 1',
+            'label': 'Movie 1',
+            'type': 'movie',
+            'file': '/media/movies/Movie 1.mkv',
+            'art': {},
+        }], '/library/sections/1/onDeck']
+        now = int(time.time())
+        conn = sqlite3.connect(v.DB_RESPONSE_CACHE_PATH)
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS widget(
+                    key TEXT PRIMARY KEY,
+                    params TEXT,
+                    content TEXT,
+                    stored INTEGER,
+                    requested INTEGER)
+            ''')
+            conn.execute('INSERT OR REPLACE INTO widget VALUES (?, ?, ?, ?, ?)',
+                         (widget_cache.cache_key(params), params,
+                          json.dumps(listing), now, now))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def test_precomputed_widget(self):
+        import xbmcplugin
+        self.store_widget()
+        for module in pkc_modules():
+            del sys.modules[module]
+        self.run_default()
+        self.assertEqual(len(xbmcplugin.DIRECTORY), 1)
+        self.assertLessEqual(pkc_modules(), ALLOWED)
+
+
+if __name__ == '__main__':
+    unittest.main()